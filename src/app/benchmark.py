@@ -0,0 +1,660 @@
+"""Benchmarks for the Beam apps, run locally on CPU without Beam.
+
+    > python benchmark.py preprocess --seconds 10 60 240
+    > python benchmark.py resample --seconds 1 10 60 240 --channels 1 2
+    > python benchmark.py batching --model tiny --concurrency 8 --audio note.ogg
+    > python benchmark.py longform --model tiny --minutes 1 5 10 30 --audio note.ogg
+    > python benchmark.py cpu-profile --audio-dir notes/ --models tiny base small
+    > python benchmark.py coldstart --model tiny --cache /tmp/whisper-cache
+    > python benchmark.py residency --budgets-gb 7 10 15 --skew 1.2
+
+They need the apps' own dependencies (torch, torchaudio, and whisper or
+seamless_communication where a model is involved).
+"""
+import argparse
+import glob
+import io
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+import torchaudio
+
+# the apps import the modules they share from src/ through symlinks
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+WHISPER_APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "whisper")
+MULTI_APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "multi")
+
+from audio import (  # noqa: E402
+    TELEGRAM_SAMPLE_RATE,
+    MonoResample,
+    get_resampler,
+    stream_waveform,
+)
+from coldstart import ColdStartTimer  # noqa: E402
+from inference import quantize_linear_layers, tune_threads  # noqa: E402
+from longform import OVERLAP_SECONDS, WINDOW_SECONDS, sliding_windows  # noqa: E402
+
+AUDIO_SAMPLE_RATE = 16000.0
+
+
+def load_waveform(data: bytes, sample_rate: float, max_length: float = None):
+    """The whole waveform of `data`, decoded the way the apps stream it."""
+    return torch.cat(list(stream_waveform(data, sample_rate, max_length=max_length)))
+
+
+def synthetic_note(seconds: float, sample_rate: int = TELEGRAM_SAMPLE_RATE) -> bytes:
+    """A mono 16-bit WAV of quiet noise, standing in for a voice note."""
+    waveform = torch.randn(1, int(seconds * sample_rate)) * 0.1
+    with io.BytesIO() as buf:
+        torchaudio.save(
+            buf,
+            waveform,
+            sample_rate,
+            format="wav",
+            encoding="PCM_S",
+            bits_per_sample=16,
+        )
+        return buf.getvalue()
+
+
+def read_note(path: str, seconds: float) -> bytes:
+    """The first `seconds` of the note at `path`, re-encoded as WAV. Notes
+    shorter than that are repeated."""
+    waveform, sample_rate = torchaudio.load(path)
+    repeats = int(seconds * sample_rate) // waveform.shape[1] + 1
+    waveform = waveform.repeat(1, repeats)[:, : int(seconds * sample_rate)]
+    with io.BytesIO() as buf:
+        torchaudio.save(buf, waveform, sample_rate, format="wav")
+        return buf.getvalue()
+
+
+def temp_file_preprocess(data: bytes, max_length: float) -> torch.Tensor:
+    """What the apps did before: decode from a temporary file, resample,
+    write a second temporary WAV and have the model read it back."""
+    f1 = tempfile.NamedTemporaryFile()
+    f1.write(data)
+    f1.flush()
+    arr, org_sr = torchaudio.load(f1.name)
+    f1.close()
+    new_arr = (
+        torchaudio.functional.resample(
+            arr, orig_freq=org_sr, new_freq=AUDIO_SAMPLE_RATE
+        )
+        if org_sr != AUDIO_SAMPLE_RATE
+        else arr
+    )
+    max_samples = int(max_length * AUDIO_SAMPLE_RATE)
+    if new_arr.shape[1] > max_samples:
+        new_arr = new_arr[:, :max_samples]
+
+    f2 = tempfile.NamedTemporaryFile(suffix=".wav")
+    torchaudio.save(f2.name, new_arr, sample_rate=int(AUDIO_SAMPLE_RATE))
+    # the models decoded the file themselves, whisper through an ffmpeg process
+    try:
+        from whisper.audio import load_audio
+
+        audio = torch.from_numpy(load_audio(f2.name))
+    except ImportError:
+        audio = torchaudio.load(f2.name)[0].mean(dim=0)
+    f2.close()
+    return audio
+
+
+def timed(fn, *args, repeat: int) -> dict:
+    fn(*args)  # warm up
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+    }
+
+
+def bench_preprocess(args):
+    results = []
+    for seconds in args.seconds:
+        data = read_note(args.audio, seconds) if args.audio else synthetic_note(seconds)
+        quiet = open(os.devnull, "w")
+        stdout, sys.stdout = sys.stdout, quiet  # the apps print the input rate
+        try:
+            temp_file = timed(
+                temp_file_preprocess, data, args.max_length, repeat=args.repeat
+            )
+            in_memory = timed(
+                lambda: load_waveform(
+                    data, sample_rate=AUDIO_SAMPLE_RATE, max_length=args.max_length
+                ),
+                repeat=args.repeat,
+            )
+        finally:
+            sys.stdout = stdout
+            quiet.close()
+        results.append(
+            {
+                "seconds": seconds,
+                "input_bytes": len(data),
+                "temp_file": temp_file,
+                "in_memory": in_memory,
+                "saved_ms": round(temp_file["p50_ms"] - in_memory["p50_ms"], 2),
+            }
+        )
+    return results
+
+
+def bench_resample(args):
+    """torchaudio.functional.resample, which rebuilds the sinc kernel on
+    every call, after a separate downmix, vs the cached MonoResample."""
+    device = torch.device(args.device)
+    results = []
+    with torch.no_grad():
+        start = time.perf_counter()
+        MonoResample(TELEGRAM_SAMPLE_RATE, AUDIO_SAMPLE_RATE, device)
+        build_ms = round((time.perf_counter() - start) * 1000, 2)
+        resampler = get_resampler(TELEGRAM_SAMPLE_RATE, AUDIO_SAMPLE_RATE, device)
+        for channels in args.channels:
+            for seconds in args.seconds:
+                waveform = torch.randn(
+                    channels, int(seconds * TELEGRAM_SAMPLE_RATE), device=device
+                )
+                functional = timed(
+                    lambda: torchaudio.functional.resample(
+                        waveform.mean(dim=0),
+                        orig_freq=TELEGRAM_SAMPLE_RATE,
+                        new_freq=AUDIO_SAMPLE_RATE,
+                    ),
+                    repeat=args.repeat,
+                )
+                cached = timed(lambda: resampler(waveform), repeat=args.repeat)
+                expected = torchaudio.functional.resample(
+                    waveform.mean(dim=0),
+                    orig_freq=TELEGRAM_SAMPLE_RATE,
+                    new_freq=AUDIO_SAMPLE_RATE,
+                )
+                difference = (resampler(waveform) - expected).abs().max()
+                results.append(
+                    {
+                        "seconds": seconds,
+                        "channels": channels,
+                        "functional": functional,
+                        "cached": cached,
+                        "max_abs_diff": float(difference),
+                    }
+                )
+    return {"device": str(device), "kernel_build_ms": build_ms, "results": results}
+
+
+def latency_summary(name: str, elapsed: float, latencies: list) -> dict:
+    latencies = sorted(latencies)
+    n = len(latencies)
+    return {
+        "name": name,
+        "requests": n,
+        "throughput_rps": round(n / elapsed, 2),
+        "p50_ms": round(latencies[n // 2] * 1000, 1),
+        "p95_ms": round(latencies[min(n - 1, int(n * 0.95))] * 1000, 1),
+    }
+
+
+def run_clients(transcribe, clips: list, concurrency: int) -> tuple:
+    """Sends every clip through `transcribe(audio, language)` from
+    `concurrency` threads; returns the elapsed time and the latencies."""
+    latencies = []
+
+    def one(clip):
+        audio, language = clip
+        start = time.perf_counter()
+        transcribe(audio, language)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, clips))
+    return time.perf_counter() - start, latencies
+
+
+def bench_batching(args):
+    """model.transcribe one request at a time vs the WhisperBatcher, for a
+    few batch sizes and waits, with `concurrency` users at once.
+
+    Synthetic noise makes Whisper hallucinate long outputs, pass --audio
+    with a real voice note for representative numbers.
+    """
+    import whisper
+
+    sys.path.insert(0, WHISPER_APP)
+    from batching import WhisperBatcher
+
+    torch.manual_seed(0)
+    model = whisper.load_model(args.model, device="cpu")
+    clips = []
+    for i in range(args.requests):
+        seconds = args.seconds[i % len(args.seconds)]
+        data = read_note(args.audio, seconds) if args.audio else synthetic_note(seconds)
+        audio = load_waveform(data, sample_rate=AUDIO_SAMPLE_RATE)
+        clips.append((audio, args.languages[i % len(args.languages)]))
+
+    lock = threading.Lock()
+
+    def unbatched(audio, language):
+        with lock:
+            return model.transcribe(audio, language=language, fp16=False)["text"]
+
+    elapsed, latencies = run_clients(unbatched, clips, args.concurrency)
+    results = [latency_summary("transcribe", elapsed, latencies)]
+    for max_batch_size in args.batch_sizes:
+        for max_wait_ms in args.waits_ms:
+            batcher = WhisperBatcher(
+                model, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms
+            )
+
+            def batched(audio, language):
+                return batcher.transcribe(audio, language, "transcribe")
+
+            elapsed, latencies = run_clients(batched, clips, args.concurrency)
+            result = latency_summary(
+                f"batch {max_batch_size}, wait {max_wait_ms} ms", elapsed, latencies
+            )
+            result["batch_sizes"] = dict(sorted(batcher.batch_sizes.items()))
+            results.append(result)
+    return results
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def transcribe_long_note(args, minutes: float, data: bytes, results):
+    """Runs in a fresh process, so its peak memory is this note's alone."""
+    import whisper
+
+    sys.path.insert(0, WHISPER_APP)
+    from batching import WhisperBatcher
+
+    torch.set_num_threads(args.threads)
+    batcher = WhisperBatcher(whisper.load_model(args.model, device="cpu"))
+    loaded_mb = peak_rss_mb()
+
+    quiet = open(os.devnull, "w")
+    stdout, sys.stdout = sys.stdout, quiet
+    start = time.perf_counter()
+    try:
+        windows = sliding_windows(
+            stream_waveform(data, sample_rate=AUDIO_SAMPLE_RATE),
+            window=int(WINDOW_SECONDS * AUDIO_SAMPLE_RATE),
+            overlap=int(OVERLAP_SECONDS * AUDIO_SAMPLE_RATE),
+        )
+        text = batcher.transcribe_windows(
+            windows, language=args.language, task="transcribe"
+        )
+    finally:
+        sys.stdout = stdout
+        quiet.close()
+    elapsed = time.perf_counter() - start
+    results.put(
+        {
+            "minutes": minutes,
+            "input_mb": round(len(data) / 2**20, 1),
+            "elapsed_s": round(elapsed, 1),
+            "rtf": round(elapsed / (minutes * 60), 3),
+            "rss_after_load_mb": round(loaded_mb, 1),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "batch_sizes": dict(sorted(batcher.batch_sizes.items())),
+            "words": len(text.split()),
+        }
+    )
+
+
+def bench_longform(args):
+    """Real-time factor and peak memory of sliding-window transcription.
+
+    The input note is held in memory as the request body would be, so it
+    counts towards the peak; the decoded waveform should not grow with it.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for minutes in args.minutes:
+        seconds = minutes * 60
+        data = read_note(args.audio, seconds) if args.audio else synthetic_note(seconds)
+        queue = context.Queue()
+        process = context.Process(
+            target=transcribe_long_note, args=(args, minutes, data, queue)
+        )
+        process.start()
+        results.append(queue.get())
+        process.join()
+    return results
+
+
+def word_errors(reference: list, hypothesis: list) -> int:
+    """Word-level edit distance."""
+    previous = list(range(len(hypothesis) + 1))
+    for i, word in enumerate(reference, 1):
+        current = [i]
+        for j, other in enumerate(hypothesis, 1):
+            current.append(
+                min(
+                    previous[j] + 1,  # deletion
+                    current[j - 1] + 1,  # insertion
+                    previous[j - 1] + (word != other),  # substitution
+                )
+            )
+        previous = current
+    return previous[-1]
+
+
+def bench_cpu_profile(args):
+    """Word error rate and real-time factor of Whisper checkpoints on CPU,
+    in full precision and with int8 linear layers, through the app's path.
+
+    --audio-dir holds the notes, each with its reference transcript next to
+    it in a .txt file of the same name.
+    """
+    import whisper
+    from whisper.normalizers import BasicTextNormalizer
+
+    sys.path.insert(0, WHISPER_APP)
+    from batching import WhisperBatcher
+
+    normalize = BasicTextNormalizer()
+    notes = []
+    for path in sorted(glob.glob(os.path.join(args.audio_dir, "*"))):
+        reference = os.path.splitext(path)[0] + ".txt"
+        if path.endswith(".txt") or not os.path.exists(reference):
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        with open(reference) as f:
+            words = normalize(f.read()).split()
+        # Opus headers often lack the length, so it is measured by decoding
+        waveform = load_waveform(data, sample_rate=AUDIO_SAMPLE_RATE)
+        seconds = len(waveform) / AUDIO_SAMPLE_RATE
+        notes.append((data, words, seconds))
+    if not notes:
+        raise SystemExit(f"No notes with a reference transcript in {args.audio_dir}")
+    audio_seconds = sum(seconds for _, _, seconds in notes)
+
+    results = []
+    for threads in args.threads:
+        tune_threads(threads)
+        for name in args.models:
+            for quantized in (False, True):
+                start = time.perf_counter()
+                model = whisper.load_model(name, device="cpu")
+                if quantized:
+                    quantize_linear_layers(model, (whisper.model.Linear,))
+                load_s = time.perf_counter() - start
+                batcher = WhisperBatcher(model)
+
+                errors = reference_words = 0
+                quiet = open(os.devnull, "w")
+                stdout, sys.stdout = sys.stdout, quiet
+                start = time.perf_counter()
+                try:
+                    for data, words, _ in notes:
+                        windows = sliding_windows(
+                            stream_waveform(data, sample_rate=AUDIO_SAMPLE_RATE),
+                            window=int(WINDOW_SECONDS * AUDIO_SAMPLE_RATE),
+                            overlap=int(OVERLAP_SECONDS * AUDIO_SAMPLE_RATE),
+                        )
+                        text = batcher.transcribe_windows(
+                            windows, language=args.language, task="transcribe"
+                        )
+                        errors += word_errors(words, normalize(text).split())
+                        reference_words += len(words)
+                finally:
+                    sys.stdout = stdout
+                    quiet.close()
+                elapsed = time.perf_counter() - start
+                results.append(
+                    {
+                        "model": name,
+                        "int8": quantized,
+                        "threads": threads,
+                        "load_s": round(load_s, 1),
+                        "wer": round(errors / max(reference_words, 1), 4),
+                        "rtf": round(elapsed / audio_seconds, 3),
+                    }
+                )
+    return {
+        "notes": len(notes),
+        "audio_seconds": round(audio_seconds, 1),
+        "results": results,
+    }
+
+
+def cold_start(args, variant: str, results):
+    """Loads Whisper in a fresh process like a cold container would, then
+    times the first request."""
+    import whisper
+
+    sys.path.insert(0, WHISPER_APP)
+    from batching import WhisperBatcher
+    from weights import load_checkpoint
+
+    device = torch.device("cpu")
+    timer = ColdStartTimer(device)
+    if variant == "load_model":
+        with timer.stage("whisper.load_model"):
+            model = whisper.load_model(
+                args.model, device=device, download_root=args.cache
+            )
+    else:
+        model = load_checkpoint(
+            args.model, device, download_root=args.cache, timer=timer
+        )
+    batcher = WhisperBatcher(model)
+    silence = torch.zeros(int(5 * AUDIO_SAMPLE_RATE))
+    if args.warmup:
+        with timer.stage("warmup"):
+            batcher.transcribe(silence, language="en", task="transcribe")
+    quiet = open(os.devnull, "w")
+    stdout, sys.stdout = sys.stdout, quiet
+    try:
+        report = timer.report()
+    finally:
+        sys.stdout = stdout
+        quiet.close()
+
+    note = torch.randn(int(10 * AUDIO_SAMPLE_RATE)) * 0.1
+    start = time.perf_counter()
+    batcher.transcribe(note, language="en", task="transcribe")
+    report["first_request"] = round(time.perf_counter() - start, 2)
+    results.put({"variant": variant, "seconds": report})
+
+
+def bench_coldstart(args):
+    """Cold starts with whisper.load_model, with the first load that writes
+    the safetensors snapshot, and with the snapshot already on the volume.
+
+    Run it twice with a fresh --cache to include the download. The OS page
+    cache stays warm between runs, so reads from a cold volume are slower.
+    """
+    context = multiprocessing.get_context("spawn")
+    snapshot = os.path.join(args.cache, f"{args.model}.safetensors")
+    if os.path.exists(snapshot):
+        os.remove(snapshot)
+    results = []
+    for variant in ("load_model", "first snapshot", "snapshot"):
+        queue = context.Queue()
+        process = context.Process(target=cold_start, args=(args, variant, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+    return results
+
+
+def bench_residency(args):
+    """Hit rates, loads and evictions of the multi-model app's residency
+    manager for a few memory budgets, with simulated models: loading one
+    sleeps `load_seconds_per_gb` per GB, a request `request_ms`.
+
+    Requests pick models with Zipf-like popularity, the first model the most.
+    """
+    sys.path.insert(0, MULTI_APP)
+    from residency import GB, ModelResidency
+
+    sizes = {
+        name: float(size)
+        for name, size in (model.split("=") for model in args.models)
+    }
+    rng = random.Random(args.seed)
+    weights = [1 / rank**args.skew for rank in range(1, len(sizes) + 1)]
+    mix = [
+        (name, None)
+        for name in rng.choices(list(sizes), weights=weights, k=args.requests)
+    ]
+
+    def loader(name):
+        def load():
+            time.sleep(sizes[name] * args.load_seconds_per_gb)
+            return name
+
+        return load
+
+    results = []
+    for budget in args.budgets_gb:
+        residency = ModelResidency(
+            {name: loader(name) for name in sizes},
+            budget=int(budget * GB),
+            sizeof=lambda name: int(sizes[name] * GB),
+            estimates={name: int(size * GB) for name, size in sizes.items()},
+        )
+        peak = [0.0]
+
+        def transcribe(name, language):
+            with residency.use(name):
+                peak[0] = max(peak[0], residency.stats()["used_gb"])
+                time.sleep(args.request_ms / 1000)
+
+        quiet = open(os.devnull, "w")
+        stdout, sys.stdout = sys.stdout, quiet
+        try:
+            elapsed, latencies = run_clients(transcribe, mix, args.concurrency)
+        finally:
+            sys.stdout = stdout
+            quiet.close()
+        stats = residency.stats()
+        results.append(
+            {
+                "budget_gb": budget,
+                "peak_used_gb": peak[0],
+                "hit_rate": stats["hit_rate"],
+                "loads": sum(model["loads"] for model in stats["models"].values()),
+                "evictions": sum(
+                    model["evictions"] for model in stats["models"].values()
+                ),
+                "models": {
+                    name: {key: model[key] for key in ("hits", "misses", "evictions")}
+                    for name, model in stats["models"].items()
+                },
+                **latency_summary(f"{budget} GB", elapsed, latencies),
+            }
+        )
+    return {"models_gb": sizes, "skew": args.skew, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    preprocess = subparsers.add_parser(
+        "preprocess", help="temp-file round trips vs in-memory decode and resample"
+    )
+    preprocess.add_argument("--seconds", type=float, nargs="+", default=[10, 60, 240])
+    preprocess.add_argument(
+        "--audio", help="a voice note to use instead of synthetic noise"
+    )
+    preprocess.add_argument("--max-length", type=float, default=240)
+    preprocess.add_argument("--repeat", type=int, default=20)
+    preprocess.set_defaults(fn=bench_preprocess)
+
+    resample = subparsers.add_parser(
+        "resample", help="per-call sinc kernels vs cached downmixing resamplers"
+    )
+    resample.add_argument(
+        "--seconds", type=float, nargs="+", default=[1, 5, 15, 60, 240]
+    )
+    resample.add_argument("--channels", type=int, nargs="+", default=[1, 2])
+    resample.add_argument("--device", default="cpu")
+    resample.add_argument("--repeat", type=int, default=20)
+    resample.set_defaults(fn=bench_resample)
+
+    batching = subparsers.add_parser(
+        "batching", help="one request at a time vs dynamic batching, on CPU"
+    )
+    batching.add_argument("--model", default="tiny")
+    batching.add_argument("--audio", help="a voice note to cut the clips from")
+    batching.add_argument("--seconds", type=float, nargs="+", default=[5, 10, 20])
+    batching.add_argument("--languages", nargs="+", default=["en", "it"])
+    batching.add_argument("--requests", type=int, default=48)
+    batching.add_argument("--concurrency", type=int, default=8)
+    batching.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8])
+    batching.add_argument("--waits-ms", type=float, nargs="+", default=[10, 50, 200])
+    batching.set_defaults(fn=bench_batching)
+
+    longform = subparsers.add_parser(
+        "longform", help="real-time factor and peak memory of long notes, on CPU"
+    )
+    longform.add_argument("--model", default="tiny")
+    longform.add_argument("--audio", help="a voice note, repeated to each length")
+    longform.add_argument("--minutes", type=float, nargs="+", default=[1, 5, 10, 30])
+    longform.add_argument("--language", default="en")
+    longform.add_argument("--threads", type=int, default=4)
+    longform.set_defaults(fn=bench_longform)
+
+    cpu_profile = subparsers.add_parser(
+        "cpu-profile", help="WER and real-time factor, fp32 vs int8, on CPU"
+    )
+    cpu_profile.add_argument("--audio-dir", required=True)
+    cpu_profile.add_argument("--models", nargs="+", default=["tiny", "base", "small"])
+    cpu_profile.add_argument("--threads", type=int, nargs="+", default=[4, 8])
+    cpu_profile.add_argument("--language", default="en")
+    cpu_profile.set_defaults(fn=bench_cpu_profile)
+
+    coldstart = subparsers.add_parser(
+        "coldstart", help="stages of a Whisper cold start and the first request"
+    )
+    coldstart.add_argument("--model", default="tiny")
+    coldstart.add_argument("--cache", default="./cache")
+    coldstart.add_argument(
+        "--no-warmup", dest="warmup", action="store_false", help="skip the warmup pass"
+    )
+    coldstart.set_defaults(fn=bench_coldstart)
+
+    residency = subparsers.add_parser(
+        "residency", help="LRU model residency under memory budgets, simulated"
+    )
+    residency.add_argument(
+        "--models",
+        nargs="+",
+        default=["Whisper=6.2", "SeamlessM4T=5.5", "Whisper Turbo=3.2"],
+        help="name=size in GB, most requested first",
+    )
+    residency.add_argument("--budgets-gb", type=float, nargs="+", default=[7, 10, 15])
+    residency.add_argument("--skew", type=float, default=1.2)
+    residency.add_argument("--requests", type=int, default=600)
+    residency.add_argument("--concurrency", type=int, default=8)
+    residency.add_argument("--request-ms", type=float, default=20)
+    residency.add_argument("--load-seconds-per-gb", type=float, default=0.05)
+    residency.add_argument("--seed", type=int, default=0)
+    residency.set_defaults(fn=bench_residency)
+
+    args = parser.parse_args()
+    print(json.dumps(args.fn(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
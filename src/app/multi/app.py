@@ -0,0 +1,130 @@
+"""Whisper large, Whisper turbo and SeamlessM4T behind one endpoint.
+
+    > beam deploy app.py:transcribe_upload
+
+Requests pick a model with the `model` parameter. Models are loaded on first
+use and the least recently used ones are evicted to stay within the memory
+budget (see residency.py); GET /stats reports loads, evictions and hit rates.
+"""
+import gc
+import threading
+
+import seamless_app
+import torch
+import whisper_app
+from beam import App, Image, Runtime, Volume, VolumeType
+from http_api import PARAMETERS, build_api
+from inference import DEVICE, PROFILE, RESOURCES, RUNNING_PROFILE
+from residency import GB, ModelResidency
+
+# in GB, the weights all models can take together; None is a share of the
+# GPU's memory, or of the container's without one
+MEMORY_BUDGET_GB = None
+MEMORY_BUDGET_SHARE = 0.7
+CONTAINER_MEMORY_GB = 16
+DEFAULT_MODEL = "Whisper"
+
+# model name -> function that loads it; the checkpoints are pinned, not the
+# inference profile's, so a name serves the same model on every profile
+LOADERS = {
+    "Whisper": lambda: whisper_app.load_model("large"),
+    "Whisper Turbo": lambda: whisper_app.load_model("turbo"),
+    "SeamlessM4T": seamless_app.load_model,
+}
+# model name -> function that transcribes with it once loaded
+TRANSCRIBERS = {
+    "Whisper": whisper_app.transcribe,
+    "Whisper Turbo": whisper_app.transcribe,
+    "SeamlessM4T": seamless_app.transcribe,
+}
+# in GB per inference profile, until a model is loaded and measured
+ESTIMATED_SIZES_GB = {
+    "gpu": {"Whisper": 6.2, "Whisper Turbo": 3.2, "SeamlessM4T": 5.5},
+    "cpu": {"Whisper": 3.1, "Whisper Turbo": 1.5, "SeamlessM4T": 3.0},
+}
+# Translator.predict is not safe to call concurrently, the Whisper batchers are
+LOCKS = {"SeamlessM4T": threading.Lock()}
+
+app = App(
+    name="multi",
+    runtime=Runtime(
+        **{**RESOURCES[PROFILE], "memory": f"{CONTAINER_MEMORY_GB}Gi"},
+        image=Image(
+            python_packages=[
+                # stream_waveform's torchaudio.io was removed in torchaudio 2.9
+                "torchaudio<2.9",
+                "git+https://github.com/openai/whisper.git",
+                "git+https://github.com/facebookresearch/seamless_communication.git",
+                "fastapi",
+                "python-multipart",
+                "safetensors",
+            ],
+            commands=["apt-get update && apt-get install -y ffmpeg"],
+        ),
+    ),
+    volumes=[Volume(path="./cache", name="cache")],
+)
+
+
+def memory_budget() -> int:
+    if MEMORY_BUDGET_GB is not None:
+        return int(MEMORY_BUDGET_GB * GB)
+    if DEVICE.type == "cuda":
+        total = torch.cuda.get_device_properties(DEVICE).total_memory
+    else:
+        total = CONTAINER_MEMORY_GB * GB
+    return int(MEMORY_BUDGET_SHARE * total)
+
+
+def sizeof(model) -> int:
+    """Bytes taken by the weights and buffers of a loaded model: a
+    WhisperBatcher's model, or a Translator."""
+    module = model if isinstance(model, torch.nn.Module) else model.model
+    tensors = dict()
+    for value in module.state_dict().values():
+        # int8 linear layers keep their weight and bias as a tuple
+        for tensor in value if isinstance(value, tuple) else (value,):
+            if isinstance(tensor, torch.Tensor):
+                tensors[tensor.data_ptr()] = tensor.nelement() * tensor.element_size()
+    return sum(tensors.values())
+
+
+def unload(model):
+    if hasattr(model, "close"):
+        model.close()  # a WhisperBatcher's thread holds on to its model
+    gc.collect()
+    if DEVICE.type == "cuda":
+        torch.cuda.empty_cache()
+
+
+residency = ModelResidency(
+    LOADERS,
+    budget=memory_budget(),
+    sizeof=sizeof,
+    unload=unload,
+    estimates={
+        name: int(size * GB)
+        for name, size in ESTIMATED_SIZES_GB[RUNNING_PROFILE].items()
+    },
+)
+
+
+def transcribe(data: bytes, model: str = DEFAULT_MODEL, **parameters) -> dict:
+    if model not in LOADERS:
+        return {"transcript": f"Model {model} not supported."}
+    with residency.use(model) as loaded, LOCKS.get(model, threading.Lock()):
+        return TRANSCRIBERS[model](loaded, data, **parameters)
+
+
+@app.asgi(keep_warm_seconds=120)
+def transcribe_upload():
+    """Like the single-model apps' transcribe_upload, plus a `model`
+    parameter and GET /stats."""
+    with residency.use(DEFAULT_MODEL):
+        pass  # loaded before the first user, like the single-model apps
+    return build_api(
+        transcribe,
+        serialize=False,
+        parameters=PARAMETERS + ("model",),
+        stats=residency.stats,
+    )
@@ -0,0 +1 @@
+../whisper/batching.py
\ No newline at end of file
@@ -0,0 +1 @@
+../../inference.py
\ No newline at end of file
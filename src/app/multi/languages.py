@@ -0,0 +1 @@
+../../languages.py
\ No newline at end of file
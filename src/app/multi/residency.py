@@ -0,0 +1,176 @@
+"""Which models are loaded, under a memory budget.
+
+Models are loaded on first use and kept until room is needed for another
+one, when the least recently used models that no request is using are
+evicted. Models are loaded one at a time, and while a load waits for models
+in use to be done, no new requests start on them. Loads, evictions, hits and
+misses are counted for /stats.
+"""
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+
+GB = 2**30
+
+
+class ModelResidency:
+    """`loaders` maps model names to functions that load them, `estimates`
+    maps them to their size in bytes until they have been loaded once and
+    `sizeof(model)` measured. `unload(model)` frees a model being evicted."""
+
+    def __init__(
+        self,
+        loaders: dict,
+        budget: int,
+        sizeof,
+        unload=None,
+        estimates: dict = None,
+        max_events: int = 100,
+    ):
+        self.loaders = loaders
+        self.budget = budget
+        self.sizeof = sizeof
+        self.unload = unload
+        self.sizes = dict(estimates or {})
+        self.hits = Counter()
+        self.misses = Counter()
+        self.loads = Counter()
+        self.evictions = Counter()
+        self.events = deque(maxlen=max_events)
+        self._resident = OrderedDict()  # name -> model, least recently used first
+        self._loading = None  # (name, bytes reserved for it)
+        self._making_room = False
+        self._in_use = Counter()
+        self._condition = threading.Condition()
+
+    def use(self, name: str) -> "ModelLease":
+        """`with residency.use(name) as model:` keeps `model` loaded for the
+        duration of the block."""
+        return ModelLease(self, name)
+
+    def resident(self) -> list:
+        with self._condition:
+            return list(self._resident)
+
+    def _used(self) -> int:
+        used = sum(self.sizes.get(name, 0) for name in self._resident)
+        return used + (self._loading[1] if self._loading else 0)
+
+    def _event(self, event: str, name: str, **details):
+        entry = dict(time=round(time.time(), 3), event=event, model=name, **details)
+        self.events.append(entry)
+        print(f"Model residency: {entry}")
+
+    def _evict(self, name: str):
+        model = self._resident.pop(name)
+        self.evictions[name] += 1
+        self._event("evict", name, size_gb=round(self.sizes.get(name, 0) / GB, 2))
+        if self.unload is not None:
+            self.unload(model)
+
+    def _evict_idle(self) -> bool:
+        """Evicts idle models, least recently used first, while over budget.
+        Returns whether that was enough."""
+        while self._used() > self.budget:
+            idle = [name for name in self._resident if not self._in_use[name]]
+            if not idle:
+                return False
+            self._evict(idle[0])
+        return True
+
+    def _make_room(self):
+        """Makes room for the model being loaded, waiting for models in use
+        if evicting idle ones is not enough. Goes over budget if the model
+        does not fit on its own."""
+        self._making_room = True
+        try:
+            while not self._evict_idle() and self._resident:
+                self._condition.wait()
+        finally:
+            self._making_room = False
+            self._condition.notify_all()
+
+    def acquire(self, name: str):
+        if name not in self.loaders:
+            raise KeyError(name)
+        with self._condition:
+            while True:
+                if name in self._resident and not self._making_room:
+                    self.hits[name] += 1
+                    self._resident.move_to_end(name)
+                    self._in_use[name] += 1
+                    return self._resident[name]
+                if name not in self._resident and self._loading is None:
+                    break
+                self._condition.wait()
+
+            self.misses[name] += 1
+            self._loading = (name, self.sizes.get(name, 0))
+            self._make_room()
+
+        start = time.perf_counter()
+        try:
+            model = self.loaders[name]()
+            size = self.sizeof(model)
+        except Exception:
+            with self._condition:
+                self._loading = None
+                self._condition.notify_all()
+            raise
+        with self._condition:
+            self._loading = None
+            self.sizes[name] = size
+            self._resident[name] = model
+            self._in_use[name] += 1
+            self.loads[name] += 1
+            # the estimate may have been too low
+            self._evict_idle()
+            self._event(
+                "load",
+                name,
+                seconds=round(time.perf_counter() - start, 2),
+                size_gb=round(size / GB, 2),
+                over_budget=self._used() > self.budget,
+            )
+            self._condition.notify_all()
+        return model
+
+    def release(self, name: str):
+        with self._condition:
+            self._in_use[name] -= 1
+            self._condition.notify_all()
+
+    def stats(self) -> dict:
+        with self._condition:
+            requests = sum(self.hits.values()) + sum(self.misses.values())
+            return {
+                "budget_gb": round(self.budget / GB, 2),
+                "used_gb": round(self._used() / GB, 2),
+                "resident": list(self._resident),
+                "hit_rate": round(sum(self.hits.values()) / requests, 4)
+                if requests
+                else None,
+                "models": {
+                    name: {
+                        "size_gb": round(self.sizes.get(name, 0) / GB, 2),
+                        "hits": self.hits[name],
+                        "misses": self.misses[name],
+                        "loads": self.loads[name],
+                        "evictions": self.evictions[name],
+                    }
+                    for name in self.loaders
+                },
+                "events": list(self.events),
+            }
+
+
+class ModelLease:
+    def __init__(self, residency: ModelResidency, name: str):
+        self.residency = residency
+        self.name = name
+
+    def __enter__(self):
+        return self.residency.acquire(self.name)
+
+    def __exit__(self, *exc_info):
+        self.residency.release(self.name)
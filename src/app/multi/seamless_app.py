@@ -0,0 +1 @@
+../seamlessM4T/app.py
\ No newline at end of file
@@ -0,0 +1 @@
+../whisper/weights.py
\ No newline at end of file
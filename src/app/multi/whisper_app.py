@@ -0,0 +1 @@
+../whisper/app.py
\ No newline at end of file
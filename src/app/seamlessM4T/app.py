@@ -1,28 +1,57 @@
 import base64
-import tempfile
-from subprocess import run
-from tempfile import NamedTemporaryFile
 
 import torch
-import torchaudio
+from audio import (
+    TELEGRAM_SAMPLE_RATE,
+    decode_base64,
+    get_resampler,
+    silent_wav,
+    stream_waveform,
+)
 from beam import App, Image, Runtime, Volume, VolumeType
-from lang_list import LANGUAGE_NAME_TO_CODE
+from coldstart import ColdStartTimer
+from fairseq2.nn.projection import Linear
+from http_api import build_api
+from inference import (
+    DEVICE,
+    PROFILE,
+    RESOURCES,
+    RUNNING_PROFILE,
+    quantize_linear_layers,
+    tune_threads,
+)
+from languages import language_code
+from longform import (
+    MAX_OVERLAP_WORDS,
+    OVERLAP_SECONDS,
+    WINDOW_SECONDS,
+    merge_overlap,
+    sliding_windows,
+)
 from seamless_communication.models.inference import Translator
 
 AUDIO_SAMPLE_RATE = 16000.0
-MAX_INPUT_AUDIO_LENGTH = 60  # in seconds
+# per inference profile, see inference.py; the cpu one runs int8 weights
+CHECKPOINTS = {"gpu": "seamlessM4T_large", "cpu": "seamlessM4T_medium"}
+# in seconds, notes longer than a window are transcribed in overlapping windows
+MAX_INPUT_AUDIO_LENGTH = None
+WARMUP_SECONDS = 5
 
 app = App(
     name="seamlessM4T",
     runtime=Runtime(
-        cpu=4,
-        memory="8Gi",
-        gpu="T4",
+        **RESOURCES[PROFILE],
         image=Image(
             python_packages=[
-                "git+https://github.com/facebookresearch/seamless_communication.git"
+                # stream_waveform's torchaudio.io was removed in torchaudio 2.9
+                "torchaudio<2.9",
+                "git+https://github.com/facebookresearch/seamless_communication.git",
+                "fastapi",
+                "python-multipart",
+                "safetensors",
             ],
-            commands=[],
+            # torchaudio.io decodes with the FFmpeg libraries
+            commands=["apt-get update && apt-get install -y ffmpeg"],
         ),
     ),
     volumes=[Volume(path="./cache", name="cache")],
@@ -30,70 +59,93 @@ app = App(
 
 
 def load_model():
+    timer = ColdStartTimer(DEVICE)
     torch.hub.set_dir("./cache")
-    device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+    get_resampler(TELEGRAM_SAMPLE_RATE, AUDIO_SAMPLE_RATE, DEVICE)
 
     # Initialize a Translator object with a multitask model, vocoder on the GPU.
-    translator = Translator(
-        "seamlessM4T_large",
-        vocoder_name_or_card="vocoder_36langs",
-        device=device,
-    )
-
-    return translator
+    # It downloads, deserializes and moves the model in one go
+    with timer.stage("download, deserialization and device transfer"):
+        translator = Translator(
+            CHECKPOINTS[RUNNING_PROFILE],
+            vocoder_name_or_card="vocoder_36langs",
+            device=DEVICE,
+        )
+    if RUNNING_PROFILE == "cpu":
+        with timer.stage("quantization"):
+            tune_threads()
+            quantize_linear_layers(translator.model, (Linear,))
 
+    with timer.stage("warmup"):
+        transcribe(translator, silent_wav(WARMUP_SECONDS), target_language="English")
+    timer.report()
 
-@app.rest_api(keep_warm_seconds=120, loader=load_model)
-def transcribe_audio(**inputs):
-    translator = inputs["context"]
+    return translator
 
-    target_language = inputs.get("target_language", "Italian")
-    task_name = inputs.get("task_name", "asr")
 
+def transcribe(
+    translator, data: bytes, target_language: str = "Italian", task_name: str = "asr"
+) -> dict:
     # source_language_code = (
     # LANGUAGE_NAME_TO_CODE[source_language] if source_language else None
     # )
-    target_language_code = LANGUAGE_NAME_TO_CODE[target_language]
+    target_language_code = language_code("seamless", target_language)
+    if target_language_code is None:
+        return {"transcript": f"Target language {target_language} not supported."}
+
+    chunks = stream_waveform(
+        data,
+        sample_rate=AUDIO_SAMPLE_RATE,
+        max_length=MAX_INPUT_AUDIO_LENGTH,
+        device=DEVICE,
+    )
+    windows = sliding_windows(
+        chunks,
+        window=int(WINDOW_SECONDS * AUDIO_SAMPLE_RATE),
+        overlap=int(OVERLAP_SECONDS * AUDIO_SAMPLE_RATE),
+    )
 
-    f1 = tempfile.NamedTemporaryFile()
-    received_data = base64.b64decode(inputs["audio_file"].encode("utf-8"))
-    f1.write(received_data)
+    # Translator.predict takes one input at a time, so windows run in turn and
+    # their transcripts are merged word by word
+    words = []
+    for window in windows:
+        # a tensor input is taken as an already decoded (frames, channels) waveform
+        text_out, wav, sr = translator.predict(
+            input=window.unsqueeze(1),
+            task_str=task_name,
+            tgt_lang=target_language_code,
+            # src_lang=source_language_code,
+            ngram_filtering=True,
+            sample_rate=int(AUDIO_SAMPLE_RATE),
+        )
+        words = merge_overlap(
+            words, str(text_out).split(), max_overlap=MAX_OVERLAP_WORDS
+        )
 
-    arr, org_sr = torchaudio.load(f1.name)
+    return {"transcript": " ".join(words)}
 
-    print("Original SR:", org_sr)
 
-    f1.close()
-    new_arr = (
-        torchaudio.functional.resample(
-            arr, orig_freq=org_sr, new_freq=AUDIO_SAMPLE_RATE
-        )
-        if org_sr != AUDIO_SAMPLE_RATE
-        else arr
+@app.rest_api(keep_warm_seconds=120, loader=load_model)
+def transcribe_audio(**inputs):
+    return transcribe(
+        inputs["context"],
+        decode_base64(inputs["audio_file"]),
+        target_language=inputs.get("target_language", "Italian"),
+        task_name=inputs.get("task_name", "asr"),
     )
 
-    # trim to max audio length
-    max_length = int(MAX_INPUT_AUDIO_LENGTH * AUDIO_SAMPLE_RATE)
-    if new_arr.shape[1] > max_length:
-        new_arr = new_arr[:, :max_length]
-        print(
-            f"Input audio is too long. Only the first {MAX_INPUT_AUDIO_LENGTH} seconds is used."
-        )
 
-    f2 = tempfile.NamedTemporaryFile(suffix=".wav")
-    torchaudio.save(f2.name, new_arr, sample_rate=int(AUDIO_SAMPLE_RATE))
+@app.asgi(keep_warm_seconds=120)
+def transcribe_upload():
+    """Same as transcribe_audio, with the audio as the raw request body.
 
-    text_out, wav, sr = translator.predict(
-        input=f2.name,
-        task_str=task_name,
-        tgt_lang=target_language_code,
-        # src_lang=source_language_code,
-        ngram_filtering=True,
+    > beam deploy app.py:transcribe_upload
+    """
+    translator = load_model()
+    return build_api(
+        lambda data, **parameters: transcribe(translator, data, **parameters)
     )
 
-    f2.close()
-    return {"transcript": str(text_out)}
-
 
 if __name__ == "__main__":
     """'
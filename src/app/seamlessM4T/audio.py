@@ -0,0 +1 @@
+../../audio.py
\ No newline at end of file
@@ -0,0 +1 @@
+../../longform.py
\ No newline at end of file
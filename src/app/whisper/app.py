@@ -1,90 +1,145 @@
 import base64
-import tempfile
 
 import torch
-import torchaudio
 import whisper
+from audio import (
+    TELEGRAM_SAMPLE_RATE,
+    decode_base64,
+    get_resampler,
+    silent_wav,
+    stream_waveform,
+)
+from batching import WhisperBatcher
 from beam import App, Image, Runtime, Volume, VolumeType
+from coldstart import ColdStartTimer
+from http_api import build_api
+from inference import (
+    DEVICE,
+    PROFILE,
+    RESOURCES,
+    RUNNING_PROFILE,
+    quantize_linear_layers,
+    tune_threads,
+)
+from languages import language_code
+from longform import OVERLAP_SECONDS, WINDOW_SECONDS, sliding_windows
+from weights import load_checkpoint
 from whisper.tokenizer import TO_LANGUAGE_CODE
 
 AUDIO_SAMPLE_RATE = 16000.0
-MAX_INPUT_AUDIO_LENGTH = 240  # in seconds
+# per inference profile, see inference.py; the cpu one runs int8 weights
+CHECKPOINTS = {"gpu": "large", "cpu": "small"}
+# in seconds, notes longer than a window are transcribed in overlapping windows
+MAX_INPUT_AUDIO_LENGTH = None
+# concurrent requests are batched for up to this long, or until this many wait
+BATCH_MAX_WAIT_MS = 50
+BATCH_MAX_SIZE = 8
+WARMUP_SECONDS = 5
 
 app = App(
     name="whisper",
     runtime=Runtime(
-        cpu=4,
-        memory="8Gi",
-        gpu="T4",
+        **RESOURCES[PROFILE],
         image=Image(
-            python_packages=["torchaudio", "git+https://github.com/openai/whisper.git"],
+            python_packages=[
+                # stream_waveform's torchaudio.io was removed in torchaudio 2.9
+                "torchaudio<2.9",
+                "git+https://github.com/openai/whisper.git",
+                "fastapi",
+                "python-multipart",
+                "safetensors",
+            ],
             commands=["apt-get update && apt-get install -y ffmpeg"],
         ),
     ),
     volumes=[Volume(path="./cache", name="cache")],
 )
 
-def load_model():
-    device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
-    model = whisper.load_model(
-        "large", device=device, download_root="./cache"
+def load_model(checkpoint: str = None):
+    timer = ColdStartTimer(DEVICE)
+    get_resampler(TELEGRAM_SAMPLE_RATE, AUDIO_SAMPLE_RATE, DEVICE)
+    model = load_checkpoint(
+        checkpoint or CHECKPOINTS[RUNNING_PROFILE],
+        DEVICE,
+        download_root="./cache",
+        timer=timer,
+    )
+    if RUNNING_PROFILE == "cpu":
+        with timer.stage("quantization"):
+            tune_threads()
+            quantize_linear_layers(model, (whisper.model.Linear,))
+    batcher = WhisperBatcher(
+        model, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS
     )
-    return model
-
-
-@app.rest_api(keep_warm_seconds=120, loader=load_model)
-def transcribe_audio(**inputs):
-    model = inputs["context"]
 
-    # the bot gives languages in the SeamlessM4T format, so with initial capital letter
-    target_language = inputs.get("target_language", "Italian").lower()
-    task_name = inputs.get("task_name", "transcribe")
-    
-    if target_language not in TO_LANGUAGE_CODE:
+    # one request through the whole path, then a full batch, so that decoding,
+    # kernels and allocations are ready before the first user
+    with timer.stage("warmup"):
+        transcribe(batcher, silent_wav(WARMUP_SECONDS), target_language="English")
+        silence = torch.zeros(int(WARMUP_SECONDS * AUDIO_SAMPLE_RATE), device=DEVICE)
+        for future in [
+            batcher.submit(silence, language="en", task="transcribe")
+            for _ in range(BATCH_MAX_SIZE)
+        ]:
+            future.result()
+    timer.report()
+    return batcher
+
+
+def transcribe(
+    batcher: WhisperBatcher,
+    data: bytes,
+    target_language: str = "Italian",
+    task_name: str = "transcribe",
+) -> dict:
+    # the bot gives languages by their SeamlessM4T name, Whisper's own names work too
+    target_lang_code = language_code("whisper", target_language) or TO_LANGUAGE_CODE.get(
+        target_language.lower()
+    )
+    if target_lang_code is None:
         return {"transcript": f"Target language {target_language} not supported."}
-    target_lang_code = TO_LANGUAGE_CODE[target_language]
 
-    # source_language_code = (
-    # LANGUAGE_NAME_TO_CODE[source_language] if source_language else None
-    # )
-    # target_language_code = LANGUAGE_NAME_TO_CODE[target_language]
+    chunks = stream_waveform(
+        data,
+        sample_rate=AUDIO_SAMPLE_RATE,
+        max_length=MAX_INPUT_AUDIO_LENGTH,
+        device=DEVICE,
+    )
+    windows = sliding_windows(
+        chunks,
+        window=int(WINDOW_SECONDS * AUDIO_SAMPLE_RATE),
+        overlap=int(OVERLAP_SECONDS * AUDIO_SAMPLE_RATE),
+    )
 
-    f1 = tempfile.NamedTemporaryFile()
-    received_data = base64.b64decode(inputs["audio_file"].encode("utf-8"))
-    f1.write(received_data)
+    text = batcher.transcribe_windows(
+        windows, language=target_lang_code, task=task_name
+    )
 
-    arr, org_sr = torchaudio.load(f1.name)
+    return {"transcript": text}
 
-    print("Original SR:", org_sr)
 
-    f1.close()
-    new_arr = (
-        torchaudio.functional.resample(
-            arr, orig_freq=org_sr, new_freq=AUDIO_SAMPLE_RATE
-        )
-        if org_sr != AUDIO_SAMPLE_RATE
-        else arr
+@app.rest_api(keep_warm_seconds=120, loader=load_model)
+def transcribe_audio(**inputs):
+    return transcribe(
+        inputs["context"],
+        decode_base64(inputs["audio_file"]),
+        target_language=inputs.get("target_language", "Italian"),
+        task_name=inputs.get("task_name", "transcribe"),
     )
 
-    # trim to max audio length
-    max_length = int(MAX_INPUT_AUDIO_LENGTH * AUDIO_SAMPLE_RATE)
-    if new_arr.shape[1] > max_length:
-        new_arr = new_arr[:, :max_length]
-        print(
-            f"Input audio is too long. Only the first {MAX_INPUT_AUDIO_LENGTH} seconds is used."
-        )
-
-    f2 = tempfile.NamedTemporaryFile(suffix=".wav")
-    torchaudio.save(f2.name, new_arr, sample_rate=int(AUDIO_SAMPLE_RATE))
-
-    result = model.transcribe(
-        f2.name,
-        task=task_name,
-        language=target_lang_code
-    )
 
-    f2.close()
-    return {"transcript": result["text"]}
+@app.asgi(keep_warm_seconds=120)
+def transcribe_upload():
+    """Same as transcribe_audio, with the audio as the raw request body.
+
+    > beam deploy app.py:transcribe_upload
+    """
+    batcher = load_model()
+    # the batcher runs the model on its own thread, uploads need not wait
+    return build_api(
+        lambda data, **parameters: transcribe(batcher, data, **parameters),
+        serialize=False,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,216 @@
+"""Dynamic batching for Whisper.
+
+Requests wait for at most `max_wait_ms`, or until `max_batch_size` of them
+are queued, and then run together: one log-mel computation and one encoder
+pass for the whole batch, and one decoder pass per (language, task) group,
+since those two set the decoder's prompt.
+
+Decoding falls back like whisper.transcribe: items whose text repeats itself
+or is unlikely are decoded again at higher temperatures, and windows that
+are most likely silence come back empty instead of hallucinated.
+
+All model calls happen on the batcher's own thread, so callers on any
+number of threads can share one model. Notes longer than Whisper's 30 second
+window are cut into overlapping windows (see longform.py) that are batched
+like separate requests.
+"""
+import dataclasses
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import torch
+import whisper
+from longform import merge_overlap
+from whisper.audio import HOP_LENGTH, N_FFT, mel_filters, pad_or_trim
+from whisper.tokenizer import get_tokenizer
+
+MAX_BATCH_SIZE = 8
+MAX_WAIT_MS = 50
+# windows of one note in flight at a time, which bounds its memory use
+MAX_PENDING_WINDOWS = 4
+# whisper.transcribe's defaults
+TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+
+def log_mel_spectrogram(audio: torch.Tensor, n_mels: int) -> torch.Tensor:
+    """whisper.log_mel_spectrogram for a (batch, samples) tensor.
+
+    Whisper clamps each spectrogram to 8 below its own maximum, so the
+    maximum is taken per item instead of over the batch.
+    """
+    window = torch.hann_window(N_FFT, device=audio.device)
+    stft = torch.stft(audio, N_FFT, HOP_LENGTH, window=window, return_complex=True)
+    magnitudes = stft[..., :-1].abs() ** 2
+    mel_spec = mel_filters(audio.device, n_mels) @ magnitudes
+    log_spec = torch.clamp(mel_spec, min=1e-10).log10()
+    log_spec = torch.maximum(log_spec, log_spec.amax(dim=(-2, -1), keepdim=True) - 8.0)
+    return (log_spec + 4.0) / 4.0
+
+
+def is_silence(result) -> bool:
+    return (
+        result.no_speech_prob > NO_SPEECH_THRESHOLD
+        and result.avg_logprob < LOGPROB_THRESHOLD
+    )
+
+
+def needs_fallback(result) -> bool:
+    """Whether whisper.transcribe would decode `result` again at the next
+    temperature: its text repeats itself or is unlikely, and is not silence."""
+    if is_silence(result):
+        return False
+    return (
+        result.compression_ratio > COMPRESSION_RATIO_THRESHOLD
+        or result.avg_logprob < LOGPROB_THRESHOLD
+    )
+
+
+class Request:
+    def __init__(self, audio: torch.Tensor, language: str, task: str):
+        self.audio = audio
+        self.language = language
+        self.task = task
+        self.future = Future()
+        self.queued_at = time.monotonic()
+
+
+class WhisperBatcher:
+    """Batches transcriptions of up to 30 seconds of audio, Whisper's
+    window, with `model` on a background thread. Longer audio is cut."""
+
+    def __init__(
+        self,
+        model,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_wait_ms: float = MAX_WAIT_MS,
+    ):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.fp16 = model.device.type == "cuda"
+        self.tokenizer = get_tokenizer(
+            model.is_multilingual, num_languages=model.num_languages
+        )
+        self.batch_sizes = dict()  # batch size -> number of batches
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, audio: torch.Tensor, language: str, task: str) -> Future:
+        """Queues `audio`, a mono 16 kHz waveform. The future's result is
+        its whisper.DecodingResult."""
+        request = Request(audio, language, task)
+        self._queue.put(request)
+        return request.future
+
+    def transcribe(self, audio: torch.Tensor, language: str, task: str) -> str:
+        """Blocks until `audio` is transcribed."""
+        return self.submit(audio, language, task).result().text
+
+    def transcribe_windows(
+        self,
+        windows,
+        language: str,
+        task: str,
+        max_pending: int = MAX_PENDING_WINDOWS,
+    ) -> str:
+        """Transcribes the overlapping windows of a note and merges their
+        tokens. Up to `max_pending` windows are queued at once, to be batched
+        together and with other requests."""
+        pending = deque()
+        tokens = []
+        for window in windows:
+            pending.append(self.submit(window, language, task))
+            if len(pending) >= max_pending:
+                tokens = merge_overlap(tokens, pending.popleft().result().tokens)
+        while pending:
+            tokens = merge_overlap(tokens, pending.popleft().result().tokens)
+        return self.tokenizer.decode(tokens).strip()
+
+    def close(self):
+        """Stops the batching thread once the queued requests are done, so
+        the model can be freed."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _next_batch(self) -> list:
+        """The next batch, or None once closed."""
+        request = self._queue.get()
+        if request is None:
+            return None
+        batch = [request]
+        deadline = request.queued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)  # stop after this batch
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+            try:
+                results = self._transcribe_batch(batch)
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+            else:
+                for request, result in zip(batch, results):
+                    request.future.set_result(result)
+
+    @torch.no_grad()
+    def _transcribe_batch(self, requests: list) -> list:
+        audio = torch.stack(
+            [pad_or_trim(request.audio.to(self.model.device)) for request in requests]
+        )
+        mel = log_mel_spectrogram(audio, self.model.dims.n_mels)
+        audio_features = self.model.embed_audio(
+            mel.to(torch.float16 if self.fp16 else torch.float32)
+        )
+
+        groups = dict()
+        for i, request in enumerate(requests):
+            groups.setdefault((request.language, request.task), []).append(i)
+        results = [None] * len(requests)
+        for (language, task), indices in groups.items():
+            # the items that failed are decoded again, still as one batch
+            remaining = indices
+            for temperature in TEMPERATURES:
+                options = whisper.DecodingOptions(
+                    language=language,
+                    task=task,
+                    temperature=temperature,
+                    fp16=self.fp16,
+                    without_timestamps=True,
+                )
+                decoded = whisper.decode(self.model, audio_features[remaining], options)
+                for i, result in zip(remaining, decoded):
+                    results[i] = result
+                remaining = [
+                    i for i, result in zip(remaining, decoded) if needs_fallback(result)
+                ]
+                if not remaining:
+                    break
+        return [
+            dataclasses.replace(result, tokens=[], text="")
+            if is_silence(result)
+            else result
+            for result in results
+        ]
@@ -0,0 +1 @@
+../../coldstart.py
\ No newline at end of file
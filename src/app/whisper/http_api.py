@@ -0,0 +1 @@
+../../http_api.py
\ No newline at end of file
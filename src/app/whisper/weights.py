@@ -0,0 +1,83 @@
+"""Loading Whisper from a safetensors snapshot of its checkpoint.
+
+whisper.load_model unpickles the whole .pt checkpoint and randomly
+initializes a model only to overwrite it. Here the checkpoint is converted
+once into a snapshot on the ./cache volume; later cold starts map the
+snapshot and load it into a model built without initialization.
+"""
+import json
+import os
+
+import numpy as np
+import torch
+import whisper
+from coldstart import ColdStartTimer, load_snapshot, save_snapshot
+from whisper.model import ModelDimensions, Whisper
+
+
+def empty_model(dims: ModelDimensions) -> Whisper:
+    """Whisper(dims), with its weights on the meta device if possible."""
+    try:
+        with torch.device("meta"):
+            return Whisper(dims)
+    except (NotImplementedError, RuntimeError):
+        return Whisper(dims)
+
+
+def as_float32(state_dict: dict) -> dict:
+    """`state_dict` with floating point tensors in float32.
+
+    The checkpoints are fp16, but whisper.load_model copies them into a
+    float32 model, which its LayerNorms and quantize_dynamic rely on. Loading
+    with assign=True keeps the snapshot's dtype, so it is float32 too.
+    """
+    return {
+        name: tensor.float() if tensor.is_floating_point() else tensor
+        for name, tensor in state_dict.items()
+    }
+
+
+def load_checkpoint(
+    name: str, device: torch.device, download_root: str, timer: ColdStartTimer
+) -> Whisper:
+    snapshot = os.path.join(download_root, f"{name}.safetensors")
+    if not os.path.exists(snapshot):
+        with timer.stage("download"):
+            checkpoint_file = whisper._download(
+                whisper._MODELS[name], download_root, in_memory=False
+            )
+        with timer.stage("snapshot"):
+            checkpoint = torch.load(
+                checkpoint_file, map_location="cpu", mmap=True, weights_only=True
+            )
+            save_snapshot(
+                as_float32(checkpoint["model_state_dict"]),
+                snapshot,
+                metadata={"dims": json.dumps(checkpoint["dims"])},
+            )
+            del checkpoint
+
+    with timer.stage("deserialization"):
+        state_dict, metadata = load_snapshot(snapshot)
+        # snapshots written before they were converted hold fp16 weights
+        state_dict = as_float32(state_dict)
+        dims = ModelDimensions(**json.loads(metadata["dims"]))
+        model = empty_model(dims)
+        model.load_state_dict(state_dict, assign=True)
+        # the buffers that are not saved with the weights
+        n_ctx = dims.n_text_ctx
+        model.decoder.register_buffer(
+            "mask", torch.empty(n_ctx, n_ctx).fill_(-np.inf).triu_(1), persistent=False
+        )
+        model.set_alignment_heads(whisper._ALIGNMENT_HEADS[name])
+        missing = [
+            key
+            for key, tensor in [*model.named_parameters(), *model.named_buffers()]
+            if tensor.is_meta
+        ]
+        if missing:
+            raise RuntimeError(f"Not in the snapshot: {', '.join(missing)}")
+
+    with timer.stage("device transfer"):
+        model.to(device)
+    return model
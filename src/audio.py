@@ -0,0 +1,119 @@
+"""Audio preprocessing shared by the Beam apps in src/app, which link this
+file into their directories like languages.py.
+
+Voice notes are decoded, trimmed and resampled in memory: nothing is written
+to disk between the request body and the model. Long notes are streamed, a
+chunk at a time, so they are never held in memory whole.
+"""
+import base64
+import io
+import math
+import wave
+
+import torch
+import torchaudio
+
+# Telegram voice notes are 48 kHz Opus, the apps build this resampler up front
+TELEGRAM_SAMPLE_RATE = 48000
+CHUNK_SECONDS = 10  # decoded at a time when streaming
+
+
+def decode_base64(audio_file: str) -> bytes:
+    return base64.b64decode(audio_file.encode("utf-8"))
+
+
+def silent_wav(seconds: float, sample_rate: int = TELEGRAM_SAMPLE_RATE) -> bytes:
+    """A mono 16-bit WAV of silence, for warming up the apps."""
+    with io.BytesIO() as buf:
+        with wave.open(buf, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(sample_rate)
+            f.writeframes(b"\0\0" * int(seconds * sample_rate))
+        return buf.getvalue()
+
+
+class MonoResample(torch.nn.Module):
+    """Resamples a (channels, samples) waveform into a mono one.
+
+    The sinc kernel comes from torchaudio's Resample, built once. The downmix
+    is folded into it: the kernel is spread over the input channels, so every
+    channel is convolved in the same conv1d, not averaged in a separate pass.
+    """
+
+    def __init__(self, orig_freq: int, new_freq: int, device: torch.device):
+        super().__init__()
+        resample = torchaudio.transforms.Resample(orig_freq, new_freq).to(device)
+        self.orig_freq = int(orig_freq) // resample.gcd
+        self.new_freq = int(new_freq) // resample.gcd
+        self.width = resample.width
+        self.kernel = resample.kernel  # (new_freq, 1, kernel size)
+        self._weights = dict()  # number of channels -> downmixing kernel
+
+    def forward(self, waveform: torch.Tensor) -> torch.Tensor:
+        channels, length = waveform.shape
+        if self.orig_freq == self.new_freq:
+            return waveform.mean(dim=0)
+        weight = self._weights.get(channels)
+        if weight is None:
+            weight = self._weights[channels] = (
+                self.kernel.expand(-1, channels, -1) / channels
+            ).contiguous()
+        padded = torch.nn.functional.pad(
+            waveform, (self.width, self.width + self.orig_freq)
+        )
+        resampled = torch.nn.functional.conv1d(
+            padded[None], weight, stride=self.orig_freq
+        )
+        resampled = resampled[0].transpose(0, 1).reshape(-1)
+        return resampled[: math.ceil(self.new_freq * length / self.orig_freq)]
+
+
+_resamplers = dict()
+
+
+def get_resampler(orig_freq: int, new_freq: int, device) -> MonoResample:
+    """The resampler for these rates on `device`, built on first use."""
+    key = (int(orig_freq), int(new_freq), torch.device(device))
+    resampler = _resamplers.get(key)
+    if resampler is None:
+        resampler = _resamplers[key] = MonoResample(*key)
+    return resampler
+
+
+def stream_waveform(
+    data: bytes,
+    sample_rate: float,
+    max_length: float = None,
+    device="cpu",
+    chunk_seconds: float = CHUNK_SECONDS,
+):
+    """Decodes `data`, in any format FFmpeg reads, into a mono float32
+    waveform at `sample_rate` on `device`, yielded `chunk_seconds` at a time.
+    Only the first `max_length` seconds are decoded.
+
+    Each chunk is resampled on its own, which only touches the few samples
+    at either end of it that the sinc kernel would have taken from the next.
+    """
+    reader = torchaudio.io.StreamReader(io.BytesIO(data))
+    org_sr = int(reader.get_src_stream_info(reader.default_audio_stream).sample_rate)
+
+    print("Original SR:", org_sr)
+
+    reader.add_basic_audio_stream(frames_per_chunk=int(chunk_seconds * org_sr))
+    resampler = get_resampler(org_sr, sample_rate, device)
+    remaining = None if max_length is None else int(max_length * org_sr)
+    for (chunk,) in reader.stream():
+        chunk = chunk.T  # (frames, channels) -> (channels, frames)
+        if remaining is not None:
+            if chunk.shape[1] > remaining:
+                chunk = chunk[:, :remaining]
+                print(
+                    f"Input audio is too long. Only the first {max_length} seconds is used."
+                )
+            remaining -= chunk.shape[1]
+        with torch.no_grad():
+            resampled = resampler(chunk.to(device))
+        yield resampled
+        if remaining == 0:
+            break
@@ -0,0 +1,574 @@
+"""Speech-to-text backends and the router that picks one per request.
+
+Every backend (Fireworks, or one of our Beam apps) answers the same
+`transcribe(audio, language) -> str`. The router sends each request to the
+backend the user picked with /model, unless its circuit breaker is open or it
+is much slower right now than an equivalent backend, and fails over to the
+next one on errors.
+"""
+import asyncio
+import base64
+import logging
+import os
+import random
+import time
+from collections import deque
+
+import httpx
+from languages import language_code
+from typing import TYPE_CHECKING
+
+from metrics import errors_total, retries_total
+
+if TYPE_CHECKING:
+    # the fireworks client takes a quarter of a second to import, so the bot
+    # only imports it on the first transcription
+    from fireworks.client.audio import AudioInference
+    from fireworks.client.audio_api import TranscriptionResponse
+
+logger = logging.getLogger(__name__)
+
+# user-facing model name -> (fireworks model, base_url)
+FIREWORKS_BACKENDS = {
+    "Whisper v3": (
+        "whisper-v3",
+        "https://audio-prod.us-virginia-1.direct.fireworks.ai",
+    ),
+    "Whisper v3 Turbo": (
+        "whisper-v3-turbo",
+        "https://audio-turbo.us-virginia-1.direct.fireworks.ai",
+    ),
+}
+# user-facing model name -> (environment variable with the Beam endpoint, family)
+BEAM_BACKENDS = {
+    "SeamlessM4T": ("BEAM_SM4T_ENDPOINT", "seamless"),
+    "Whisper": ("BEAM_WHISPER_ENDPOINT", "whisper"),
+}
+# the app in src/app/multi serves these models, user-facing model name ->
+# family, behind one endpoint; models with an endpoint of their own use that
+BEAM_MULTI_ENDPOINT = "BEAM_MULTI_ENDPOINT"
+BEAM_MULTI_MODELS = {
+    "SeamlessM4T": "seamless",
+    "Whisper": "whisper",
+    "Whisper Turbo": "whisper",
+}
+# backends that run the same model family and can stand in for each other
+WHISPER_BACKENDS = ["Whisper v3 Turbo", "Whisper v3", "Whisper Turbo", "Whisper"]
+DEFAULT_MODEL = "Whisper v3 Turbo"
+
+# "binary" sends voice notes to the apps' transcribe_upload endpoints as the
+# raw request body, "json" base64-encodes them for transcribe_audio
+BEAM_UPLOAD = os.environ.get("BEAM_UPLOAD", "json")
+
+MAX_CONNECTIONS_PER_HOST = int(os.environ.get("ASR_MAX_CONNECTIONS_PER_HOST", 16))
+KEEPALIVE_EXPIRY = 120  # in seconds
+REQUEST_TIMEOUT = 600  # in seconds
+
+# circuit breakers: after this many failures in a row a backend is skipped for
+# BREAKER_RESET_TIMEOUT seconds, then a single request probes it again
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("ASR_BREAKER_FAILURES", 5))
+BREAKER_RESET_TIMEOUT = float(os.environ.get("ASR_BREAKER_RESET_TIMEOUT", 30))
+# routing: the picked backend is passed over if its average latency is this
+# many times that of an equivalent one
+SLOW_FACTOR = 2.0
+LATENCY_EWMA_ALPHA = 0.2
+ROUTING_MIN_SAMPLES = 10
+# share of requests sent to another candidate first, so we keep learning how
+# fast the backends we are not using are
+EXPLORE_RATE = 0.05
+
+# hedging: if the primary backend has not answered within this percentile of
+# its recent latencies, the same request also goes to the next backend
+HEDGE_PERCENTILE = float(os.environ.get("ASR_HEDGE_PERCENTILE", 0.95))
+HEDGE_MIN_DELAY = 0.5  # in seconds
+HEDGE_DEFAULT_DELAY = 5.0  # until we have HEDGE_MIN_SAMPLES latencies
+HEDGE_MIN_SAMPLES = 20
+
+
+class ASRUnavailableError(Exception):
+    pass
+
+
+def get_backend(model_choice: str):
+    """Maps the model picked with /model to a (model, base_url) pair."""
+    return FIREWORKS_BACKENDS.get(model_choice, FIREWORKS_BACKENDS[DEFAULT_MODEL])
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class ASRClientRegistry:
+    """Process-wide pool of AudioInference clients, keyed by (model, base_url).
+
+    `AudioInference.transcribe_async` opens a fresh httpx client on every call,
+    so we post through the long-lived async client each AudioInference owns
+    instead. Those are private attributes, hence the pinned fireworks-ai in
+    requirements.txt. That keeps keep-alive connections warm across voice notes, and a
+    semaphore per base_url bounds how many requests we have in flight per host.
+    """
+
+    def __init__(
+        self,
+        api_key: str = None,
+        max_connections_per_host: int = MAX_CONNECTIONS_PER_HOST,
+        request_timeout: float = REQUEST_TIMEOUT,
+    ):
+        self.api_key = api_key
+        self.max_connections_per_host = max_connections_per_host
+        self.request_timeout = request_timeout
+        self._clients = dict()
+        self._semaphores = dict()
+
+    def get(self, model: str, base_url: str) -> "AudioInference":
+        key = (model, base_url)
+        if key not in self._clients:
+            from fireworks.client.audio import AudioInference
+
+            logger.info(f"Creating ASR client for {model} at {base_url}")
+            self._clients[key] = AudioInference(
+                model=model,
+                base_url=base_url,
+                api_key=self.api_key or os.environ.get("FIREWORKS_API_KEY"),
+                request_timeout=self.request_timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections_per_host,
+                    max_keepalive_connections=self.max_connections_per_host,
+                    keepalive_expiry=KEEPALIVE_EXPIRY,
+                ),
+            )
+        return self._clients[key]
+
+    def _get_semaphore(self, base_url: str) -> asyncio.Semaphore:
+        if base_url not in self._semaphores:
+            self._semaphores[base_url] = asyncio.Semaphore(
+                self.max_connections_per_host
+            )
+        return self._semaphores[base_url]
+
+    async def transcribe(
+        self, model: str, base_url: str, audio, language: str = None
+    ) -> "TranscriptionResponse":
+        from fireworks.client.audio_api import TranscriptionRequest, TranscriptionResponse
+
+        client = self.get(model, base_url)
+        request = TranscriptionRequest(
+            model=model,
+            vad_model=client.vad_model,
+            alignment_model=client.alignment_model,
+            diarization_model=client.diarization_model,
+            language=language,
+        )
+
+        async with self._get_semaphore(base_url):
+            response = await client._async_client.post(
+                f"{base_url}/v1/audio/transcriptions",
+                data=request.to_multipart(),
+                files={"file": audio},
+                headers={"Accept": "application/json"},
+            )
+            await client._async_error_handling(response)
+
+        return TranscriptionResponse(**response.json())
+
+    async def aclose(self):
+        for (model, base_url), client in self._clients.items():
+            logger.info(f"Closing ASR client for {model} at {base_url}")
+            await client.aclose()
+        self._clients.clear()
+        self._semaphores.clear()
+
+
+class ASRBackend:
+    """A speech-to-text service. Subclasses implement `transcribe`.
+
+    `family` says which table of languages.py the backend's languages are in.
+    """
+
+    family = "whisper"
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def supports(self, language: str) -> bool:
+        return language is None or language_code(self.family, language) is not None
+
+    async def transcribe(self, audio: bytes, language: str = None) -> str:
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+
+class FireworksBackend(ASRBackend):
+    def __init__(self, name: str, registry: ASRClientRegistry, model: str, base_url: str):
+        super().__init__(name)
+        self.registry = registry
+        self.model = model
+        self.base_url = base_url
+
+    async def transcribe(self, audio: bytes, language: str = None) -> str:
+        response = await self.registry.transcribe(
+            self.model,
+            self.base_url,
+            audio=audio,
+            language=language and language_code(self.family, language),
+        )
+        return response.text
+
+
+class BeamBackend(ASRBackend):
+    """One of the `transcribe_audio` REST endpoints in src/app, or with
+    `upload="binary"` one of their `transcribe_upload` endpoints. They take the
+    language by name and look it up in languages.py themselves. `model` picks
+    the model on endpoints of the multi-model app."""
+
+    def __init__(
+        self,
+        name: str,
+        endpoint: str,
+        family: str = "whisper",
+        upload: str = BEAM_UPLOAD,
+        model: str = None,
+        client_id: str = None,
+        client_secret: str = None,
+        max_connections: int = MAX_CONNECTIONS_PER_HOST,
+        request_timeout: float = REQUEST_TIMEOUT,
+    ):
+        super().__init__(name)
+        self.endpoint = endpoint
+        self.family = family
+        if upload not in ("json", "binary"):
+            raise ValueError(f"Unknown upload format {upload}")
+        self.upload = upload
+        self.model = model
+        self.auth = (client_id, client_secret) if client_id else None
+        self.max_connections = max_connections
+        self.request_timeout = request_timeout
+        self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # created on first use, so forked webhook workers get their own
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                auth=self.auth,
+                timeout=self.request_timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=KEEPALIVE_EXPIRY,
+                ),
+            )
+        return self._client
+
+    async def transcribe(self, audio: bytes, language: str = None) -> str:
+        parameters = dict()
+        if language:
+            parameters["target_language"] = language
+        if self.model:
+            parameters["model"] = self.model
+        if self.upload == "binary":
+            response = await self.client.post(
+                self.endpoint,
+                content=audio,
+                params=parameters or None,
+                headers={
+                    "Accept": "application/json",
+                    "Content-Type": "application/octet-stream",
+                },
+            )
+        else:
+            data = {
+                "audio_file": base64.b64encode(audio).decode("utf-8"),
+                **parameters,
+            }
+            response = await self.client.post(
+                self.endpoint, json=data, headers={"Accept": "application/json"}
+            )
+        response.raise_for_status()
+        return response.json()["transcript"]
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class CircuitBreaker:
+    """Closed until `failure_threshold` failures in a row, then open for
+    `reset_timeout` seconds, then half-open: one probe decides whether it
+    closes again or stays open for another `reset_timeout`."""
+
+    def __init__(
+        self,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def available(self) -> bool:
+        state = self.state
+        return state == "closed" or (state == "half-open" and not self.probing)
+
+    def before_call(self):
+        if self.opened_at is not None:
+            self.probing = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self.probing:
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
+            self.probing = False
+
+    def release(self):
+        """The call was cancelled, so it tells us nothing."""
+        self.probing = False
+
+
+class ASRRouter:
+    """Routes each request for a /model choice to the best backend for it.
+
+    Candidates are the picked backend and, for Whisper, the other Whisper
+    backends. Backends with an open circuit are skipped, and if the picked
+    one is SLOW_FACTOR times slower (latency EWMA) than another candidate,
+    that one goes first. A few requests go to another candidate first to keep
+    its latency fresh. On errors we fail over down the list.
+
+    `registry` is the ASRClientRegistry the Fireworks backends share, closed
+    with the router.
+    """
+
+    def __init__(
+        self,
+        backends: dict,
+        default: str = DEFAULT_MODEL,
+        registry: ASRClientRegistry = None,
+    ):
+        self.backends = backends  # name -> ASRBackend
+        self.default = default
+        self.registry = registry
+        self.breakers = {name: CircuitBreaker() for name in backends}
+        self.ewma = dict()  # name -> latency EWMA in seconds
+        self.latencies = {name: deque(maxlen=1024) for name in backends}
+        self.requests = {name: 0 for name in backends}
+        self.errors = {name: 0 for name in backends}
+        self.failovers = 0
+        self.hedged_requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @property
+    def choices(self) -> list:
+        return list(self.backends)
+
+    def supports(self, choice: str, language: str) -> bool:
+        """Whether the backend picked as `choice` can transcribe `language`."""
+        return self.backends.get(choice, self.backends[self.default]).supports(language)
+
+    def candidates(self, choice: str) -> list:
+        if choice not in self.backends:
+            choice = self.default
+        candidates = [choice]
+        if choice in WHISPER_BACKENDS:
+            candidates += [
+                name
+                for name in WHISPER_BACKENDS
+                if name != choice and name in self.backends
+            ]
+        return candidates
+
+    def route(self, choice: str) -> list:
+        """Backends to try for `choice`, best first."""
+        healthy = [
+            name for name in self.candidates(choice) if self.breakers[name].available()
+        ]
+        if len(healthy) > 1 and len(self.latencies[healthy[0]]) >= ROUTING_MIN_SAMPLES:
+            known = [
+                name
+                for name in healthy
+                if len(self.latencies[name]) >= ROUTING_MIN_SAMPLES
+            ]
+            fastest = min(known, key=self.ewma.get)
+            if self.ewma[healthy[0]] > SLOW_FACTOR * self.ewma[fastest]:
+                healthy.remove(fastest)
+                healthy.insert(0, fastest)
+        if len(healthy) > 1 and random.random() < EXPLORE_RATE:
+            explored = random.choice(healthy[1:])
+            healthy.remove(explored)
+            healthy.insert(0, explored)
+        return healthy
+
+    async def _call(self, name: str, audio: bytes, language: str = None) -> str:
+        breaker = self.breakers[name]
+        breaker.before_call()
+        self.requests[name] += 1
+        start = time.monotonic()
+        try:
+            text = await self.backends[name].transcribe(audio, language=language)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            self.errors[name] += 1
+            errors_total.inc(stage=f"asr:{name}")
+            breaker.record_failure()
+            logger.warning(f"ASR backend {name} failed: {e!r}")
+            raise
+        latency = time.monotonic() - start
+        breaker.record_success()
+        self.latencies[name].append(latency)
+        previous = self.ewma.get(name, latency)
+        self.ewma[name] = previous + LATENCY_EWMA_ALPHA * (latency - previous)
+        return text
+
+    async def transcribe(self, choice: str, audio: bytes, language: str = None) -> str:
+        order = self.route(choice)
+        if not order:
+            raise ASRUnavailableError(f"No healthy backend for {choice}")
+        for i, name in enumerate(order):
+            try:
+                return await self._call(name, audio, language=language)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                if i == len(order) - 1:
+                    raise
+                self.failovers += 1
+                retries_total.inc(component="asr_failover")
+
+    def hedge_delay(self, name: str) -> float:
+        latencies = self.latencies[name]
+        if len(latencies) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        return max(HEDGE_MIN_DELAY, percentile(latencies, HEDGE_PERCENTILE))
+
+    async def transcribe_hedged(
+        self, choice: str, audio: bytes, language: str = None
+    ) -> str:
+        """Like `transcribe`, but if the first backend is slower than usual
+        the same request also goes to the second. The first answer wins, the
+        other request is cancelled.
+
+        If the first request to finish failed, we keep waiting for the other.
+        """
+        order = self.route(choice)
+        if len(order) < 2:
+            return await self.transcribe(choice, audio, language=language)
+        primary, secondary = order[:2]
+
+        self.hedged_requests += 1
+        tasks = [asyncio.create_task(self._call(primary, audio, language=language))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(primary))
+            if not done or tasks[0].exception() is not None:
+                self.hedges += 1
+                retries_total.inc(component="asr_hedge")
+                logger.info(f"Hedging request to {primary} with {secondary}")
+                tasks.append(
+                    asyncio.create_task(self._call(secondary, audio, language=language))
+                )
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self.hedge_wins += 1
+                        return task.result()
+            # both failed, surface the primary's error
+            return tasks[0].result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> dict:
+        stats = {
+            "failovers": self.failovers,
+            "hedged_requests": self.hedged_requests,
+            "hedge_rate": round(self.hedges / self.hedged_requests, 4)
+            if self.hedged_requests
+            else 0.0,
+            "hedge_win_rate": round(self.hedge_wins / self.hedges, 4)
+            if self.hedges
+            else 0.0,
+        }
+        for name, latencies in self.latencies.items():
+            breaker = self.breakers[name]
+            stats[name] = {
+                "requests": self.requests[name],
+                "errors": self.errors[name],
+                "breaker": breaker.state,
+                "times_opened": breaker.times_opened,
+                "latency_ewma_s": round(self.ewma.get(name, 0.0), 4),
+                "p50_s": round(percentile(latencies, 0.5), 4) if latencies else 0.0,
+                "p95_s": round(percentile(latencies, 0.95), 4) if latencies else 0.0,
+                "p99_s": round(percentile(latencies, 0.99), 4) if latencies else 0.0,
+            }
+        return stats
+
+    async def aclose(self):
+        for backend in self.backends.values():
+            await backend.aclose()
+        if self.registry is not None:
+            await self.registry.aclose()
+
+
+def build_router(registry: ASRClientRegistry) -> ASRRouter:
+    """The Fireworks backends, plus the Beam apps whose endpoints are set and
+    the models of the multi-model app if its endpoint is."""
+    backends = {
+        name: FireworksBackend(name, registry, model, base_url)
+        for name, (model, base_url) in FIREWORKS_BACKENDS.items()
+    }
+    for name, (variable, family) in BEAM_BACKENDS.items():
+        endpoint = os.environ.get(variable)
+        if endpoint:
+            backends[name] = BeamBackend(
+                name,
+                endpoint,
+                family=family,
+                client_id=os.environ.get("CLIENT_ID"),
+                client_secret=os.environ.get("CLIENT_SECRET"),
+            )
+    multi_endpoint = os.environ.get(BEAM_MULTI_ENDPOINT)
+    if multi_endpoint:
+        for name, family in BEAM_MULTI_MODELS.items():
+            if name not in backends:
+                backends[name] = BeamBackend(
+                    name,
+                    multi_endpoint,
+                    family=family,
+                    model=name,
+                    client_id=os.environ.get("CLIENT_ID"),
+                    client_secret=os.environ.get("CLIENT_SECRET"),
+                )
+    return ASRRouter(backends, registry=registry)
+
+
+asr_clients = ASRClientRegistry()
+asr_router = build_router(asr_clients)
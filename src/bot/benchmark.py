@@ -0,0 +1,1191 @@
+"""Offline benchmarks for the bot, run against local fake endpoints.
+
+    > python benchmark.py asr-pool --requests 200 --concurrency 8
+    > python benchmark.py scheduler-burst --users 20 --notes-per-user 10
+    > python benchmark.py persistence --sizes 10000 100000 1000000
+    > python benchmark.py download-memory --audio-mb 20 --concurrency 8
+    > python benchmark.py chunked-ttft --duration 300
+    > python benchmark.py webhook-load --workers 1 2 4 --updates 2000
+    > python benchmark.py outbox --chats 50 --messages-per-chat 10
+    > python benchmark.py asr-hedge --requests 500 --slow-rate 0.05
+    > python benchmark.py asr-routing --requests 300
+    > python benchmark.py metrics-overhead --spans 1000000
+    > python benchmark.py handlers --updates 1000 --output report.json
+    > python benchmark.py startup --runs 5
+    > python benchmark.py keyboards
+    > python benchmark.py upload --seconds 60 240
+
+"""
+import argparse
+import asyncio
+import base64
+import json
+import math
+import multiprocessing
+import os
+import random
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+import httpx
+import numpy as np
+from fireworks.client.audio import AudioInference
+from telegram.constants import ChatAction
+from telegram.error import RetryAfter
+from telegram import Update
+from telegram.ext import ExtBot, PicklePersistence
+from telegram.request import HTTPXRequest
+
+from asr import (
+    HEDGE_PERCENTILE,
+    ASRClientRegistry,
+    ASRRouter,
+    BeamBackend,
+    FireworksBackend,
+)
+from chunking import MAX_PARALLEL_CHUNKS, SAMPLE_RATE, split_pcm, transcribe_chunks
+from fake_telegram import (
+    FakeBotAPIHandler,
+    FakeBotAPIServer,
+    callback_update,
+    command_update,
+    voice_update,
+)
+from metrics import span, start_metrics_server
+from outbox import Outbox
+from persistence import SQLitePersistence, _dumps, connect
+from scheduler import QueueFullError, TranscriptionScheduler
+from startup import import_profile
+
+
+class FakeTranscriptionHandler(BaseHTTPRequestHandler):
+    """Answers POSTs like the Fireworks transcription endpoint and GETs like
+    the Telegram file endpoint, with `file_size` bytes of audio."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0
+    slow_rate = 0.0  # fraction of requests that take `slow_latency` instead
+    slow_latency = 0.0
+    error_rate = 0.0  # fraction of requests that fail with a 503
+    file_size = 0
+    decode = False  # whether to decode base64 JSON bodies like the Beam apps
+
+    def do_GET(self):
+        body = b"\0" * self.file_size
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/ogg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.decode and self.headers.get("Content-Type") == "application/json":
+            base64.b64decode(json.loads(body)["audio_file"].encode("utf-8"))
+        latency = self.latency
+        if self.slow_rate and random.random() < self.slow_rate:
+            latency = self.slow_latency
+        if latency:
+            time.sleep(latency)
+        failed = self.error_rate and random.random() < self.error_rate
+        # "text" like Fireworks, "transcript" like our Beam apps
+        text = f"hello world {random.getrandbits(32)}"
+        body = json.dumps({"text": text, "transcript": text})
+        body = body.encode("utf-8")
+        try:
+            self.send_response(503 if failed else 200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client cancelled, e.g. the loser of a hedged request
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_endpoint(
+    latency: float = 0.0,
+    file_size: int = 0,
+    slow_rate: float = 0.0,
+    slow_latency: float = 0.0,
+    error_rate: float = 0.0,
+    decode: bool = False,
+):
+    handler = type(
+        "Handler",
+        (FakeTranscriptionHandler,),
+        {
+            "latency": latency,
+            "file_size": file_size,
+            "slow_rate": slow_rate,
+            "slow_latency": slow_latency,
+            "error_rate": error_rate,
+            "decode": decode,
+        },
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+async def run_concurrently(fn, n_requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await fn()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(n_requests)])
+    return time.perf_counter() - start, sorted(latencies)
+
+
+def summarize(name: str, elapsed: float, latencies: list):
+    n = len(latencies)
+    return {
+        "name": name,
+        "requests": n,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(n / elapsed, 2),
+        "p50_ms": round(latencies[n // 2] * 1000, 3),
+        "p99_ms": round(latencies[min(n - 1, int(n * 0.99))] * 1000, 3),
+    }
+
+
+async def bench_asr_pool(args):
+    server, base_url = start_fake_endpoint(latency=args.latency)
+    audio = b"\0" * args.audio_bytes
+
+    async def per_request():
+        client = AudioInference(model="whisper-v3", base_url=base_url, api_key="x")
+        await client.transcribe_async(audio=audio, language="English")
+        await client.aclose()
+        client.close()
+
+    registry = ASRClientRegistry(api_key="x")
+
+    async def pooled():
+        await registry.transcribe("whisper-v3", base_url, audio, language="English")
+
+    results = []
+    for name, fn in [("per_request", per_request), ("pooled", pooled)]:
+        elapsed, latencies = await run_concurrently(
+            fn, args.requests, args.concurrency
+        )
+        results.append(summarize(name, elapsed, latencies))
+
+    await registry.aclose()
+    server.shutdown()
+    return results
+
+
+async def bench_scheduler_burst(args):
+    scheduler = TranscriptionScheduler(
+        max_concurrency=args.max_concurrency,
+        per_user_limit=args.per_user_limit,
+        max_queue=args.max_queue,
+    )
+    in_flight = 0
+    peak_in_flight = 0
+    queued_replies = 0
+    finish_times = dict()
+
+    async def fake_asr():
+        nonlocal in_flight, peak_in_flight
+        in_flight += 1
+        peak_in_flight = max(peak_in_flight, in_flight)
+        await asyncio.sleep(random.uniform(0.5, 1.5) * args.asr_latency)
+        in_flight -= 1
+
+    async def on_queued(position):
+        nonlocal queued_replies
+        queued_replies += 1
+
+    async def voice_note(user_id):
+        try:
+            await scheduler.run(user_id, fake_asr, on_queued=on_queued)
+        except QueueFullError:
+            return
+        finish_times.setdefault(user_id, []).append(time.perf_counter() - start)
+
+    # every user forwards a burst of notes at once
+    start = time.perf_counter()
+    await asyncio.gather(
+        *[
+            voice_note(user_id)
+            for _ in range(args.notes_per_user)
+            for user_id in range(args.users)
+        ]
+    )
+    first_done = sorted(min(times) for times in finish_times.values())
+    return {
+        "elapsed_s": round(time.perf_counter() - start, 4),
+        "peak_in_flight": peak_in_flight,
+        "queued_replies": queued_replies,
+        "first_note_per_user_p50_s": round(first_done[len(first_done) // 2], 4),
+        "first_note_per_user_max_s": round(first_done[-1], 4),
+        **scheduler.stats(),
+    }
+
+
+async def time_flush(persistence, changed_users: dict, bot_data: dict):
+    start = time.perf_counter()
+    for user_id, data in changed_users.items():
+        await persistence.update_user_data(user_id, data)
+    await persistence.update_bot_data(bot_data)
+    await persistence.flush()
+    return time.perf_counter() - start
+
+
+async def bench_persistence(args):
+    results = []
+    for n_users in args.sizes:
+        user_data = {
+            user_id: {"language": "English", "model": "Whisper v3 Turbo"}
+            for user_id in range(n_users)
+        }
+        bot_data = {"unique_chat_count": n_users}
+        changed_users = {
+            user_id: {**user_data[user_id], "clean_transcript": True}
+            for user_id in random.sample(range(n_users), args.changed_users)
+        }
+
+        with tempfile.TemporaryDirectory() as tmp:
+            pickle_persistence = PicklePersistence(
+                filepath=os.path.join(tmp, "persistence.pkl"), on_flush=True
+            )
+            pickle_persistence.set_bot(ExtBot("123:fake"))
+            pickle_persistence.user_data = user_data
+            pickle_persistence.chat_data = dict()
+            pickle_persistence.bot_data = bot_data
+            pickle_persistence.conversations = dict()
+            pickle_time = await time_flush(pickle_persistence, changed_users, bot_data)
+
+            db_path = os.path.join(tmp, "persistence.db")
+            with connect(db_path) as db:
+                db.executemany(
+                    "INSERT INTO user_data (id, data) VALUES (?, ?)",
+                    ((user_id, _dumps(data)) for user_id, data in user_data.items()),
+                )
+            sqlite_persistence = SQLitePersistence(filepath=db_path)
+            sqlite_time = await time_flush(sqlite_persistence, changed_users, bot_data)
+            sqlite_persistence._db.close()
+
+        results.append(
+            {
+                "users": n_users,
+                "changed_users": args.changed_users,
+                "pickle_flush_ms": round(pickle_time * 1000, 3),
+                "sqlite_flush_ms": round(sqlite_time * 1000, 3),
+            }
+        )
+    return results
+
+
+async def download_and_upload(variant: str, base_url: str, concurrency: int):
+    request = HTTPXRequest(connection_pool_size=concurrency, read_timeout=60)
+    await request.initialize()
+    registry = ASRClientRegistry(api_key="x")
+
+    async def one():
+        if variant == "bytearray":
+            # what bot.py used to do
+            buf = bytearray()
+            buf.extend(await request.retrieve(f"{base_url}/file/voice.oga"))
+            with BytesIO(buf) as audio:
+                await registry.transcribe("whisper-v3", base_url, audio)
+        else:
+            audio = await request.retrieve(f"{base_url}/file/voice.oga")
+            await registry.transcribe("whisper-v3", base_url, audio)
+
+    await asyncio.gather(*[one() for _ in range(concurrency)])
+    await registry.aclose()
+    await request.shutdown()
+
+
+def measure_peak_rss(variant: str, base_url: str, concurrency: int) -> float:
+    """Runs in a fresh process, returns the peak RSS growth in MB."""
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    asyncio.run(download_and_upload(variant, base_url, concurrency))
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return (peak - baseline) / 1024
+
+
+async def bench_download_memory(args):
+    server, base_url = start_fake_endpoint(file_size=int(args.audio_mb * 2**20))
+    results = []
+    with multiprocessing.get_context("spawn").Pool(1, maxtasksperchild=1) as pool:
+        for variant in ["bytearray", "bytes"]:
+            peak_mb = pool.apply(
+                measure_peak_rss, (variant, base_url, args.concurrency)
+            )
+            results.append(
+                {
+                    "variant": variant,
+                    "audio_mb": args.audio_mb,
+                    "concurrency": args.concurrency,
+                    "peak_rss_mb": round(peak_mb, 1),
+                    "peak_rss_per_request_mb": round(peak_mb / args.concurrency, 2),
+                }
+            )
+    server.shutdown()
+    return results
+
+
+def synthetic_speech(duration: float, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Noise bursts of 2-8 seconds separated by short silences."""
+    rng = np.random.default_rng(0)
+    pcm = np.zeros(int(duration * sample_rate), dtype=np.int16)
+    start = 0
+    while start < len(pcm):
+        length = int(rng.uniform(2, 8) * sample_rate)
+        pcm[start : start + length] = rng.normal(0, 3000, len(pcm[start : start + length]))
+        start += length + int(rng.uniform(0.2, 0.8) * sample_rate)
+    return pcm
+
+
+async def bench_chunked_ttft(args):
+    pcm = synthetic_speech(args.duration)
+
+    async def fake_asr(pcm: np.ndarray):
+        seconds = len(pcm) / SAMPLE_RATE
+        await asyncio.sleep(args.base_latency + seconds * args.latency_per_second)
+        return "words " * int(seconds * 2)
+
+    start = time.perf_counter()
+    await fake_asr(pcm)
+    single = time.perf_counter() - start
+
+    first_text = None
+
+    async def on_progress(text):
+        nonlocal first_text
+        if first_text is None:
+            first_text = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chunks = split_pcm(pcm)
+    await transcribe_chunks(
+        chunks, fake_asr, on_progress, max_parallel=args.max_parallel
+    )
+    chunked = time.perf_counter() - start
+
+    return {
+        "duration_s": args.duration,
+        "chunks": len(chunks),
+        "max_parallel": args.max_parallel,
+        "single_time_to_first_text_s": round(single, 3),
+        "chunked_time_to_first_text_s": round(first_text or chunked, 3),
+        "chunked_total_s": round(chunked, 3),
+    }
+
+
+def serve_fake_bot_api(
+    ports,
+    sent_messages,
+    latency: float = 0.0,
+    file_size: int = 0,
+    pending_updates: list = (),
+):
+    """Runs in its own process, so it does not compete with the load generator."""
+    FakeBotAPIHandler.sent_messages = sent_messages
+    FakeBotAPIHandler.latency = latency
+    FakeBotAPIHandler.file_body = b"\0" * file_size
+    FakeBotAPIHandler.pending_updates = list(pending_updates)
+    server = FakeBotAPIServer(("127.0.0.1", 0), FakeBotAPIHandler)
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_for_messages(sent_messages, n: int, timeout: float) -> int:
+    deadline = time.perf_counter() + timeout
+    while sent_messages.value < n and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    return sent_messages.value
+
+
+async def bench_webhook_load(args):
+    mp = multiprocessing.get_context("spawn")
+    ports = mp.Queue()
+    sent_messages = mp.Value("i", 0)
+    api = mp.Process(target=serve_fake_bot_api, args=(ports, sent_messages), daemon=True)
+    api.start()
+    api_url = f"http://127.0.0.1:{ports.get()}"
+
+    results = []
+    for workers in args.workers:
+        port = free_port()
+        with tempfile.TemporaryDirectory() as data_dir:
+            bot = subprocess.Popen(
+                [sys.executable, "bot.py"],
+                env={
+                    **os.environ,
+                    "BOT_MODE": "webhook",
+                    "TELEGRAM_TOKEN": "123:fake",
+                    "TELEGRAM_API_URL": api_url,
+                    "WEBHOOK_LISTEN": "127.0.0.1",
+                    "WEBHOOK_PORT": str(port),
+                    "WEBHOOK_WORKERS": str(workers),
+                    "DATA_DIR": data_dir,
+                },
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+            try:
+                async with httpx.AsyncClient(
+                    base_url=f"http://127.0.0.1:{port}", timeout=60
+                ) as client:
+                    # warm up until every worker is serving
+                    for _ in range(100):
+                        try:
+                            await client.post("/", json=command_update(0, 0))
+                            break
+                        except httpx.TransportError:
+                            await asyncio.sleep(0.2)
+                    await asyncio.sleep(2)
+
+                    sent_messages.value = 0
+                    semaphore = asyncio.Semaphore(args.concurrency)
+
+                    async def post(i):
+                        async with semaphore:
+                            await client.post(
+                                "/", json=command_update(i, i % args.users)
+                            )
+
+                    start = time.perf_counter()
+                    await asyncio.gather(*[post(i) for i in range(1, args.updates + 1)])
+                    processed = await wait_for_messages(
+                        sent_messages, args.updates, timeout=120
+                    )
+                    elapsed = time.perf_counter() - start
+            finally:
+                os.killpg(bot.pid, signal.SIGTERM)
+                bot.wait()
+
+        results.append(
+            {
+                "workers": workers,
+                "updates": args.updates,
+                "processed": processed,
+                "elapsed_s": round(elapsed, 3),
+                "updates_per_s": round(processed / elapsed, 1),
+            }
+        )
+
+    api.terminate()
+    return results
+
+
+class FloodControlledBot:
+    """Answers like Telegram: 429 RetryAfter past `chat_rate` messages per second in a chat."""
+
+    def __init__(self, latency: float, chat_rate: float, retry_after: float):
+        self.latency = latency
+        self.chat_rate = chat_rate
+        self.retry_after = retry_after
+        self.last_sent = dict()
+        self.sent = 0
+        self.actions = 0
+        self.flood_errors = 0
+
+    async def _call(self, chat_id):
+        await asyncio.sleep(self.latency)
+        now = time.monotonic()
+        if now - self.last_sent.get(chat_id, -1e9) < 1 / self.chat_rate:
+            self.flood_errors += 1
+            raise RetryAfter(self.retry_after)
+        self.last_sent[chat_id] = now
+
+    async def send_message(self, chat_id, **kwargs):
+        await self._call(chat_id)
+        self.sent += 1
+
+    async def send_chat_action(self, chat_id, action):
+        self.actions += 1
+        await asyncio.sleep(self.latency)
+
+
+async def bench_outbox(args):
+    results = []
+    for variant in ["direct", "outbox"]:
+        bot = FloodControlledBot(args.latency, args.chat_rate, args.retry_after)
+        outbox = Outbox(
+            global_rate=args.global_rate, chat_rate=args.chat_rate, chat_burst=1
+        )
+        await outbox.start(bot)
+        handler_times = []
+        lost = 0
+
+        async def handler(chat_id):
+            # what get_audio_transcript does: typing action, then a reply
+            nonlocal lost
+            start = time.perf_counter()
+            if variant == "direct":
+                await bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+                try:
+                    await bot.send_message(chat_id=chat_id, text="transcript")
+                except RetryAfter:
+                    lost += 1
+            else:
+                outbox.send_chat_action(chat_id, ChatAction.TYPING)
+                outbox.send_message(chat_id, text="transcript")
+            handler_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(
+            *[
+                handler(chat_id)
+                for _ in range(args.messages_per_chat)
+                for chat_id in range(args.chats)
+            ]
+        )
+        n_messages = args.chats * args.messages_per_chat
+        await outbox.stop(
+            timeout=n_messages / args.global_rate + args.messages_per_chat / args.chat_rate
+        )
+        elapsed = time.perf_counter() - start
+        handler_times.sort()
+        results.append(
+            {
+                "variant": variant,
+                "elapsed_s": round(elapsed, 3),
+                "handler_p50_ms": round(handler_times[len(handler_times) // 2] * 1000, 3),
+                "handler_max_ms": round(handler_times[-1] * 1000, 3),
+                "delivered": bot.sent,
+                "lost": lost,
+                "flood_errors": bot.flood_errors,
+                "chat_actions_sent": bot.actions,
+                **({"outbox": outbox.stats()} if variant == "outbox" else {}),
+            }
+        )
+    return results
+
+
+async def bench_asr_hedge(args):
+    """Two fake backends that are both occasionally slow, single vs hedged."""
+    servers, backends = [], dict()
+    registry = ASRClientRegistry(api_key="x")
+    for name, model in [("Whisper v3 Turbo", "whisper-v3-turbo"), ("Whisper v3", "whisper-v3")]:
+        server, base_url = start_fake_endpoint(
+            latency=args.latency,
+            slow_rate=args.slow_rate,
+            slow_latency=args.slow_latency,
+        )
+        servers.append(server)
+        backends[name] = FireworksBackend(name, registry, model, base_url)
+    audio = b"\0" * args.audio_bytes
+
+    results = []
+    for name in ["single", "hedged"]:
+        router = ASRRouter(backends)
+        # warm up the latency history so the hedge delay is a percentile
+        for _ in range(args.warmup):
+            await router.transcribe("Whisper v3 Turbo", audio, language="English")
+
+        async def single():
+            await router.transcribe("Whisper v3 Turbo", audio, language="English")
+
+        async def hedged():
+            await router.transcribe_hedged("Whisper v3 Turbo", audio, language="English")
+
+        elapsed, latencies = await run_concurrently(
+            single if name == "single" else hedged, args.requests, args.concurrency
+        )
+        result = summarize(name, elapsed, latencies)
+        result["p95_ms"] = round(latencies[int(len(latencies) * 0.95)] * 1000, 3)
+        if name == "hedged":
+            stats = router.stats()
+            result.update(
+                {
+                    "hedge_percentile": HEDGE_PERCENTILE,
+                    "hedge_rate": stats["hedge_rate"],
+                    "hedge_win_rate": stats["hedge_win_rate"],
+                    "extra_load": round(router.hedges / args.requests, 4),
+                }
+            )
+        results.append(result)
+
+    await registry.aclose()
+    for server in servers:
+        server.shutdown()
+    return results
+
+
+async def bench_asr_routing(args):
+    """The picked Fireworks backend is down or slow, a Beam Whisper app is fine.
+
+    Compares always calling the picked backend with going through ASRRouter.
+    """
+    scenarios = {
+        "down": dict(latency=args.latency, error_rate=1.0),
+        "slow": dict(latency=args.slow_latency),
+    }
+    audio = b"\0" * args.audio_bytes
+    healthy_server, healthy_url = start_fake_endpoint(latency=args.latency)
+    results = []
+    for scenario, params in scenarios.items():
+        server, base_url = start_fake_endpoint(**params)
+        for variant in ["direct", "routed"]:
+            registry = ASRClientRegistry(api_key="x")
+            router = ASRRouter(
+                {
+                    "Whisper v3 Turbo": FireworksBackend(
+                        "Whisper v3 Turbo", registry, "whisper-v3-turbo", base_url
+                    ),
+                    "Whisper": BeamBackend("Whisper", healthy_url),
+                },
+                registry=registry,
+            )
+            failed = 0
+
+            async def one():
+                nonlocal failed
+                try:
+                    if variant == "direct":
+                        await router.backends["Whisper v3 Turbo"].transcribe(audio)
+                    else:
+                        await router.transcribe("Whisper v3 Turbo", audio)
+                except Exception:
+                    failed += 1
+
+            elapsed, latencies = await run_concurrently(
+                one, args.requests, args.concurrency
+            )
+            result = summarize(f"{scenario}/{variant}", elapsed, latencies)
+            result["success_rate"] = round(1 - failed / args.requests, 4)
+            if variant == "routed":
+                stats = router.stats()
+                result["failovers"] = stats["failovers"]
+                result["requests_per_backend"] = {
+                    name: stats[name]["requests"] for name in router.backends
+                }
+                result["breaker_opened"] = stats["Whisper v3 Turbo"]["times_opened"]
+            results.append(result)
+            await router.aclose()
+        server.shutdown()
+    healthy_server.shutdown()
+    return results
+
+
+async def bench_metrics_overhead(args):
+    """Cost of one span, and of a scrape with a realistic number of series."""
+    languages = [f"language-{i}" for i in range(args.languages)]
+
+    start = time.perf_counter()
+    for i in range(args.spans):
+        pass
+    empty = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(args.spans):
+        with span("asr", model="Whisper v3 Turbo", language=languages[i % len(languages)]):
+            pass
+    spanned = time.perf_counter() - start
+
+    port = free_port()
+    server = start_metrics_server(port)
+    async with httpx.AsyncClient() as client:
+        start = time.perf_counter()
+        response = await client.get(f"http://127.0.0.1:{port}/metrics")
+        scrape = time.perf_counter() - start
+    server.stop()
+
+    return {
+        "spans": args.spans,
+        "span_overhead_us": round((spanned - empty) / args.spans * 1e6, 3),
+        "series": response.text.count("_count{"),
+        "scrape_ms": round(scrape * 1000, 3),
+        "scrape_kb": round(len(response.content) / 1024, 1),
+    }
+
+
+class FakeGemini:
+    """Stands in for GeminiHelper: log-normal latency, and a share of calls
+    that time out, which the handler answers with the raw transcript."""
+
+    def __init__(self, latency: float, failure_rate: float):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+
+    async def generate_async(self, prompt, **generation_kwargs):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(random.lognormvariate(math.log(self.latency), 0.5))
+        if random.random() < self.failure_rate:
+            raise asyncio.TimeoutError()
+        return prompt.rsplit(": ", 1)[-1]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def bench_handlers(args):
+    """Drives the real handlers in-process with synthetic updates.
+
+    Telegram is a fake Bot API server in another process, Fireworks a fake
+    transcription endpoint and Gemini an in-process FakeGemini, all with
+    configurable latency and failures.
+    """
+    mp = multiprocessing.get_context("spawn")
+    ports = mp.Queue()
+    sent_messages = mp.Value("i", 0)
+    api = mp.Process(
+        target=serve_fake_bot_api,
+        args=(ports, sent_messages, args.telegram_latency, args.audio_bytes),
+        daemon=True,
+    )
+    api.start()
+    api_url = f"http://127.0.0.1:{ports.get()}"
+    asr_server, asr_url = start_fake_endpoint(
+        latency=args.asr_latency,
+        slow_rate=args.asr_slow_rate,
+        slow_latency=args.asr_slow_latency,
+        error_rate=args.asr_error_rate,
+    )
+
+    data_dir = tempfile.mkdtemp()
+    os.environ["DATA_DIR"] = data_dir
+    import bot
+
+    registry = ASRClientRegistry(api_key="x")
+    bot.asr_router = ASRRouter(
+        {
+            bot.DEFAULT_MODEL: FireworksBackend(
+                bot.DEFAULT_MODEL, registry, "whisper-v3-turbo", asr_url
+            )
+        },
+        registry=registry,
+    )
+    gemini = FakeGemini(args.gemini_latency, args.gemini_failure_rate)
+    bot.get_gemini_helper = lambda model_name: gemini
+    bot.outbox = Outbox(global_rate=args.telegram_rate)
+
+    application = bot.build_application(
+        "123:fake",
+        SQLitePersistence(os.path.join(data_dir, "persistence.db")),
+        base_url=api_url,
+    )
+    errors = []
+
+    async def on_error(update, context):
+        errors.append(repr(context.error))
+
+    application.add_error_handler(on_error)
+    await application.initialize()
+    await application.post_init(application)
+
+    latencies = {"voice": [], "start": [], "callback": []}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def process(kind, data, record=True):
+        update = Update.de_json(data, application.bot)
+        async with semaphore:
+            start = time.perf_counter()
+            await application.process_update(update)
+            if record:
+                latencies[kind].append(time.perf_counter() - start)
+
+    # every user picks a language and opts into clean transcripts first
+    update_id = 0
+    for user_id in range(args.users):
+        update_id += 1
+        await process(
+            "callback",
+            callback_update(update_id, user_id, "language_English"),
+            record=False,
+        )
+        user_data = application.user_data[user_id]
+        user_data["clean_transcript"] = random.random() < args.clean_rate
+
+    kinds = random.choices(
+        ["voice", "start", "callback"],
+        weights=[args.voice_weight, args.start_weight, args.callback_weight],
+        k=args.updates,
+    )
+    updates = []
+    for kind in kinds:
+        update_id += 1
+        user_id = random.randrange(args.users)
+        if kind == "voice":
+            if updates and random.random() < args.repeat_rate:
+                # a forwarded note
+                file_unique_id = f"note{random.randrange(update_id)}"
+            else:
+                file_unique_id = f"note{update_id}"
+            data = voice_update(update_id, user_id, file_unique_id, args.duration)
+        elif kind == "start":
+            data = command_update(update_id, user_id)
+        else:
+            data = callback_update(update_id, user_id, f"model_{bot.DEFAULT_MODEL}")
+        updates.append((kind, data))
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    start = time.perf_counter()
+    await asyncio.gather(*[process(kind, data) for kind, data in updates])
+    handled = time.perf_counter() - start
+    # what handlers enqueued has not necessarily reached Telegram yet
+    await bot.outbox.stop(timeout=600)
+    drained = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    report = {
+        "commit": git_commit(),
+        "config": {k: v for k, v in vars(args).items() if k != "fn"},
+        "updates": args.updates,
+        "handled_s": round(handled, 3),
+        "drained_s": round(drained, 3),
+        "throughput_updates_per_s": round(args.updates / handled, 1),
+        "errors": len(errors),
+        "peak_rss_mb": round(peak_rss, 1),
+        "rss_growth_mb": round(peak_rss - rss_before, 1),
+        "handlers": {
+            kind: summarize(kind, handled, sorted(values))
+            for kind, values in latencies.items()
+            if values
+        },
+        "telegram_sends": sent_messages.value,
+        "gemini_calls": gemini.calls,
+        "outbox": bot.outbox.stats(),
+        "scheduler": bot.scheduler.stats(),
+        "transcript_cache": bot.transcript_cache.stats(),
+    }
+    for kind, values in latencies.items():
+        if values:
+            values.sort()
+            report["handlers"][kind]["p95_ms"] = round(
+                values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 3
+            )
+
+    await application.post_shutdown(application)
+    await application.shutdown()
+    asr_server.shutdown()
+    api.terminate()
+    if errors:
+        report["first_errors"] = errors[:5]
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+async def bench_startup(args):
+    """Import profile of bot.py, and time from spawning it in polling mode
+    to its reply to a /start waiting in getUpdates."""
+    results = {"import_profile": import_profile("bot")}
+    eager = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import time; start = time.perf_counter(); "
+            "import bot, fireworks.client.audio, google.generativeai; "
+            "print(time.perf_counter() - start)",
+        ],
+        capture_output=True,
+        text=True,
+    )
+    results["import_with_backends_ms"] = round(float(eager.stdout) * 1000, 1)
+
+    mp = multiprocessing.get_context("spawn")
+    times = []
+    for _ in range(args.runs):
+        ports = mp.Queue()
+        sent_messages = mp.Value("i", 0)
+        api = mp.Process(
+            target=serve_fake_bot_api,
+            args=(ports, sent_messages, 0.0, 0, [command_update(1, 1)]),
+            daemon=True,
+        )
+        api.start()
+        api_url = f"http://127.0.0.1:{ports.get()}"
+        with tempfile.TemporaryDirectory() as data_dir:
+            start = time.perf_counter()
+            bot = subprocess.Popen(
+                [sys.executable, "bot.py"],
+                env={
+                    **os.environ,
+                    "TELEGRAM_TOKEN": "123:fake",
+                    "TELEGRAM_API_URL": api_url,
+                    "DATA_DIR": data_dir,
+                },
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+            try:
+                await wait_for_messages(sent_messages, 1, timeout=60)
+                times.append(time.perf_counter() - start)
+            finally:
+                os.killpg(bot.pid, signal.SIGTERM)
+                bot.wait()
+        api.terminate()
+
+    times.sort()
+    results["time_to_first_reply_ms"] = {
+        "runs": args.runs,
+        "min": round(times[0] * 1000, 1),
+        "median": round(times[len(times) // 2] * 1000, 1),
+        "max": round(times[-1] * 1000, 1),
+    }
+    return results
+
+
+async def bench_keyboards(args):
+    """The language keyboard as it was (one row per language, rebuilt on
+    every /start) against the cached, paginated one."""
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+    from bot import get_language_picker
+    from languages import PICKER_LANGUAGE_NAMES, S2TT_TARGET_LANGUAGE_NAMES
+
+    def flat_picker():
+        return InlineKeyboardMarkup(
+            [
+                [InlineKeyboardButton(language, callback_data=f"language_{language}")]
+                for language in ["English", "Italian", "Spanish"] + S2TT_TARGET_LANGUAGE_NAMES
+            ]
+        )
+
+    results = []
+    for name, build in [("flat", flat_picker), ("paginated", get_language_picker)]:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            payload = json.dumps(build().to_dict())
+        elapsed = time.perf_counter() - start
+        markup = build()
+        results.append(
+            {
+                "name": name,
+                "build_and_serialize_us": round(elapsed / args.repeat * 1e6, 1),
+                "payload_bytes": len(payload.encode("utf-8")),
+                "buttons": sum(len(row) for row in markup.inline_keyboard),
+                "rows": len(markup.inline_keyboard),
+            }
+        )
+    results.append({"languages": len(PICKER_LANGUAGE_NAMES)})
+    return results
+
+
+async def bench_upload(args):
+    """Voice notes sent to a Beam app as base64 in JSON vs as the raw body:
+    bytes on the wire, encode/decode time on either side, and round trips
+    to a local endpoint that decodes like the apps."""
+    server, base_url = start_fake_endpoint(decode=True)
+    results = []
+    for seconds in args.seconds:
+        audio = os.urandom(int(seconds * args.bitrate_kbps * 1000 / 8))
+        body = json.dumps({"audio_file": base64.b64encode(audio).decode("utf-8")})
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            json.dumps({"audio_file": base64.b64encode(audio).decode("utf-8")})
+        encode = (time.perf_counter() - start) / args.repeat
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            base64.b64decode(json.loads(body)["audio_file"].encode("utf-8"))
+        decode = (time.perf_counter() - start) / args.repeat
+
+        result = {
+            "seconds": seconds,
+            "audio_bytes": len(audio),
+            "json_bytes": len(body.encode("utf-8")),
+            "json_encode_ms": round(encode * 1000, 3),
+            "json_decode_ms": round(decode * 1000, 3),
+        }
+        for upload in ("json", "binary"):
+            backend = BeamBackend("Whisper", base_url, upload=upload)
+            elapsed, latencies = await run_concurrently(
+                lambda: backend.transcribe(audio, language="Italian"),
+                args.requests,
+                args.concurrency,
+            )
+            result[f"{upload}_round_trip"] = summarize(upload, elapsed, latencies)
+            await backend.aclose()
+        results.append(result)
+    server.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    asr_pool = subparsers.add_parser(
+        "asr-pool", help="per-request AudioInference vs pooled ASR clients"
+    )
+    asr_pool.add_argument("--requests", type=int, default=200)
+    asr_pool.add_argument("--concurrency", type=int, default=8)
+    asr_pool.add_argument("--latency", type=float, default=0.0)
+    asr_pool.add_argument("--audio-bytes", type=int, default=32_000)
+    asr_pool.set_defaults(fn=bench_asr_pool)
+
+    burst = subparsers.add_parser(
+        "scheduler-burst", help="synthetic burst of voice notes through the scheduler"
+    )
+    burst.add_argument("--users", type=int, default=20)
+    burst.add_argument("--notes-per-user", type=int, default=10)
+    burst.add_argument("--asr-latency", type=float, default=0.05)
+    burst.add_argument("--max-concurrency", type=int, default=8)
+    burst.add_argument("--per-user-limit", type=int, default=2)
+    burst.add_argument("--max-queue", type=int, default=100)
+    burst.set_defaults(fn=bench_scheduler_burst)
+
+    persistence = subparsers.add_parser(
+        "persistence", help="flush time of PicklePersistence vs SQLitePersistence"
+    )
+    persistence.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    persistence.add_argument("--changed-users", type=int, default=100)
+    persistence.set_defaults(fn=bench_persistence)
+
+    download_memory = subparsers.add_parser(
+        "download-memory", help="peak RSS of download + upload, old vs new path"
+    )
+    download_memory.add_argument("--audio-mb", type=float, default=20)
+    download_memory.add_argument("--concurrency", type=int, default=8)
+    download_memory.set_defaults(fn=bench_download_memory)
+
+    chunked = subparsers.add_parser(
+        "chunked-ttft", help="time to first text, single call vs parallel chunks"
+    )
+    chunked.add_argument("--duration", type=float, default=300)
+    chunked.add_argument("--base-latency", type=float, default=0.3)
+    chunked.add_argument("--latency-per-second", type=float, default=0.02)
+    chunked.add_argument("--max-parallel", type=int, default=MAX_PARALLEL_CHUNKS)
+    chunked.set_defaults(fn=bench_chunked_ttft)
+
+    webhook_load = subparsers.add_parser(
+        "webhook-load", help="updates/sec of the webhook mode as workers are added"
+    )
+    webhook_load.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    webhook_load.add_argument("--updates", type=int, default=2000)
+    webhook_load.add_argument("--users", type=int, default=500)
+    webhook_load.add_argument("--concurrency", type=int, default=64)
+    webhook_load.set_defaults(fn=bench_webhook_load)
+
+    outbox = subparsers.add_parser(
+        "outbox", help="direct sends vs the rate-limited outbox under flood control"
+    )
+    outbox.add_argument("--chats", type=int, default=50)
+    outbox.add_argument("--messages-per-chat", type=int, default=10)
+    outbox.add_argument("--latency", type=float, default=0.02)
+    outbox.add_argument("--global-rate", type=float, default=30)
+    outbox.add_argument("--chat-rate", type=float, default=5)
+    outbox.add_argument("--retry-after", type=float, default=1)
+    outbox.set_defaults(fn=bench_outbox)
+
+    hedge = subparsers.add_parser(
+        "asr-hedge", help="tail latency of single vs hedged ASR requests"
+    )
+    hedge.add_argument("--requests", type=int, default=500)
+    hedge.add_argument("--concurrency", type=int, default=8)
+    hedge.add_argument("--latency", type=float, default=0.05)
+    hedge.add_argument("--slow-rate", type=float, default=0.05)
+    hedge.add_argument("--slow-latency", type=float, default=1.0)
+    hedge.add_argument("--warmup", type=int, default=50)
+    hedge.add_argument("--audio-bytes", type=int, default=32_000)
+    hedge.set_defaults(fn=bench_asr_hedge)
+
+    routing = subparsers.add_parser(
+        "asr-routing", help="picked backend down or slow, direct vs ASRRouter"
+    )
+    routing.add_argument("--requests", type=int, default=300)
+    routing.add_argument("--concurrency", type=int, default=8)
+    routing.add_argument("--latency", type=float, default=0.05)
+    routing.add_argument("--slow-latency", type=float, default=0.5)
+    routing.add_argument("--audio-bytes", type=int, default=32_000)
+    routing.set_defaults(fn=bench_asr_routing)
+
+    overhead = subparsers.add_parser(
+        "metrics-overhead", help="cost of a latency span and of a /metrics scrape"
+    )
+    overhead.add_argument("--spans", type=int, default=1_000_000)
+    overhead.add_argument("--languages", type=int, default=100)
+    overhead.set_defaults(fn=bench_metrics_overhead)
+
+    handlers = subparsers.add_parser(
+        "handlers", help="load test of the bot handlers against fake services"
+    )
+    handlers.add_argument("--updates", type=int, default=1000)
+    handlers.add_argument("--users", type=int, default=100)
+    handlers.add_argument("--concurrency", type=int, default=64)
+    handlers.add_argument("--voice-weight", type=float, default=0.7)
+    handlers.add_argument("--start-weight", type=float, default=0.15)
+    handlers.add_argument("--callback-weight", type=float, default=0.15)
+    handlers.add_argument("--repeat-rate", type=float, default=0.1)
+    handlers.add_argument("--clean-rate", type=float, default=0.3)
+    handlers.add_argument("--duration", type=int, default=10)
+    handlers.add_argument("--audio-bytes", type=int, default=32_000)
+    handlers.add_argument("--telegram-latency", type=float, default=0.02)
+    handlers.add_argument("--telegram-rate", type=float, default=30)
+    handlers.add_argument("--asr-latency", type=float, default=0.2)
+    handlers.add_argument("--asr-slow-rate", type=float, default=0.02)
+    handlers.add_argument("--asr-slow-latency", type=float, default=2.0)
+    handlers.add_argument("--asr-error-rate", type=float, default=0.0)
+    handlers.add_argument("--gemini-latency", type=float, default=0.5)
+    handlers.add_argument("--gemini-failure-rate", type=float, default=0.02)
+    handlers.add_argument("--output", help="also write the report to this file")
+    handlers.set_defaults(fn=bench_handlers)
+
+    startup = subparsers.add_parser(
+        "startup", help="import profile and time to first reply of bot.py"
+    )
+    startup.add_argument("--runs", type=int, default=5)
+    startup.set_defaults(fn=bench_startup)
+
+    keyboards = subparsers.add_parser(
+        "keyboards", help="flat language keyboard vs cached, paginated pages"
+    )
+    keyboards.add_argument("--repeat", type=int, default=1000)
+    keyboards.set_defaults(fn=bench_keyboards)
+
+    upload = subparsers.add_parser(
+        "upload", help="base64-in-JSON vs raw-body uploads to the Beam apps"
+    )
+    upload.add_argument("--seconds", type=float, nargs="+", default=[60, 240])
+    # Telegram voice notes are Opus at about 32 kbps
+    upload.add_argument("--bitrate-kbps", type=float, default=32)
+    upload.add_argument("--repeat", type=int, default=100)
+    upload.add_argument("--requests", type=int, default=200)
+    upload.add_argument("--concurrency", type=int, default=4)
+    upload.set_defaults(fn=bench_upload)
+
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(args.fn(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
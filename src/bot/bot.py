@@ -1,12 +1,17 @@
-import base64
+import time
+
+started_at = time.perf_counter()  # for PROFILE_STARTUP
+
+import asyncio
+import hashlib
+import json
 import logging
 import os
-from functools import wraps
+from functools import cache, wraps
+from pathlib import Path
 
-import requests
 from dotenv import load_dotenv
-from lang_list import S2TT_TARGET_LANGUAGE_NAMES
-from requests.auth import HTTPBasicAuth
+from languages import PICKER_LANGUAGE_NAMES, LANGUAGE_NAME_TO_CODE, language_code_to_name
 from telegram import (
     InlineKeyboardButton,
     InlineKeyboardMarkup,
@@ -14,22 +19,37 @@ from telegram import (
     Update,
 )
 from telegram.constants import ChatAction
+from telegram.error import TelegramError
 from telegram.ext import (
     ApplicationBuilder,
     CallbackQueryHandler,
     CommandHandler,
     ContextTypes,
     MessageHandler,
-    PicklePersistence,
+    TypeHandler,
     filters,
 )
 
-from fireworks.client.audio import AudioInference
-from io import BytesIO
-
 
 load_dotenv()
-from gemini import GeminiHelper
+from asr import ASRUnavailableError, DEFAULT_MODEL, asr_router
+from cache import AsyncLRUCache
+from chunking import (
+    ProgressMessage,
+    can_decode,
+    decode_pcm,
+    encode_opus,
+    split_pcm,
+    transcribe_chunks,
+)
+from gemini import GeminiFinishError, get_gemini_helper
+from metrics import REGISTRY, span, stage_seconds, start_metrics_server
+from outbox import Outbox
+from persistence import SQLitePersistence, migrate_from_pickle
+from scheduler import QueueFullError, TranscriptionScheduler
+from startup import StartupTimer
+from tenacity import RetryError
+from webhook import run_webhook
 
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
@@ -38,10 +58,40 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 SAMPLE_RATE = 16000
-client_id = os.environ.get("CLIENT_ID")
-client_secret = os.environ.get("CLIENT_SECRET")
-beam_sm4t_endpoint = os.environ.get("BEAM_SM4T_ENDPOINT")
-beam_whisper_endpoint = os.environ.get("BEAM_WHISPER_ENDPOINT")
+data_dir = os.environ.get("DATA_DIR", ".")
+LONG_NOTE_SECONDS = int(os.environ.get("LONG_NOTE_SECONDS", 60))
+# bot_data keys that workers sharing persistence add up instead of overwriting
+BOT_DATA_COUNTERS = ("unique_chat_count",)
+# duplicate slow requests to the next Whisper backend, see ASRRouter
+hedge_requests = os.environ.get("ASR_HEDGING", "0") == "1"
+# import the ASR and Gemini clients in the background once the bot is up
+preload_backends = os.environ.get("PRELOAD_BACKENDS", "1") == "1"
+startup_timer = (
+    StartupTimer(started_at) if os.environ.get("PROFILE_STARTUP") == "1" else None
+)
+if startup_timer:
+    startup_timer.mark("imports")
+
+transcript_cache = AsyncLRUCache(
+    "transcripts",
+    maxsize=int(os.environ.get("TRANSCRIPT_CACHE_SIZE", 4096)),
+    ttl=float(os.environ.get("TRANSCRIPT_CACHE_TTL", 7 * 24 * 3600)),
+    db_path=os.environ.get("TRANSCRIPT_CACHE_DB"),
+)
+postprocess_cache = AsyncLRUCache(
+    "postprocessed",
+    maxsize=int(os.environ.get("POSTPROCESS_CACHE_SIZE", 2048)),
+    ttl=float(os.environ.get("POSTPROCESS_CACHE_TTL", 7 * 24 * 3600)),
+    # transcripts only go to disk if asked to
+    db_path=os.environ.get("POSTPROCESS_CACHE_DB"),
+    db_maxsize=int(os.environ.get("POSTPROCESS_CACHE_DISK_SIZE", 100_000)),
+)
+outbox = Outbox()
+scheduler = TranscriptionScheduler(
+    max_concurrency=int(os.environ.get("MAX_CONCURRENT_TRANSCRIPTIONS", 8)),
+    per_user_limit=int(os.environ.get("MAX_TRANSCRIPTIONS_PER_USER", 2)),
+    max_queue=int(os.environ.get("MAX_QUEUED_TRANSCRIPTIONS", 100)),
+)
 
 welcome_message = """
 Hi, this is Voice Bot. You can send or forward voice note to me: I will trascribe them into text. Your voice note can be in any language! 
@@ -54,25 +104,55 @@ Happy Transcribing.
 error_message = """
 There was an error when trascribing your voice note. It should be temporary, so try again in while :)
 """
+busy_message = """
+I'm very busy right now and can't take more voice notes. Please, try again in a few minutes :)
+"""
 
 
 ###
 # Keyboard Markups and Callbacks
 ###
-def get_language_picker():
-    keyboard = [
-        [InlineKeyboardButton(language, callback_data=f"language_{language}")]
-        for language in ["English", "Italian", "Spanish"] + S2TT_TARGET_LANGUAGE_NAMES
+KEYBOARD_COLUMNS = 2
+LANGUAGES_PER_PAGE = 20
+
+
+def in_rows(buttons: list, columns: int = KEYBOARD_COLUMNS) -> list:
+    return [buttons[i : i + columns] for i in range(0, len(buttons), columns)]
+
+
+@cache
+def get_language_picker(page: int = 0):
+    """One page of the language keyboard. Every page is built once and reused.
+
+    Buttons carry the short language code, the full list is never sent at once.
+    """
+    names = PICKER_LANGUAGE_NAMES[
+        page * LANGUAGES_PER_PAGE : (page + 1) * LANGUAGES_PER_PAGE
     ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    return reply_markup
+    keyboard = in_rows(
+        [
+            InlineKeyboardButton(name, callback_data=f"language_{LANGUAGE_NAME_TO_CODE[name]}")
+            for name in names
+        ]
+    )
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("« Back", callback_data=f"langpage_{page - 1}"))
+    if (page + 1) * LANGUAGES_PER_PAGE < len(PICKER_LANGUAGE_NAMES):
+        navigation.append(InlineKeyboardButton("More »", callback_data=f"langpage_{page + 1}"))
+    if navigation:
+        keyboard.append(navigation)
+    return InlineKeyboardMarkup(keyboard)
 
 
+@cache
 def get_model_picker():
-    keyboard = [
-        [InlineKeyboardButton(model, callback_data=f"model_{model}")]
-        for model in ["Whisper v3", "Whisper v3 Turbo"]  #  ["SeamlessM4T", "Whisper"]
-    ]
+    keyboard = in_rows(
+        [
+            InlineKeyboardButton(model, callback_data=f"model_{model}")
+            for model in asr_router.choices
+        ]
+    )
     reply_markup = InlineKeyboardMarkup(keyboard)
     return reply_markup
 
@@ -86,9 +166,35 @@ async def language_callback_query(
     # CallbackQueries need to be answered, even if no notification to the user is needed
     # Some clients may have trouble otherwise. See https://core.telegram.org/bots/api#callbackquery
     await query.answer()
-    choice = query.data.split("_")[-1]
+    choice = query.data.split("_", 1)[-1]
+    # keyboards sent before languages had codes carry the name
+    choice = language_code_to_name.get(choice, choice)
+    if choice not in PICKER_LANGUAGE_NAMES:
+        return
     context.user_data["language"] = choice
-    await query.edit_message_text(text=f"Selected language: {choice}")
+    text = f"Selected language: {choice}"
+    model = context.user_data.get("model", DEFAULT_MODEL)
+    if not asr_router.supports(model, choice):
+        text += f"\n{model} can't transcribe it, pick another model with /model"
+    outbox.edit_message_text(
+        query.message.chat_id,
+        query.message.message_id,
+        text=text,
+    )
+
+
+async def language_page_callback_query(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> None:
+    """Swaps the language keyboard for another page of it."""
+    query = update.callback_query
+    await query.answer()
+    page = int(query.data.split("_")[-1])
+    outbox.edit_message_reply_markup(
+        query.message.chat_id,
+        query.message.message_id,
+        reply_markup=get_language_picker(page),
+    )
 
 
 async def model_callback_query(
@@ -102,7 +208,11 @@ async def model_callback_query(
     await query.answer()
     choice = query.data.split("_")[-1]
     context.user_data["model"] = choice
-    await query.edit_message_text(text=f"Selected model: {choice}")
+    outbox.edit_message_text(
+        query.message.chat_id,
+        query.message.message_id,
+        text=f"Selected model: {choice}",
+    )
 
 
 ###
@@ -119,7 +229,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
     reply_markup = get_language_picker()
-    await context.bot.send_message(
+    outbox.send_message(
         chat_id=update.effective_chat.id,
         text=welcome_message,
         reply_markup=reply_markup,
@@ -128,7 +238,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def choose_language(update: Update, context: ContextTypes.DEFAULT_TYPE):
     reply_markup = get_language_picker()
-    await context.bot.send_message(
+    outbox.send_message(
         chat_id=update.effective_chat.id,
         text="Select a language. You can always change it with /language",
         reply_markup=reply_markup,
@@ -137,7 +247,7 @@ async def choose_language(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def choose_model(update: Update, context: ContextTypes.DEFAULT_TYPE):
     reply_markup = get_model_picker()
-    await context.bot.send_message(
+    outbox.send_message(
         chat_id=update.effective_chat.id,
         text="Select a model. You can always change it with /model",
         reply_markup=reply_markup,
@@ -148,7 +258,7 @@ async def toggle_clean_transcript(update: Update, context: ContextTypes.DEFAULT_
     current_clean_transcript = context.user_data.get("clean_transcript", False)
     context.user_data["clean_transcript"] = not current_clean_transcript
     emoji = "✅" if context.user_data["clean_transcript"] else "❌"
-    await context.bot.send_message(
+    outbox.send_message(
         chat_id=update.effective_chat.id,
         text=f"Clean transcript: {emoji}",
     )
@@ -160,7 +270,7 @@ async def toggle_summarize_transcript(
     current_summarize_transcript = context.user_data.get("summarize_transcript", False)
     context.user_data["summarize_transcript"] = not current_summarize_transcript
     emoji = "✅" if context.user_data["summarize_transcript"] else "❌"
-    await context.bot.send_message(
+    outbox.send_message(
         chat_id=update.effective_chat.id,
         text=f"Summarize transcript: {emoji}",
     )
@@ -173,26 +283,35 @@ async def show_config(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     text = f"""
 Target language: {context.user_data['language']}
-Model: {context.user_data.get('model', 'SeamlessM4T')}
+Model: {context.user_data.get('model', DEFAULT_MODEL)}
 Clean transcript: {clean_emoji}
 Summarize transcript: {summarize_emoji}"""
 
-    await context.bot.send_message(
+    outbox.send_message(
         chat_id=update.effective_chat.id,
         text=text,
     )
 
 
-def get_clean_prompt(transcript: str, do_summarize: bool):
-    return (
-        f"""
+CLEAN_PROMPT_TEMPLATE = """
 Post-process this transcript of an audio recording. Clean it, add punctuation where needed, and make it more polished but do not change the meaning. Preserve the source language. Answer only with the post-processed text.
-Transcript: {transcript}"""
-        if not do_summarize
-        else f"""
+Transcript: """
+SUMMARIZE_PROMPT_TEMPLATE = """
 Post-process this transcript of an audio recording. Clean it, add punctuation where needed, and create a shorter, more concise version, but do not change the meaning. Preserve the source language. Answer only with the post-processed text.
-Transcript: {transcript}"""
-    )
+Transcript: """
+
+
+def get_postprocess_key(
+    transcript: str, mode: str, model_name: str, max_new_tokens: int
+):
+    payload = json.dumps([transcript, mode, model_name, max_new_tokens])
+    return (hashlib.sha256(payload.encode("utf-8")).hexdigest(),)
+
+
+def get_clean_prompt(transcript: str, do_summarize: bool):
+    return (
+        SUMMARIZE_PROMPT_TEMPLATE if do_summarize else CLEAN_PROMPT_TEMPLATE
+    ) + transcript
 
 
 ###
@@ -203,7 +322,7 @@ def send_typing_action(func):
 
     @wraps(func)
     async def command_func(update, context, *args, **kwargs):
-        await context.bot.send_chat_action(
+        outbox.send_chat_action(
             chat_id=update.effective_chat.id, action=ChatAction.TYPING
         )
         await func(update, context, *args, **kwargs)
@@ -211,97 +330,227 @@ def send_typing_action(func):
     return command_func
 
 
+async def download_file(new_file) -> bytes:
+    """Downloads a Telegram file into a single immutable buffer.
+
+    download_as_bytearray() copies the body into a bytearray, and wrapping that
+    in a BytesIO copies it again. httpx uploads bytes as they are, so this
+    keeps one copy of the audio per in-flight request instead of three.
+    """
+    if not new_file.file_path.startswith(("http://", "https://")):
+        # local Bot API server
+        return Path(new_file.file_path).read_bytes()
+    return await new_file.get_bot().request.retrieve(new_file.file_path)
+
+
 async def get_audio_transcript(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if "language" not in context.user_data:
         reply_markup = get_language_picker()
-        await context.bot.send_message(
+        outbox.send_message(
             chat_id=update.effective_chat.id,
             text="Please, first select a language. You can always change it with /language",
             reply_markup=reply_markup,
         )
         return
 
-    file_id = update.message.voice.file_id
-    new_file = await context.bot.get_file(file_id)
-    byte_data = await new_file.download_as_bytearray()
+    language = context.user_data["language"]
+    model = context.user_data.get("model", DEFAULT_MODEL)
+    # before downloading anything
+    if not asr_router.supports(model, language):
+        outbox.send_message(
+            chat_id=update.effective_chat.id,
+            text=f"{model} can't transcribe {language}. Pick another language with /language or another model with /model",
+        )
+        return
 
-    await context.bot.send_chat_action(
+    outbox.send_chat_action(
         chat_id=update.effective_chat.id, action=ChatAction.TYPING
     )
 
-    if context.user_data["model"] == "Whisper v3":
-        model = "whisper-v3"
-        base_url = "https://audio-prod.us-virginia-1.direct.fireworks.ai"
-    else:
-        model = "whisper-v3-turbo"
-        base_url = "https://audio-turbo.us-virginia-1.direct.fireworks.ai"
-
+    start_time = time.perf_counter()
+    voice = update.message.voice
     logger.info(f"Using model: {model}")
-    client = AudioInference(
-        model=model,
-        base_url=base_url,
-        api_key=os.environ.get("FIREWORKS_API_KEY"),
-    )
+    labels = dict(model=model, language=language)
+
+    progress = ProgressMessage(outbox, update.effective_chat.id)
+
+    async def transcribe_audio(audio):
+        with span("asr", **labels):
+            if hedge_requests:
+                return await asr_router.transcribe_hedged(
+                    model, audio, language=language
+                )
+            return await asr_router.transcribe(model, audio, language=language)
+
+    async def transcribe_chunk(pcm):
+        with span("encode", **labels):
+            audio = await encode_opus(pcm)
+        return await transcribe_audio(audio)
+
+    async def on_progress(text):
+        try:
+            await progress.update(text)
+        except TelegramError as e:
+            logger.warning(f"Could not show progress: {e!r}")
+
+    async def transcribe():
+        stage_seconds.observe(time.perf_counter() - queued_at, stage="queue", **labels)
+        with span("get_file", **labels):
+            new_file = await context.bot.get_file(voice.file_id)
+        with span("download", **labels):
+            audio = await download_file(new_file)
+
+        if voice.duration > LONG_NOTE_SECONDS and can_decode():
+            with span("decode", **labels):
+                chunks = split_pcm(await decode_pcm(audio))
+            logger.info(f"Transcribing {voice.duration}s note in {len(chunks)} chunks")
+            # encoded as they are transcribed, so their bytes are not all held at once
+            return await transcribe_chunks(
+                chunks,
+                transcribe_chunk,
+                on_progress=on_progress,
+            )
+        return await transcribe_audio(audio)
 
-    # # Send to Beam API
-    # encode_audio = base64.b64encode(byte_data).decode("UTF-8")
-    with BytesIO(byte_data) as audio_stream:
-        response = await client.transcribe_async(
-            audio=audio_stream, language=context.user_data["language"]
+    async def on_queued(position):
+        outbox.send_message(
+            chat_id=update.effective_chat.id,
+            text=f"I'm busy right now, you are #{position} in line.",
         )
 
-        transcript = response.text
+    # forwarded voice notes share the same file_unique_id
+    queued_at = time.perf_counter()
+    try:
+        transcript = await transcript_cache.get_or_compute(
+            (voice.file_unique_id, model, language),
+            lambda: scheduler.run(
+                update.effective_user.id, transcribe, on_queued=on_queued
+            ),
+        )
+    except QueueFullError:
+        outbox.send_message(
+            chat_id=update.effective_chat.id, text=busy_message
+        )
+        return
+    except ASRUnavailableError as e:
+        logger.warning(f"Could not transcribe: {e!r}")
+        outbox.send_message(
+            chat_id=update.effective_chat.id, text=error_message
+        )
+        return
+    except Exception:
+        # the last backend's error after failover, or the download's
+        logger.exception("Could not transcribe")
+        outbox.send_message(
+            chat_id=update.effective_chat.id, text=error_message
+        )
+        return
 
-        do_clean_transcript = context.user_data.get("clean_transcript", False)
-        do_summarize = context.user_data.get("summarize_transcript", False)
+    do_clean_transcript = context.user_data.get("clean_transcript", False)
+    do_summarize = context.user_data.get("summarize_transcript", False)
 
-        if do_clean_transcript or do_summarize:
+    if do_clean_transcript or do_summarize:
 
-            client = GeminiHelper(model_name="gemini-1.5-flash")
-            prompt = get_clean_prompt(transcript, do_summarize=do_summarize)
+        model_name = "gemini-1.5-flash"
+        max_new_tokens = 512
+        client = get_gemini_helper(model_name)
+        prompt = get_clean_prompt(transcript, do_summarize=do_summarize)
+        key = get_postprocess_key(
+            transcript,
+            "summarize" if do_summarize else "clean",
+            model_name,
+            max_new_tokens,
+        )
 
-            transcript = client(
-                prompt=prompt,
-                max_new_tokens=512,
-            )
+        try:
+            with span("postprocess", **labels):
+                transcript = await postprocess_cache.get_or_compute(
+                    key,
+                    lambda: client.generate_async(
+                        prompt=prompt,
+                        max_new_tokens=max_new_tokens,
+                    ),
+                )
+        except (asyncio.TimeoutError, RetryError, GeminiFinishError) as e:
+            # better the raw transcript than no transcript at all
+            logger.warning(f"Gemini post-processing failed: {e!r}")
+
+    with span("reply", **labels):
+        await progress.finish(transcript)
+    stage_seconds.observe(time.perf_counter() - start_time, stage="total", **labels)
+
+
+REGISTRY.gauge(
+    "bot_scheduler_running", "Transcriptions running.", lambda: scheduler.running
+)
+REGISTRY.gauge(
+    "bot_scheduler_queue_depth",
+    "Transcriptions waiting for a slot.",
+    lambda: scheduler.queue_depth,
+)
+REGISTRY.gauge(
+    "bot_outbox_queue_depth", "Messages waiting to be sent.", lambda: outbox.queue_depth
+)
+metrics_port = os.environ.get("METRICS_PORT")
+metrics_server = None
 
-    # data = {
-    #     "audio_file": encode_audio,
-    #     "target_language": context.user_data["language"],
-    # }
-    # headers = {
-    #     "Accept": "*/*",
-    #     "Connection": "keep-alive",
-    #     "Content-Type": "application/json",
-    # }
-    # endpoint = (
-    #     beam_sm4t_endpoint
-    #     if user_model_choice == "SeamlessM4T"
-    #     else beam_whisper_endpoint
-    # )
-    # r = requests.post(
-    #     endpoint,
-    #     auth=HTTPBasicAuth(client_id, client_secret),
-    #     headers=headers,
-    #     json=data,
-    # )
-
-    # response = r.json()
-    # text_output = response.get("transcript", error_message)
-
-    await context.bot.send_message(chat_id=update.effective_chat.id, text=transcript)
 
+def import_backends():
+    """Imports the clients that gemini.py and asr.py only import on first use."""
+    import fireworks.client.audio
+    import google.generativeai
 
-if __name__ == "__main__":
-    TOKEN = os.environ.get("TELEGRAM_TOKEN")
-    persistence_data = PicklePersistence(filepath="persistence.pkl")
 
-    application = (
+async def on_first_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    startup_timer.mark("first update received")
+
+
+async def after_first_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if "first update handled" not in startup_timer.marks:
+        startup_timer.mark("first update handled")
+        await asyncio.to_thread(startup_timer.report)
+
+
+async def post_init(application):
+    global metrics_server
+
+    await outbox.start(application.bot)
+    if metrics_port:
+        metrics_server = start_metrics_server(
+            int(metrics_port), address=os.environ.get("METRICS_LISTEN", "127.0.0.1")
+        )
+    if startup_timer:
+        startup_timer.mark("initialized")
+    if preload_backends:
+        # in a thread, so updates are answered meanwhile
+        asyncio.get_running_loop().run_in_executor(None, import_backends)
+
+
+async def post_shutdown(application):
+    if metrics_server is not None:
+        metrics_server.stop()
+    await outbox.stop()
+    await asr_router.aclose()
+    transcript_cache.close()
+    postprocess_cache.close()
+    logger.info(f"Scheduler: {scheduler.stats()}")
+    logger.info(f"ASR: {asr_router.stats()}")
+
+
+def build_application(token: str, persistence, base_url: str = None):
+    builder = (
         ApplicationBuilder()
-        .token(TOKEN)
-        .persistence(persistence=persistence_data)
-        .build()
+        .token(token)
+        .persistence(persistence=persistence)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .concurrent_updates(True)
     )
+    if base_url:
+        builder = builder.base_url(f"{base_url}/bot").base_file_url(
+            f"{base_url}/file/bot"
+        )
+    application = builder.build()
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("language", choose_language))
@@ -314,7 +563,52 @@ if __name__ == "__main__":
     application.add_handler(
         CallbackQueryHandler(language_callback_query, pattern="language")
     )
+    application.add_handler(
+        CallbackQueryHandler(language_page_callback_query, pattern="langpage")
+    )
     application.add_handler(CallbackQueryHandler(model_callback_query, pattern="model"))
     application.add_handler(MessageHandler(filters.ALL, get_audio_transcript))
+    if startup_timer:
+        application.add_handler(TypeHandler(Update, on_first_update), group=-1)
+        application.add_handler(TypeHandler(Update, after_first_update), group=1)
+    return application
+
 
-    application.run_polling()
+if __name__ == "__main__":
+    TOKEN = os.environ.get("TELEGRAM_TOKEN")
+    # only set to point the bot at a local Bot API server or a fake one
+    telegram_api_url = os.environ.get("TELEGRAM_API_URL")
+    persistence_path = os.path.join(data_dir, "persistence.db")
+    pickle_path = os.path.join(data_dir, "persistence.pkl")
+    if os.path.exists(pickle_path) and not os.path.exists(persistence_path):
+        migrate_from_pickle(pickle_path, persistence_path)
+
+    if os.environ.get("BOT_MODE", "polling") == "webhook":
+        # workers share state through the database, so flush it often
+        run_webhook(
+            lambda: build_application(
+                TOKEN,
+                SQLitePersistence(
+                    filepath=persistence_path,
+                    update_interval=1,
+                    shared=True,
+                    counters=BOT_DATA_COUNTERS,
+                ),
+                base_url=telegram_api_url,
+            ),
+            token=TOKEN,
+            webhook_url=os.environ.get("WEBHOOK_URL"),
+            listen=os.environ.get("WEBHOOK_LISTEN", "0.0.0.0"),
+            port=int(os.environ.get("WEBHOOK_PORT", 8443)),
+            url_path=os.environ.get("WEBHOOK_PATH", ""),
+            secret_token=os.environ.get("WEBHOOK_SECRET"),
+            workers=int(os.environ.get("WEBHOOK_WORKERS", 1)),
+            base_url=telegram_api_url and f"{telegram_api_url}/bot",
+        )
+    else:
+        application = build_application(
+            TOKEN,
+            SQLitePersistence(filepath=persistence_path),
+            base_url=telegram_api_url,
+        )
+        application.run_polling()
@@ -0,0 +1,181 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class _ComputeCancelled(Exception):
+    """The call computing a value was cancelled, so a waiter takes over."""
+
+
+class AsyncLRUCache:
+    """In-memory LRU cache with TTL, an optional SQLite tier, and single-flight.
+
+    Keys are tuples of strings. `get_or_compute` makes sure that concurrent
+    lookups of the same missing key share a single call to `compute`. If
+    that call is cancelled, one of the lookups waiting on it calls its own
+    `compute` instead.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int = 1024,
+        ttl: float = None,
+        db_path: str = None,
+        db_maxsize: int = None,
+    ):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.db_maxsize = db_maxsize
+        self._db_writes = 0
+        self._entries = OrderedDict()  # key -> (created, value)
+        self._inflight = dict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+        # connected on first use, so the cache can be created before forking
+        self.db_path = db_path
+        self._db = None
+
+    def _get_db(self):
+        if self._db is None and self.db_path:
+            self._db = sqlite3.connect(self.db_path)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.name} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.name}_created ON {self.name} (created)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    @staticmethod
+    def _db_key(key) -> str:
+        return json.dumps(key)
+
+    def get(self, key):
+        """Returns the cached value or None, checking memory first, then disk."""
+        if key in self._entries:
+            created, value = self._entries[key]
+            if not self._expired(created):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+
+        db = self._get_db()
+        if db is not None:
+            row = db.execute(
+                f"SELECT value, created FROM {self.name} WHERE key = ?",
+                (self._db_key(key),),
+            ).fetchone()
+            if row is not None and not self._expired(row[1]):
+                value = json.loads(row[0])
+                self._store(key, value, row[1])
+                self.disk_hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    def _store(self, key, value, created: float):
+        self._entries[key] = (created, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def set(self, key, value):
+        created = time.time()
+        self._store(key, value, created)
+        db = self._get_db()
+        if db is not None:
+            db.execute(
+                f"INSERT OR REPLACE INTO {self.name} (key, value, created) VALUES (?, ?, ?)",
+                (self._db_key(key), json.dumps(value), created),
+            )
+            self._db_writes += 1
+            if self._db_writes % 64 == 0:
+                self._trim_db()
+            db.commit()
+
+    def _trim_db(self):
+        if self.ttl is not None:
+            self._db.execute(
+                f"DELETE FROM {self.name} WHERE created < ?", (time.time() - self.ttl,)
+            )
+        if self.db_maxsize is None:
+            return
+        (count,) = self._db.execute(f"SELECT COUNT(*) FROM {self.name}").fetchone()
+        if count > self.db_maxsize:
+            self._db.execute(
+                f"DELETE FROM {self.name} WHERE key IN "
+                f"(SELECT key FROM {self.name} ORDER BY created ASC LIMIT ?)",
+                (count - self.db_maxsize,),
+            )
+            self.evictions += count - self.db_maxsize
+
+    async def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        while key in self._inflight:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(self._inflight[key])
+            except _ComputeCancelled:
+                pass
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.set_exception(_ComputeCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # nobody else may be waiting on it
+            future.exception()
+            raise
+        else:
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        logger.info(f"Cache {self.name}: {self.stats()}")
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,192 @@
+"""Splitting long voice notes at silences and transcribing the pieces in parallel."""
+import asyncio
+import logging
+import shutil
+import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    # numpy is only needed for long notes, so it is imported on first use
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+CHUNK_SECONDS = 30  # target length of every chunk
+SEARCH_SECONDS = 5  # look for a silence this far around every target split
+FRAME_MS = 30
+MAX_MESSAGE_LENGTH = 4096  # Telegram's limit
+# chunks of one note being transcribed at once, so a long note cannot take
+# every connection to the ASR backend
+MAX_PARALLEL_CHUNKS = 4
+# chunks are uploaded as Opus, like Telegram's voice notes, not as raw PCM
+OPUS_BITRATE = "32k"
+
+
+def can_decode() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+async def ffmpeg(data: bytes, *args: str) -> bytes:
+    """Pipes `data` through ffmpeg with `args` and returns its output."""
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg",
+        "-nostdin",
+        "-loglevel",
+        "error",
+        *args,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await process.communicate(data)
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace')}")
+    return stdout
+
+
+async def decode_pcm(audio: bytes, sample_rate: int = SAMPLE_RATE) -> "np.ndarray":
+    """Decodes any ffmpeg-readable audio into mono int16 PCM."""
+    stdout = await ffmpeg(
+        audio,
+        *("-i", "pipe:0"),
+        *("-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "pipe:1"),
+    )
+    import numpy as np
+
+    return np.frombuffer(stdout, dtype=np.int16)
+
+
+async def encode_opus(pcm: "np.ndarray", sample_rate: int = SAMPLE_RATE) -> bytes:
+    """Encodes mono int16 PCM as Opus in Ogg, the format of voice notes."""
+    return await ffmpeg(
+        pcm.tobytes(),
+        *("-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "-i", "pipe:0"),
+        *("-c:a", "libopus", "-b:a", OPUS_BITRATE, "-application", "voip"),
+        *("-f", "ogg", "pipe:1"),
+    )
+
+
+def find_split_points(
+    pcm: "np.ndarray",
+    sample_rate: int = SAMPLE_RATE,
+    chunk_seconds: float = CHUNK_SECONDS,
+    search_seconds: float = SEARCH_SECONDS,
+) -> list:
+    """Returns sample offsets where to cut, each at the quietest frame
+    within `search_seconds` of a multiple of `chunk_seconds`."""
+    import numpy as np
+
+    frame = int(sample_rate * FRAME_MS / 1000)
+    n_frames = len(pcm) // frame
+    if n_frames == 0:
+        return []
+    frames = pcm[: n_frames * frame].astype(np.float32).reshape(n_frames, frame)
+    energy = (frames**2).mean(axis=1)
+
+    chunk_frames = int(chunk_seconds * 1000 / FRAME_MS)
+    search_frames = int(search_seconds * 1000 / FRAME_MS)
+    points = []
+    target = chunk_frames
+    while target + search_frames < n_frames:
+        start = target - search_frames
+        quietest = start + int(np.argmin(energy[start : target + search_frames]))
+        points.append(quietest * frame)
+        target = quietest + chunk_frames
+    return points
+
+
+def split_pcm(pcm: "np.ndarray", sample_rate: int = SAMPLE_RATE) -> list:
+    import numpy as np
+
+    return np.split(pcm, find_split_points(pcm, sample_rate))
+
+
+async def transcribe_chunks(
+    chunks: list,
+    transcribe,
+    on_progress=None,
+    max_parallel: int = MAX_PARALLEL_CHUNKS,
+) -> str:
+    """Transcribes `chunks` with `transcribe(chunk) -> str`, up to
+    `max_parallel` at once, in order.
+
+    `on_progress(text)` is awaited every time the in-order prefix of finished
+    chunks grows, so the user can read along while the rest is still running.
+    """
+    texts = [None] * len(chunks)
+    shown = 0
+    semaphore = asyncio.Semaphore(max_parallel)
+
+    async def run(i):
+        async with semaphore:
+            texts[i] = (await transcribe(chunks[i])).strip()
+
+    tasks = [asyncio.create_task(run(i)) for i in range(len(chunks))]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            await next_done
+            ready = shown
+            while ready < len(texts) and texts[ready] is not None:
+                ready += 1
+            if shown < ready < len(texts) and on_progress is not None:
+                await on_progress(" ".join(texts[:ready]) + " …")
+            shown = ready
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    return " ".join(texts)
+
+
+def split_message(text: str, max_length: int = MAX_MESSAGE_LENGTH) -> list:
+    return [text[i : i + max_length] for i in range(0, len(text), max_length)] or [
+        text
+    ]
+
+
+class ProgressMessage:
+    """A message we keep editing, at most once every `min_interval` seconds.
+
+    Telegram rate-limits edits to roughly one per second per chat, so
+    intermediate updates that come too fast are dropped instead of piling up
+    in the outbox; the last one is always delivered by `finish`.
+    """
+
+    def __init__(self, outbox, chat_id: int, min_interval: float = 1.5):
+        self.outbox = outbox
+        self.chat_id = chat_id
+        self.min_interval = min_interval
+        self.message = None
+        self._last_text = None
+        self._last_edit = 0.0
+
+    async def _show(self, text: str):
+        if text == self._last_text:
+            return
+        self._last_text = text
+        self._last_edit = time.monotonic()
+        if self.message is None:
+            self.message = await self.outbox.send_message(
+                chat_id=self.chat_id, text=text
+            )
+        else:
+            self.outbox.edit_message_text(
+                self.chat_id, self.message.message_id, text=text
+            )
+
+    async def update(self, text: str):
+        if time.monotonic() - self._last_edit < self.min_interval:
+            return
+        # while in progress, only the tail of long transcripts fits
+        await self._show(text[-MAX_MESSAGE_LENGTH:])
+
+    async def finish(self, text: str):
+        parts = split_message(text)
+        if self.message is None:
+            for part in parts:
+                self.outbox.send_message(chat_id=self.chat_id, text=part)
+            return
+        await self._show(parts[0])
+        for part in parts[1:]:
+            self.outbox.send_message(chat_id=self.chat_id, text=part)
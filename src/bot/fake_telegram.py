@@ -0,0 +1,132 @@
+"""A fake Telegram Bot API and the updates it hands out, shared by the tests
+and benchmark.py. Not used by the bot itself.
+"""
+import itertools
+import json
+import math
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+
+class Call:
+    def __init__(self, method: str, params: dict):
+        self.time = time.monotonic()
+        self.method = method
+        self.params = params
+
+
+class FakeBotAPIHandler(BaseHTTPRequestHandler):
+    """Just enough of the Telegram Bot API for the handlers to run.
+
+    Subclasses, or the benchmark's server process, set what to record: every
+    call in `calls`, or only the number of sendMessage in `sent_messages`.
+    """
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    calls = None  # list of Call
+    sent_messages = None  # multiprocessing.Value, shared with the benchmark
+    latency = 0.0  # median, log-normally distributed
+    file_body = b"OggS" + b"\0" * 1024
+    pending_updates = []  # handed out by the first getUpdates
+    message_ids = itertools.count(1)
+
+    def _sleep(self):
+        if self.latency:
+            time.sleep(random.lognormvariate(math.log(self.latency), 0.5))
+
+    def do_GET(self):
+        # file downloads, /file/bot<token>/<file_path>
+        self._sleep()
+        self._respond(self.file_body, "audio/ogg")
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._sleep()
+        method = self.path.rsplit("/", 1)[-1]
+        params = dict(parse_qsl(body.decode("utf-8")))
+        if self.calls is not None:
+            self.calls.append(Call(method, params))
+        if method == "sendMessage" and self.sent_messages is not None:
+            with self.sent_messages.get_lock():
+                self.sent_messages.value += 1
+
+        chat = {"id": int(params.get("chat_id", 1)), "type": "private"}
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+        elif method in ("sendMessage", "editMessageText"):
+            result = {"message_id": next(self.message_ids), "date": 0, "chat": chat}
+        elif method == "getFile":
+            file_id = params.get("file_id", "voice")
+            result = {
+                "file_id": file_id,
+                "file_unique_id": file_id,
+                "file_path": "voice/note.ogg",
+            }
+        elif method == "getUpdates":
+            result, FakeBotAPIHandler.pending_updates = self.pending_updates, []
+        else:
+            result = True
+        self._respond(json.dumps({"ok": True, "result": result}).encode("utf-8"))
+
+    def _respond(self, body: bytes, content_type: str = "application/json"):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeBotAPIServer(ThreadingHTTPServer):
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def command_update(update_id: int, chat_id: int, command: str = "/start") -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"},
+            "text": command,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}],
+        },
+    }
+
+
+def voice_update(update_id: int, chat_id: int, file_unique_id: str, duration: int = 5):
+    update = command_update(update_id, chat_id)
+    message = update["message"]
+    del message["text"], message["entities"]
+    message["voice"] = {
+        "file_id": file_unique_id,
+        "file_unique_id": file_unique_id,
+        "duration": duration,
+        "mime_type": "audio/ogg",
+    }
+    return update
+
+
+def callback_update(update_id: int, chat_id: int, data: str) -> dict:
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"},
+            "chat_instance": str(chat_id),
+            "data": data,
+            "message": {
+                "message_id": update_id,
+                "date": 0,
+                "chat": {"id": chat_id, "type": "private"},
+                "text": "Select a language.",
+            },
+        },
+    }
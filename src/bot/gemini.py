@@ -1,23 +1,73 @@
+import asyncio
 import logging
+import time
 from tenacity import (
     retry,
+    retry_if_exception_type,
+    retry_if_not_exception_type,
     stop_after_attempt,
+    stop_after_delay,
     wait_random_exponential,
     RetryError,
 )
-import google.generativeai as genai
 import os
 
+from metrics import count_retry
+
 logger = logging.getLogger(__name__)
 
+GEMINI_DEADLINE = float(os.environ.get("GEMINI_DEADLINE", 30))  # in seconds
+GEMINI_ATTEMPT_TIMEOUT = float(os.environ.get("GEMINI_ATTEMPT_TIMEOUT", 15))
+
+
+# google.generativeai takes most of a second to import, so it is only
+# imported when the first GeminiHelper is created
+genai = None
+_helpers = dict()
+
+
+class GeminiFinishError(Exception):
+    """Gemini stopped for another reason than finishing its answer, e.g.
+    SAFETY or MAX_TOKENS. Retrying would stop the same way."""
+
+
+# errors worth another attempt; not cancellation, which is a BaseException
+RETRYABLE = retry_if_exception_type(Exception) & retry_if_not_exception_type(
+    GeminiFinishError
+)
+
+
+def get_gemini_helper(model_name: str):
+    """Returns the process-wide GeminiHelper for `model_name`, creating it on first use."""
+    if model_name not in _helpers:
+        _helpers[model_name] = GeminiHelper(model_name=model_name)
+    return _helpers[model_name]
+
 
 class GeminiHelper:
     def __init__(self, model_name: str):
+        global genai
+
+        start = time.perf_counter()
         self.model_name = model_name
-        genai.configure(api_key=os.environ["GOOGLE_API_KEY"])
+        if genai is None:
+            import google.generativeai
+
+            genai = google.generativeai
+            genai.configure(api_key=os.environ["GOOGLE_API_KEY"])
         self.model = genai.GenerativeModel(model_name=model_name)
+        self.construction_time = time.perf_counter() - start
+        self.first_call_time = None
+        logger.info(
+            f"Created GeminiHelper for {model_name} in {self.construction_time * 1000:.1f} ms"
+        )
 
-    @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(10))
+    @retry(
+        wait=wait_random_exponential(min=1, max=60),
+        stop=stop_after_attempt(10),
+        retry=RETRYABLE,
+        before_sleep=count_retry("gemini"),
+    )
     def __call__(self, prompt, **generation_kwargs):
         """Process a single image and prompt."""
 
@@ -30,12 +80,47 @@ class GeminiHelper:
             ),
         )
 
+        return self._parse_response(response)
+
+    def _parse_response(self, response):
         finish_reason = response.candidates[0].finish_reason
+        if finish_reason != genai.protos.Candidate.FinishReason.STOP:
+            raise GeminiFinishError(finish_reason)
+        return response.text
 
-        text = (
-            response.text
-            if finish_reason == genai.protos.Candidate.FinishReason.STOP
-            else str(finish_reason)
+    @retry(
+        wait=wait_random_exponential(min=1, max=10),
+        stop=stop_after_attempt(5) | stop_after_delay(GEMINI_DEADLINE),
+        retry=RETRYABLE,
+        before_sleep=count_retry("gemini"),
+    )
+    async def _generate_async(self, prompt, **generation_kwargs):
+        response = await asyncio.wait_for(
+            self.model.generate_content_async(
+                prompt,
+                generation_config=genai.types.GenerationConfig(
+                    max_output_tokens=generation_kwargs.get("max_new_tokens", 256)
+                ),
+            ),
+            timeout=GEMINI_ATTEMPT_TIMEOUT,
         )
+        return self._parse_response(response)
 
+    async def generate_async(
+        self, prompt, deadline=GEMINI_DEADLINE, **generation_kwargs
+    ):
+        """Async counterpart of __call__, bounded by `deadline` seconds overall.
+
+        Retries sleep with asyncio, so a slow or failing request only delays
+        the chat that made it, never the event loop.
+        """
+        start = time.perf_counter()
+        text = await asyncio.wait_for(
+            self._generate_async(prompt, **generation_kwargs), timeout=deadline
+        )
+        if self.first_call_time is None:
+            self.first_call_time = time.perf_counter() - start
+            logger.info(
+                f"First {self.model_name} call took {self.first_call_time * 1000:.1f} ms"
+            )
         return text
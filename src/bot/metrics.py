@@ -0,0 +1,226 @@
+"""Latency histograms and counters, served in the Prometheus text format.
+
+Everything runs on the bot's event loop, so there is no locking: recording a
+sample is a dict lookup, a bisect and two additions.
+
+    > METRICS_PORT=9464 python bot.py
+    > curl localhost:9464/metrics
+
+"""
+import logging
+import math
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+import tornado.httpserver
+import tornado.process
+import tornado.web
+
+logger = logging.getLogger(__name__)
+
+# in seconds, from a cache hit to a long note through a cold Beam app
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [
+        f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def collect(self) -> list:
+        raise NotImplementedError
+
+    def render(self) -> list:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+            *self.collect(),
+        ]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values = dict()
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self) -> list:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+            for key, value in self._values.items()
+        ]
+
+
+class Gauge(Metric):
+    """A value read from `function()` at scrape time."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, function):
+        super().__init__(name, documentation)
+        self.function = function
+
+    def collect(self) -> list:
+        return [f"{self.name} {self.function()}"]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        buckets: tuple = BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self._series = dict()  # label values -> [counts per bucket + inf, sum]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self) -> list:
+        lines = []
+        for key, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else repr(float(bound))
+                labels = _format_labels(self.labelnames, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = dict()
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, function) -> Gauge:
+        return self._register(Gauge(name, documentation, function))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: tuple = (), buckets=BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+stage_seconds = REGISTRY.histogram(
+    "bot_stage_seconds",
+    "Time spent in each stage of handling a voice note.",
+    ("stage", "model", "language"),
+)
+errors_total = REGISTRY.counter(
+    "bot_errors_total", "Errors, by the stage they happened in.", ("stage",)
+)
+retries_total = REGISTRY.counter(
+    "bot_retries_total", "Retried calls to external services.", ("component",)
+)
+
+
+@contextmanager
+def span(stage: str, **labels):
+    """Times the block into bot_stage_seconds and counts it in
+    bot_errors_total if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        errors_total.inc(stage=stage)
+        raise
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage=stage, **labels)
+
+
+def count_retry(component: str):
+    """A tenacity `before_sleep` callback counting retries of `component`."""
+
+    def before_sleep(retry_state):
+        retries_total.inc(component=component)
+
+    return before_sleep
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def initialize(self, registry: MetricsRegistry):
+        self.registry = registry
+
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.write(self.registry.render())
+
+
+def start_metrics_server(
+    port: int, address: str = "127.0.0.1", registry: MetricsRegistry = REGISTRY
+) -> tornado.httpserver.HTTPServer:
+    """Serves /metrics on the running event loop.
+
+    Forked webhook workers each serve their own metrics, on `port` plus
+    their worker index.
+    """
+    port += tornado.process.task_id() or 0
+    server = tornado.httpserver.HTTPServer(
+        tornado.web.Application([("/metrics", MetricsHandler, dict(registry=registry))])
+    )
+    server.listen(port, address=address)
+    logger.info(f"Serving metrics on {address}:{port}/metrics")
+    return server
@@ -0,0 +1,290 @@
+"""Central dispatcher for everything the bot sends to Telegram.
+
+Telegram allows roughly one message per second per chat and thirty per
+second overall, and answers with 429 RetryAfter past that. Handlers enqueue
+their sends here and carry on; a single dispatcher task releases them under a
+global token bucket and one bucket per chat, and backs off as told on 429s.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+
+from telegram.error import RetryAfter
+
+from metrics import errors_total, retries_total, stage_seconds
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_RATE = 30  # messages per second
+CHAT_RATE = 1  # messages per second per chat
+CHAT_BURST = 3
+TYPING_SECONDS = 5  # how long Telegram shows a chat action for
+MAX_RETRIES = 3
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available, 0 if one is available now."""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class _Job:
+    __slots__ = ("call", "future", "enqueued", "retries", "is_action")
+
+    def __init__(self, call, is_action: bool = False):
+        self.call = call
+        self.future = asyncio.get_running_loop().create_future()
+        self.enqueued = time.monotonic()
+        self.retries = 0
+        self.is_action = is_action
+
+
+class Outbox:
+    def __init__(
+        self,
+        global_rate: float = GLOBAL_RATE,
+        chat_rate: float = CHAT_RATE,
+        chat_burst: float = CHAT_BURST,
+    ):
+        self.bot = None
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = dict()  # chat_id -> TokenBucket
+        self._queues = OrderedDict()  # chat_id -> deque of jobs
+        self._last_action = dict()  # (chat_id, action) -> monotonic time sent
+        self._wakeup = None
+        self._dispatcher = None
+        self._in_flight = set()
+        self._busy_chats = set()
+        self.sent = 0
+        self.retries = 0
+        self.failed = 0
+        self.dropped_actions = 0
+        self.queue_latencies = deque(maxlen=1024)
+
+    async def start(self, bot):
+        self.bot = bot
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self, timeout: float = 10):
+        """Gives queued sends `timeout` seconds to go out, then cancels the rest."""
+        deadline = time.monotonic() + timeout
+        while (self._queues or self._in_flight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        for queue in self._queues.values():
+            for job in queue:
+                job.future.cancel()
+        self._queues.clear()
+        logger.info(f"Outbox: {self.stats()}")
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        if chat_id not in self._chats:
+            if len(self._chats) >= 10_000:
+                self._prune()
+            self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return self._chats[chat_id]
+
+    def _prune(self):
+        """Forgets chats that are idle and back to a full bucket."""
+        now = time.monotonic()
+        for chat_id, bucket in list(self._chats.items()):
+            if (
+                chat_id not in self._queues
+                and chat_id not in self._busy_chats
+                and bucket.wait_time(now) == 0
+                and bucket.tokens >= bucket.capacity
+            ):
+                del self._chats[chat_id]
+        for key, sent in list(self._last_action.items()):
+            if now - sent >= TYPING_SECONDS:
+                del self._last_action[key]
+
+    def submit(self, chat_id, call, is_action: bool = False) -> asyncio.Future:
+        """Queues `await call()` for `chat_id` and returns a future of its result.
+
+        Callers that do not need the result can drop the future; failures
+        are logged.
+        """
+        job = _Job(call, is_action=is_action)
+        job.future.add_done_callback(self._log_failure)
+        self._queues.setdefault(chat_id, deque()).append(job)
+        self._wakeup.set()
+        return job.future
+
+    @staticmethod
+    def _log_failure(future: asyncio.Future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning(f"Could not send to Telegram: {future.exception()!r}")
+
+    def send_message(self, chat_id, **kwargs) -> asyncio.Future:
+        return self.submit(
+            chat_id, lambda: self.bot.send_message(chat_id=chat_id, **kwargs)
+        )
+
+    def edit_message_text(self, chat_id, message_id, **kwargs) -> asyncio.Future:
+        return self.submit(
+            chat_id,
+            lambda: self.bot.edit_message_text(
+                chat_id=chat_id, message_id=message_id, **kwargs
+            ),
+        )
+
+    def edit_message_reply_markup(self, chat_id, message_id, **kwargs) -> asyncio.Future:
+        return self.submit(
+            chat_id,
+            lambda: self.bot.edit_message_reply_markup(
+                chat_id=chat_id, message_id=message_id, **kwargs
+            ),
+        )
+
+    def send_chat_action(self, chat_id, action):
+        """Queues a chat action unless one is pending or still being shown."""
+        key = (chat_id, action)
+        pending = any(job.is_action for job in self._queues.get(chat_id, ()))
+        if pending or time.monotonic() - self._last_action.get(key, 0) < TYPING_SECONDS:
+            self.dropped_actions += 1
+            return None
+
+        async def call():
+            self._last_action[key] = time.monotonic()
+            return await self.bot.send_chat_action(chat_id=chat_id, action=action)
+
+        return self.submit(chat_id, call, is_action=True)
+
+    def _next_ready(self, now: float):
+        """Round-robin over chats: pops the first job whose chat is idle and has a token.
+
+        Returns (chat_id, job, None), or (None, None, seconds to wait) if no chat
+        is ready. Chats with a send in flight are skipped, so messages to the
+        same chat keep their order.
+        """
+        wait = None
+        for chat_id in list(self._queues):
+            if chat_id in self._busy_chats:
+                continue
+            self._queues.move_to_end(chat_id)
+            bucket = self._chat_bucket(chat_id)
+            chat_wait = bucket.wait_time(now)
+            if chat_wait == 0:
+                queue = self._queues[chat_id]
+                job = queue.popleft()
+                if not queue:
+                    del self._queues[chat_id]
+                bucket.take()
+                return chat_id, job, None
+            wait = chat_wait if wait is None else min(wait, chat_wait)
+        return None, None, wait
+
+    async def _dispatch(self):
+        while True:
+            if not self._queues:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            global_wait = self._global.wait_time(now)
+            if global_wait > 0:
+                await asyncio.sleep(global_wait)
+                continue
+
+            chat_id, job, wait = self._next_ready(now)
+            if job is None:
+                # sleep until a chat frees up or new work arrives
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._global.take()
+            self.queue_latencies.append(now - job.enqueued)
+            stage_seconds.observe(now - job.enqueued, stage="send_queue")
+            self._busy_chats.add(chat_id)
+            task = asyncio.create_task(self._run(chat_id, job))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _run(self, chat_id, job: _Job):
+        start = time.perf_counter()
+        try:
+            if job.future.cancelled():
+                return
+            result = await job.call()
+        except RetryAfter as e:
+            retry_after = e.retry_after
+            if not isinstance(retry_after, (int, float)):
+                retry_after = retry_after.total_seconds()
+            logger.warning(f"Flood control for chat {chat_id}: retry in {retry_after}s")
+            # the flood wait holds for the whole bot, not just this chat
+            self._chat_bucket(chat_id).block(retry_after)
+            self._global.block(retry_after)
+            if job.retries < MAX_RETRIES and not job.is_action:
+                job.retries += 1
+                self.retries += 1
+                retries_total.inc(component="telegram")
+                self._queues.setdefault(chat_id, deque()).appendleft(job)
+                self._wakeup.set()
+            else:
+                self.failed += 1
+                errors_total.inc(stage="send")
+                if not job.future.cancelled():
+                    job.future.set_exception(e)
+        except Exception as e:
+            self.failed += 1
+            errors_total.inc(stage="send")
+            if not job.future.cancelled():
+                job.future.set_exception(e)
+        else:
+            self.sent += 1
+            stage_seconds.observe(time.perf_counter() - start, stage="send")
+            if not job.future.cancelled():
+                job.future.set_result(result)
+        finally:
+            self._busy_chats.discard(chat_id)
+            self._wakeup.set()
+
+    def stats(self) -> dict:
+        latencies = sorted(self.queue_latencies)
+        n = len(latencies)
+        return {
+            "queue_depth": self.queue_depth,
+            "sent": self.sent,
+            "retries": self.retries,
+            "failed": self.failed,
+            "dropped_actions": self.dropped_actions,
+            "queue_latency_p50_s": round(latencies[n // 2], 4) if n else 0.0,
+            "queue_latency_p95_s": round(latencies[min(n - 1, int(n * 0.95))], 4)
+            if n
+            else 0.0,
+        }
@@ -0,0 +1,298 @@
+"""SQLite-backed persistence for the bot.
+
+Unlike PicklePersistence, which rewrites the whole file whenever anything
+changes, every user, chat and conversation lives in its own row, so a flush
+only touches the rows PTB hands us as changed.
+
+To migrate an existing pickle file once:
+
+    > python persistence.py persistence.pkl persistence.db
+
+"""
+import argparse
+import logging
+import pickle
+import sqlite3
+from copy import deepcopy
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_data (id INTEGER PRIMARY KEY, data BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS chat_data (id INTEGER PRIMARY KEY, data BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS bot_data (id INTEGER PRIMARY KEY, data BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS callback_data (id INTEGER PRIMARY KEY, data BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS conversations (
+    name TEXT NOT NULL,
+    key BLOB NOT NULL,
+    state BLOB NOT NULL,
+    PRIMARY KEY (name, key)
+);
+"""
+
+
+def _dumps(obj) -> bytes:
+    return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+_DELETED = object()
+
+
+def changes(data: dict, base: dict) -> dict:
+    """The keys whose values in `data` differ from `base`, with their new
+    value, or _DELETED if they are gone."""
+    changed = {
+        key: value
+        for key, value in data.items()
+        if key not in base or base[key] != value
+    }
+    changed.update({key: _DELETED for key in base if key not in data})
+    return changed
+
+
+def apply_changes(row: dict, changed: dict, base: dict, counters=()) -> dict:
+    """`row` with `changed` applied. Keys in `counters` get the difference
+    between their changed and `base` value added instead of overwriting."""
+    row = dict(row)
+    for key, value in changed.items():
+        if value is _DELETED:
+            row.pop(key, None)
+        elif key in counters and isinstance(value, int):
+            row[key] = row.get(key, 0) + value - base.get(key, 0)
+        else:
+            row[key] = value
+    return row
+
+
+def connect(filepath: str) -> sqlite3.Connection:
+    db = sqlite3.connect(filepath, timeout=30)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(SCHEMA)
+    return db
+
+
+class SQLitePersistence(BasePersistence):
+    """BasePersistence on a single SQLite file.
+
+    With `shared=True` several processes can use the same file: user, chat
+    and bot data are reloaded from the database before every update, so a
+    change made by one worker is seen by the others once it is flushed.
+
+    Every worker holds a copy of the data that may be stale, so in shared
+    mode a flush only writes the keys this worker changed since it last read
+    or wrote the row, merged into the row as it is in the database. Keys in
+    `counters`, bot_data's counts, are merged by adding up the increments.
+
+    PTB flushes copies of the data taken before the flush runs, which may be
+    older than a refresh in between, so changes are taken from the data
+    PTB refreshes instead, as it is when the flush runs.
+    """
+
+    def __init__(
+        self,
+        filepath: str,
+        store_data: PersistenceInput = None,
+        update_interval: float = 60,
+        shared: bool = False,
+        counters: tuple = (),
+    ):
+        super().__init__(store_data=store_data, update_interval=update_interval)
+        self.filepath = filepath
+        self.shared = shared
+        self.counters = counters
+        self._db = connect(filepath)
+        # table -> row id -> the data as this worker last read or wrote it,
+        # taken when a row is first refreshed in shared mode
+        self._base = {"user_data": {}, "chat_data": {}, "bot_data": {}}
+        # table -> row id -> the data the handlers change
+        self._live = {"user_data": {}, "chat_data": {}, "bot_data": {}}
+
+    def _load_table(self, table: str) -> dict:
+        return {
+            row_id: pickle.loads(data)
+            for row_id, data in self._db.execute(f"SELECT id, data FROM {table}")
+        }
+
+    def _read(self, table: str, row_id: int):
+        row = self._db.execute(
+            f"SELECT data FROM {table} WHERE id = ?", (row_id,)
+        ).fetchone()
+        return None if row is None else pickle.loads(row[0])
+
+    def _upsert(self, table: str, row_id: int, data):
+        self._db.execute(
+            f"INSERT OR REPLACE INTO {table} (id, data) VALUES (?, ?)",
+            (row_id, _dumps(data)),
+        )
+        self._db.commit()
+
+    def _snapshot(self, table: str, row_id: int, data: dict) -> bool:
+        """Takes the base of a row the first time it is refreshed or flushed,
+        returns whether it did. Data is refreshed before every change, so
+        until then it is as loaded."""
+        if row_id in self._base[table]:
+            return False
+        self._base[table][row_id] = deepcopy(data)
+        return True
+
+    def _merge(self, table: str, row_id: int, data: dict):
+        """Writes the keys of `data` changed since the row was last read or
+        written by this worker, if any, into the row in the database."""
+        data = self._live[table].get(row_id, data)
+        if self._snapshot(table, row_id, data):
+            return
+        base = self._base[table][row_id]
+        changed = changes(data, base)
+        if not changed:
+            return
+        # holds the write lock from the read to the write
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._read(table, row_id) or dict()
+            self._db.execute(
+                f"INSERT OR REPLACE INTO {table} (id, data) VALUES (?, ?)",
+                (row_id, _dumps(apply_changes(row, changed, base, self.counters))),
+            )
+            self._db.commit()
+        except BaseException:
+            self._db.rollback()
+            raise
+        self._base[table][row_id] = deepcopy(data)
+
+    def _refresh(self, table: str, row_id: int, data: dict):
+        """Loads the row into `data`, keeping the changes not flushed yet."""
+        self._live[table][row_id] = data
+        self._snapshot(table, row_id, data)
+        row = self._read(table, row_id)
+        if row is not None:
+            base = self._base[table][row_id]
+            merged = apply_changes(row, changes(data, base), base, self.counters)
+            data.clear()
+            data.update(merged)
+            self._base[table][row_id] = row
+
+    def _write(self, table: str, row_id: int, data):
+        if self.shared:
+            self._merge(table, row_id, data)
+        else:
+            self._upsert(table, row_id, data)
+
+    def _delete(self, table: str, row_id: int):
+        self._db.execute(f"DELETE FROM {table} WHERE id = ?", (row_id,))
+        self._db.commit()
+        self._base[table].pop(row_id, None)
+        self._live[table].pop(row_id, None)
+
+    async def get_user_data(self):
+        return self._load_table("user_data")
+
+    async def get_chat_data(self):
+        return self._load_table("chat_data")
+
+    async def get_bot_data(self):
+        return self._load_table("bot_data").get(0, dict())
+
+    async def get_callback_data(self):
+        return self._load_table("callback_data").get(0)
+
+    async def get_conversations(self, name: str):
+        return {
+            pickle.loads(key): pickle.loads(state)
+            for key, state in self._db.execute(
+                "SELECT key, state FROM conversations WHERE name = ?", (name,)
+            )
+        }
+
+    async def update_user_data(self, user_id: int, data):
+        self._write("user_data", user_id, data)
+
+    async def update_chat_data(self, chat_id: int, data):
+        self._write("chat_data", chat_id, data)
+
+    async def update_bot_data(self, data):
+        self._write("bot_data", 0, data)
+
+    async def update_callback_data(self, data):
+        self._upsert("callback_data", 0, deepcopy(data))
+
+    async def update_conversation(self, name: str, key, new_state):
+        if new_state is None:
+            self._db.execute(
+                "DELETE FROM conversations WHERE name = ? AND key = ?",
+                (name, _dumps(key)),
+            )
+        else:
+            self._db.execute(
+                "INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)",
+                (name, _dumps(key), _dumps(new_state)),
+            )
+        self._db.commit()
+
+    async def drop_user_data(self, user_id: int):
+        self._delete("user_data", user_id)
+
+    async def drop_chat_data(self, chat_id: int):
+        self._delete("chat_data", chat_id)
+
+    async def refresh_user_data(self, user_id: int, user_data):
+        if self.shared:
+            self._refresh("user_data", user_id, user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data):
+        if self.shared:
+            self._refresh("chat_data", chat_id, chat_data)
+
+    async def refresh_bot_data(self, bot_data):
+        if self.shared:
+            self._refresh("bot_data", 0, bot_data)
+
+    async def flush(self):
+        self._db.commit()
+        self._db.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+
+def migrate_from_pickle(pickle_path: str, filepath: str):
+    """Copies the content of a single-file PicklePersistence into `filepath`."""
+    with open(pickle_path, "rb") as f:
+        data = pickle.load(f)
+
+    db = connect(filepath)
+    with db:
+        for table in ["user_data", "chat_data"]:
+            db.executemany(
+                f"INSERT OR REPLACE INTO {table} (id, data) VALUES (?, ?)",
+                [(row_id, _dumps(row)) for row_id, row in data[table].items()],
+            )
+        if data.get("bot_data") is not None:
+            db.execute(
+                "INSERT OR REPLACE INTO bot_data (id, data) VALUES (0, ?)",
+                (_dumps(data["bot_data"]),),
+            )
+        if data.get("callback_data") is not None:
+            db.execute(
+                "INSERT OR REPLACE INTO callback_data (id, data) VALUES (0, ?)",
+                (_dumps(data["callback_data"]),),
+            )
+        for name, states in data.get("conversations", {}).items():
+            db.executemany(
+                "INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)",
+                [(name, _dumps(key), _dumps(state)) for key, state in states.items()],
+            )
+    db.close()
+
+    logger.info(
+        f"Migrated {len(data['user_data'])} users and {len(data['chat_data'])} chats "
+        f"from {pickle_path} to {filepath}"
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Migrate PicklePersistence data")
+    parser.add_argument("pickle_path")
+    parser.add_argument("filepath")
+    args = parser.parse_args()
+    migrate_from_pickle(args.pickle_path, args.filepath)
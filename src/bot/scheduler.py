@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, defaultdict, deque
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class TranscriptionScheduler:
+    """Admission control between the handlers and the transcription pipeline.
+
+    At most `max_concurrency` jobs run at once, and at most `per_user_limit`
+    of them belong to the same user. Jobs that cannot start right away wait in
+    a bounded queue, which is drained round-robin across users so one user
+    forwarding a burst of notes cannot starve everybody else.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        per_user_limit: int = 2,
+        max_queue: int = 100,
+    ):
+        self.max_concurrency = max_concurrency
+        self.per_user_limit = per_user_limit
+        self.max_queue = max_queue
+        self._running = 0
+        self._running_per_user = defaultdict(int)
+        self._waiting = OrderedDict()  # user_id -> deque of futures
+        self._queued = 0
+        self.max_queue_depth = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_times = deque(maxlen=1024)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def _can_start(self, user_id) -> bool:
+        return (
+            self._running < self.max_concurrency
+            and self._running_per_user.get(user_id, 0) < self.per_user_limit
+            and user_id not in self._waiting
+        )
+
+    def _acquire(self, user_id):
+        self._running += 1
+        self._running_per_user[user_id] += 1
+
+    def _release(self, user_id):
+        self._running -= 1
+        self._running_per_user[user_id] -= 1
+        if not self._running_per_user[user_id]:
+            del self._running_per_user[user_id]
+        self._dispatch()
+
+    def _dispatch(self):
+        skipped = 0
+        while (
+            self._waiting
+            and self._running < self.max_concurrency
+            and skipped < len(self._waiting)
+        ):
+            user_id = next(iter(self._waiting))
+            self._waiting.move_to_end(user_id)
+            if self._running_per_user.get(user_id, 0) >= self.per_user_limit:
+                skipped += 1
+                continue
+
+            skipped = 0
+            waiters = self._waiting[user_id]
+            future = waiters.popleft()
+            if not waiters:
+                del self._waiting[user_id]
+            self._queued -= 1
+            self._acquire(user_id)
+            future.set_result(None)
+
+    def _remove_waiter(self, user_id, future):
+        waiters = self._waiting.get(user_id)
+        if waiters is not None and future in waiters:
+            waiters.remove(future)
+            self._queued -= 1
+            if not waiters:
+                del self._waiting[user_id]
+
+    def position(self, user_id, future) -> int:
+        """Where the waiting `future` of `user_id` is in line, counting from
+        one: the jobs the round-robin dispatch starts before it, plus one."""
+        nth = self._waiting[user_id].index(future) + 1
+        position = 0
+        ahead = True  # users before this one get a turn in its round too
+        for other, waiters in self._waiting.items():
+            if other == user_id:
+                ahead = False
+                position += nth
+            else:
+                position += min(len(waiters), nth if ahead else nth - 1)
+        return position
+
+    async def run(self, user_id, job, on_queued=None):
+        """Runs `job()` once a slot is free for `user_id`.
+
+        Raises QueueFullError if the job would have to wait and the queue is
+        full. Otherwise, if the job has to wait, `on_queued(position)` is
+        awaited first so the user can be told where they are in line.
+        """
+        start = time.monotonic()
+        if self._can_start(user_id):
+            self._acquire(user_id)
+        else:
+            if self._queued >= self.max_queue:
+                self.rejected += 1
+                raise QueueFullError(f"{self._queued} jobs already waiting")
+
+            future = asyncio.get_running_loop().create_future()
+            self._waiting.setdefault(user_id, deque()).append(future)
+            self._queued += 1
+            self.max_queue_depth = max(self.max_queue_depth, self._queued)
+            try:
+                if on_queued is not None:
+                    await on_queued(self.position(user_id, future))
+                await future
+            except BaseException:
+                if future.done() and not future.cancelled():
+                    # we were handed a slot but will not use it
+                    self._release(user_id)
+                else:
+                    future.cancel()
+                    self._remove_waiter(user_id, future)
+                raise
+
+        self.admitted += 1
+        self.wait_times.append(time.monotonic() - start)
+        try:
+            return await job()
+        finally:
+            self._release(user_id)
+
+    def stats(self) -> dict:
+        waits = sorted(self.wait_times)
+        n = len(waits)
+        return {
+            "running": self._running,
+            "queue_depth": self._queued,
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "wait_p50_s": round(waits[n // 2], 4) if n else 0.0,
+            "wait_p95_s": round(waits[min(n - 1, int(n * 0.95))], 4) if n else 0.0,
+        }
@@ -0,0 +1,70 @@
+"""Startup profiling, to catch cold-start regressions.
+
+    > PROFILE_STARTUP=1 python bot.py
+
+logs which packages `import bot` spends its time in, then how long the bot
+took to initialize and to answer its first update.
+"""
+import logging
+import subprocess
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def import_profile(module: str = "bot", top: int = 10) -> dict:
+    """Imports `module` in a fresh interpreter with -X importtime.
+
+    Returns the total import time and the `top` top-level packages by
+    cumulative time, all in milliseconds.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    packages = dict()
+    pending = dict()
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # the header
+        # children are listed before their parent, indented two more spaces
+        depth = len(name) - len(name.lstrip())
+        if depth == 1:
+            if name.strip() == module:
+                total = int(cumulative) / 1000
+                packages = pending
+                break
+            pending = dict()
+        elif depth == 3:
+            package = name.strip().split(".")[0]
+            pending[package] = pending.get(package, 0) + int(cumulative) / 1000
+    return {
+        "total_ms": round(total, 1),
+        "packages_ms": {
+            name: round(ms, 1)
+            for name, ms in sorted(packages.items(), key=lambda item: -item[1])[:top]
+        },
+    }
+
+
+class StartupTimer:
+    """Milestones since `started_at`, a time.perf_counter() reading."""
+
+    def __init__(self, started_at: float):
+        self.started_at = started_at
+        self.marks = dict()
+
+    def mark(self, name: str):
+        if name not in self.marks:
+            self.marks[name] = round((time.perf_counter() - self.started_at) * 1000, 1)
+            logger.info(f"Startup: {name} after {self.marks[name]} ms")
+
+    def report(self, module: str = "bot"):
+        logger.info(f"Startup milestones (ms): {self.marks}")
+        logger.info(f"Import profile of {module} (ms): {import_profile(module)}")
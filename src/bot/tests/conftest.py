@@ -0,0 +1,57 @@
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+# the bot's modules import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# read when bot.py and gemini.py are imported
+os.environ["DATA_DIR"] = tempfile.mkdtemp()
+os.environ["GEMINI_DEADLINE"] = "1"
+os.environ["PRELOAD_BACKENDS"] = "0"
+os.environ.setdefault("GOOGLE_API_KEY", "x")
+os.environ.setdefault("FIREWORKS_API_KEY", "x")
+
+from fake_telegram import FakeBotAPIHandler, FakeBotAPIServer  # noqa: E402
+
+
+class FakeBotAPI:
+    def __init__(self):
+        self.calls = []
+        handler = type("Handler", (FakeBotAPIHandler,), {"calls": self.calls})
+        self.server = FakeBotAPIServer(("127.0.0.1", 0), handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def sent(self, method: str = "sendMessage", **params) -> list:
+        return [
+            call
+            for call in self.calls
+            if call.method == method
+            and all(call.params.get(k) == str(v) for k, v in params.items())
+        ]
+
+    async def wait_for(self, method: str = "sendMessage", timeout: float = 10, **params):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            sent = self.sent(method, **params)
+            if sent:
+                return sent[0]
+            await asyncio.sleep(0.01)
+        raise AssertionError(f"No {method} with {params}, got {self.calls}")
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake_bot_api():
+    api = FakeBotAPI()
+    yield api
+    api.close()
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import select
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import asr
+import pytest
+from asr import ASRClientRegistry, ASRRouter, BeamBackend, FireworksBackend
+
+HEDGE_DELAY = 0.2
+
+
+class FakeASRHandler(BaseHTTPRequestHandler):
+    """A transcribe_upload endpoint that answers after `delay` seconds, or
+    with a 500 if `fail`. Notices when the client hangs up first."""
+
+    protocol_version = "HTTP/1.1"
+    endpoint = None
+
+    def do_POST(self):
+        endpoint = self.endpoint
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        endpoint.started.append(time.monotonic())
+        deadline = time.monotonic() + endpoint.delay
+        while time.monotonic() < deadline:
+            if self._hung_up():
+                endpoint.hung_up.set()
+                return
+            time.sleep(0.01)
+        if endpoint.fail:
+            body, status = b"{}", 500
+        else:
+            body, status = json.dumps({"transcript": endpoint.transcript}).encode(), 200
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _hung_up(self) -> bool:
+        readable, _, _ = select.select([self.connection], [], [], 0)
+        return bool(readable) and not self.connection.recv(1, socket.MSG_PEEK)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeASREndpoint:
+    def __init__(self, transcript: str, delay: float, fail: bool = False):
+        self.transcript = transcript
+        self.delay = delay
+        self.fail = fail
+        self.started = []
+        self.hung_up = threading.Event()
+        handler = type("Handler", (FakeASRHandler,), {"endpoint": self})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def hedged(monkeypatch):
+    """Returns a function that starts a primary and a secondary endpoint,
+    hedges a request across them and returns the transcript, when it was
+    sent, the router and both endpoints."""
+    monkeypatch.setattr(asr, "EXPLORE_RATE", 0)
+    monkeypatch.setattr(asr, "HEDGE_DEFAULT_DELAY", HEDGE_DELAY)
+    endpoints = []
+
+    def run(primary: dict, secondary: dict):
+        endpoints.extend(
+            [FakeASREndpoint("primary", **primary), FakeASREndpoint("secondary", **secondary)]
+        )
+        router = ASRRouter(
+            {
+                name: BeamBackend(name, endpoint.url, upload="binary")
+                for name, endpoint in zip(asr.WHISPER_BACKENDS, endpoints)
+            },
+            default=asr.WHISPER_BACKENDS[0],
+        )
+
+        async def scenario():
+            started = time.monotonic()
+            try:
+                return await router.transcribe_hedged(router.default, b"OggS"), started
+            finally:
+                await router.aclose()
+
+        text, started = asyncio.run(scenario())
+        return text, started, router, endpoints[0], endpoints[1]
+
+    yield run
+    for endpoint in endpoints:
+        endpoint.close()
+
+
+def test_fast_requests_are_not_hedged(hedged):
+    text, _, router, primary, secondary = hedged(dict(delay=0), dict(delay=0))
+    assert text == "primary"
+    assert not secondary.started
+    assert (router.hedged_requests, router.hedges, router.hedge_wins) == (1, 0, 0)
+
+
+def test_slow_request_is_hedged_and_the_loser_cancelled(hedged):
+    text, started, router, primary, secondary = hedged(dict(delay=5), dict(delay=0.1))
+    assert text == "secondary"
+    # the hedge went out once the delay passed, not before
+    assert secondary.started[0] - started >= HEDGE_DELAY
+    assert time.monotonic() - started < 1
+    assert primary.hung_up.wait(timeout=2)
+    assert (router.hedged_requests, router.hedges, router.hedge_wins) == (1, 1, 1)
+    # the cancelled request is not counted against the backend
+    assert router.errors[router.default] == 0
+
+
+def test_primary_answering_first_cancels_the_hedge(hedged):
+    text, _, router, primary, secondary = hedged(dict(delay=0.4), dict(delay=5))
+    assert text == "primary"
+    assert secondary.started
+    assert secondary.hung_up.wait(timeout=2)
+    assert (router.hedges, router.hedge_wins) == (1, 0)
+
+
+def test_failure_of_the_first_to_finish_falls_through(hedged):
+    text, started, router, primary, secondary = hedged(
+        dict(delay=0.4, fail=True), dict(delay=0.6)
+    )
+    # the primary failed while the hedge was still running
+    assert text == "secondary"
+    assert time.monotonic() - started >= HEDGE_DELAY + 0.6
+    assert router.errors[router.default] == 1
+    assert (router.hedges, router.hedge_wins) == (1, 1)
+
+
+def test_the_shared_registry_is_closed_once():
+    class Registry(ASRClientRegistry):
+        closed = 0
+
+        async def aclose(self):
+            self.closed += 1
+            await super().aclose()
+
+    registry = Registry(api_key="x")
+    router = ASRRouter(
+        {
+            name: FireworksBackend(name, registry, "whisper-v3", "http://127.0.0.1:1")
+            for name in asr.WHISPER_BACKENDS
+        },
+        registry=registry,
+    )
+    registry.get("whisper-v3", "http://127.0.0.1:1")
+    asyncio.run(router.aclose())
+    assert registry.closed == 1
+    assert not registry._clients
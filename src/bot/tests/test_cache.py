@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+from cache import AsyncLRUCache
+
+
+def test_waiter_takes_over_when_the_computation_is_cancelled():
+    cache = AsyncLRUCache("test")
+    calls = []
+
+    async def compute(name):
+        calls.append(name)
+        if name == "leader":
+            await asyncio.Event().wait()
+        await asyncio.sleep(0.01)
+        return f"value from {name}"
+
+    async def scenario():
+        leader = asyncio.create_task(
+            cache.get_or_compute(("k",), lambda: compute("leader"))
+        )
+        await asyncio.sleep(0)
+        waiters = [
+            asyncio.create_task(
+                cache.get_or_compute(("k",), lambda i=i: compute(f"waiter{i}"))
+            )
+            for i in range(3)
+        ]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await asyncio.gather(*waiters), leader
+
+    results, leader = asyncio.run(scenario())
+    assert leader.cancelled()
+    # one waiter computed the value, and the others shared it
+    assert calls == ["leader", "waiter0"]
+    assert results == ["value from waiter0"] * 3
+    assert cache.get(("k",)) == "value from waiter0"
+
+
+def test_waiters_get_the_computation_error():
+    cache = AsyncLRUCache("test")
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise ValueError("backend failed")
+
+    async def scenario():
+        return await asyncio.gather(
+            *[cache.get_or_compute(("k",), compute) for _ in range(3)],
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_disk_entries_expire(tmp_path, monkeypatch):
+    cache = AsyncLRUCache("test", ttl=60, db_path=str(tmp_path / "cache.db"))
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    for i in range(64):
+        cache.set((f"old{i}",), "value")
+    cache.close()
+
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+    cache = AsyncLRUCache("test", ttl=60, db_path=str(tmp_path / "cache.db"))
+    assert cache.get(("old0",)) is None
+    # expired rows are deleted as new ones are written
+    for i in range(64):
+        cache.set((f"new{i}",), "value")
+    (count,) = cache._get_db().execute("SELECT COUNT(*) FROM test").fetchone()
+    assert count == 64
+    cache.close()
@@ -0,0 +1,46 @@
+import asyncio
+import random
+
+import numpy as np
+import pytest
+from chunking import SAMPLE_RATE, can_decode, decode_pcm, encode_opus, transcribe_chunks
+
+
+def test_chunks_of_a_note_run_a_few_at_a_time():
+    running = 0
+    most_running = 0
+    progress = []
+
+    async def transcribe(chunk):
+        nonlocal running, most_running
+        running += 1
+        most_running = max(most_running, running)
+        await asyncio.sleep(random.uniform(0, 0.01))
+        running -= 1
+        return f" {chunk} "
+
+    async def on_progress(text):
+        progress.append(text)
+
+    text = asyncio.run(
+        transcribe_chunks(
+            [f"chunk{i}" for i in range(20)], transcribe, on_progress, max_parallel=3
+        )
+    )
+    assert most_running == 3
+    assert text == " ".join(f"chunk{i}" for i in range(20))
+    assert progress and all(text.startswith(shown[:-2]) for shown in progress)
+
+
+@pytest.mark.skipif(not can_decode(), reason="needs ffmpeg")
+def test_chunks_are_uploaded_as_opus():
+    seconds = 30
+    t = np.arange(seconds * SAMPLE_RATE) / SAMPLE_RATE
+    pcm = (np.sin(2 * np.pi * 220 * t) * 8000).astype(np.int16)
+
+    audio = asyncio.run(encode_opus(pcm))
+    assert audio.startswith(b"OggS")
+    # a fraction of the 16 kHz PCM it replaces
+    assert len(audio) < pcm.nbytes / 4
+    decoded = asyncio.run(decode_pcm(audio))
+    assert abs(len(decoded) - len(pcm)) < SAMPLE_RATE / 10
@@ -0,0 +1,35 @@
+import asyncio
+import time
+
+from outbox import Outbox
+from telegram.error import RetryAfter
+
+
+def test_flood_wait_blocks_every_chat_and_cancelled_sends_fail_quietly():
+    outbox = Outbox()
+
+    async def flooded():
+        await asyncio.sleep(0.05)
+        raise RetryAfter(1)
+
+    async def scenario():
+        await outbox.start(bot=None)
+        flooded_send = outbox.submit(1, flooded, is_action=True)
+        while not outbox._in_flight:
+            await asyncio.sleep(0.01)
+        (run,) = outbox._in_flight
+        # the handler gives up on its send while Telegram answers 429
+        flooded_send.cancel()
+        (error,) = await asyncio.gather(run, return_exceptions=True)
+        blocked = time.monotonic()
+        sent = await outbox.submit(2, lambda: asyncio.sleep(0, "sent"))
+        waited = time.monotonic() - blocked
+        await outbox.stop()
+        return error, sent, waited
+
+    error, sent, waited = asyncio.run(scenario())
+    assert error is None
+    assert outbox.failed == 1
+    # the other chat waited out the flood too
+    assert sent == "sent"
+    assert waited > 0.5
@@ -0,0 +1,155 @@
+import asyncio
+import multiprocessing
+import random
+
+from fake_telegram import command_update
+from persistence import SQLitePersistence, apply_changes, changes
+
+
+def test_changes_are_merged_into_the_row():
+    base = {"language": "English", "model": "Whisper", "count": 3}
+    data = {"language": "Italian", "count": 5}
+    changed = changes(data, base)
+    row = {"language": "English", "model": "Whisper", "count": 10, "other": 1}
+    assert apply_changes(row, changed, base) == {
+        "language": "Italian",
+        "count": 5,
+        "other": 1,
+    }
+    assert apply_changes(row, changed, base, counters=("count",))["count"] == 12
+
+
+def test_stale_workers_do_not_revert_other_workers_changes(tmp_path):
+    path = str(tmp_path / "persistence.db")
+    a = SQLitePersistence(path, shared=True, counters=("unique_chat_count",))
+    b = SQLitePersistence(path, shared=True, counters=("unique_chat_count",))
+
+    async def scenario():
+        for worker in (a, b):
+            await worker.get_user_data()
+            await worker.get_bot_data()
+        # both workers have loaded user 1 and the count
+        user_a, user_b = {}, {}
+        bot_a, bot_b = {}, {}
+        for worker, user, bot_data in ((a, user_a, bot_a), (b, user_b, bot_b)):
+            await worker.refresh_user_data(1, user)
+            await worker.refresh_bot_data(bot_data)
+
+        # /toggle_clean and /start on worker A
+        user_a["clean_transcript"] = True
+        bot_a["unique_chat_count"] = bot_a.get("unique_chat_count", 0) + 1
+        await a.update_user_data(1, dict(user_a))
+        await a.update_bot_data(dict(bot_a))
+
+        # a voice note and a /start of the same user on worker B, which
+        # loaded them before A flushed
+        user_b["language"] = "English"
+        bot_b["unique_chat_count"] = bot_b.get("unique_chat_count", 0) + 1
+        await b.update_user_data(1, dict(user_b))
+        await b.update_bot_data(dict(bot_b))
+
+        fresh = SQLitePersistence(path)
+        return (await fresh.get_user_data())[1], await fresh.get_bot_data()
+
+    user, bot_data = asyncio.run(scenario())
+    assert user == {"clean_transcript": True, "language": "English"}
+    assert bot_data == {"unique_chat_count": 2}
+
+
+def run_worker(api_url: str, path: str, worker: int, workers: int, users: int, rounds: int):
+    """A webhook worker: a whole Application with shared persistence,
+    flushing every 10 ms. Every user toggles clean transcripts `rounds` times
+    on their own worker, and sends /start to all the others meanwhile."""
+    import bot
+    from telegram import Update
+
+    async def main():
+        application = bot.build_application(
+            "123:fake",
+            SQLitePersistence(
+                path, update_interval=0.01, shared=True, counters=bot.BOT_DATA_COUNTERS
+            ),
+            base_url=api_url,
+        )
+        await application.initialize()
+        await application.post_init(application)
+        await application.start()
+
+        async def process(update_id, user, command):
+            await asyncio.sleep(random.uniform(0, 0.5))
+            data = command_update(update_id, user, command)
+            await application.process_update(Update.de_json(data, application.bot))
+
+        await asyncio.gather(
+            *[
+                process(
+                    (r * users + user) * workers + worker,
+                    user,
+                    "/toggle_clean" if user % workers == worker else "/start",
+                )
+                for r in range(rounds)
+                for user in range(users)
+            ]
+        )
+        await application.stop()
+        await application.post_shutdown(application)
+        await application.shutdown()
+
+    asyncio.run(main())
+
+
+def test_workers_sharing_persistence_lose_no_updates(fake_bot_api, tmp_path):
+    path = str(tmp_path / "persistence.db")
+    workers, users, rounds = 4, 8, 5
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(
+            target=run_worker,
+            args=(fake_bot_api.url, path, worker, workers, users, rounds),
+        )
+        for worker in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=120)
+        assert process.exitcode == 0
+
+    persistence = SQLitePersistence(path)
+    user_data = asyncio.run(persistence.get_user_data())
+    bot_data = asyncio.run(persistence.get_bot_data())
+    # every /start counted, whichever worker handled it
+    assert bot_data["unique_chat_count"] == (workers - 1) * users * rounds
+    # an odd number of toggles each, none reverted by another worker's flush
+    assert all(user_data[user]["clean_transcript"] for user in range(users))
+
+
+def test_rows_are_copied_only_once_refreshed_in_shared_mode(tmp_path):
+    path = str(tmp_path / "persistence.db")
+
+    async def scenario():
+        await SQLitePersistence(path).update_user_data(1, {"language": "English"})
+        await SQLitePersistence(path).update_user_data(2, {"language": "Italian"})
+        for shared in (False, True):
+            persistence = SQLitePersistence(path, shared=shared)
+            user_data = await persistence.get_user_data()
+            assert persistence._base["user_data"] == {}
+        await persistence.refresh_user_data(1, user_data[1])
+        return persistence._base["user_data"]
+
+    assert asyncio.run(scenario()) == {1: {"language": "English"}}
+
+
+def test_flushing_before_the_first_refresh_adds_nothing(tmp_path):
+    path = str(tmp_path / "persistence.db")
+
+    async def scenario():
+        await SQLitePersistence(path).update_bot_data({"unique_chat_count": 5})
+        persistence = SQLitePersistence(
+            path, shared=True, counters=("unique_chat_count",)
+        )
+        # PTB flushes bot_data on every run, updates or not
+        await persistence.update_bot_data(await persistence.get_bot_data())
+        return await SQLitePersistence(path).get_bot_data()
+
+    assert asyncio.run(scenario()) == {"unique_chat_count": 5}
@@ -0,0 +1,158 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import bot
+import gemini
+import httpx
+import pytest
+from asr import ASRBackend, ASRRouter
+from fake_telegram import command_update, voice_update
+from outbox import Outbox
+from persistence import SQLitePersistence
+from telegram import Update
+
+
+class FakeBackend(ASRBackend):
+    async def transcribe(self, audio: bytes, language: str = None) -> str:
+        return "raw transcript"
+
+
+class FailingBackend(ASRBackend):
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.calls = 0
+
+    async def transcribe(self, audio: bytes, language: str = None) -> str:
+        self.calls += 1
+        request = httpx.Request("POST", f"http://{self.name}/")
+        raise httpx.HTTPStatusError(
+            "Server error", request=request, response=httpx.Response(502, request=request)
+        )
+
+
+class HangingModel:
+    """A genai.GenerativeModel whose requests never get an answer."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, **kwargs):
+        self.calls += 1
+        await asyncio.Event().wait()
+
+
+class StoppedModel:
+    """A genai.GenerativeModel that stops its answers for `finish_reason`."""
+
+    def __init__(self, finish_reason):
+        self.finish_reason = finish_reason
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, **kwargs):
+        self.calls += 1
+        candidate = SimpleNamespace(finish_reason=self.finish_reason)
+        return SimpleNamespace(candidates=[candidate], text="partial answer")
+
+
+@pytest.fixture
+def gemini_helper(fake_bot_api, monkeypatch):
+    """The GeminiHelper the handlers use, with a fake model to set. ASR
+    answers "raw transcript" right away."""
+    helper = gemini.GeminiHelper(model_name="gemini-1.5-flash")
+    monkeypatch.setattr(bot, "get_gemini_helper", lambda model_name: helper)
+    monkeypatch.setattr(
+        bot, "asr_router", ASRRouter({bot.DEFAULT_MODEL: FakeBackend(bot.DEFAULT_MODEL)})
+    )
+    monkeypatch.setattr(bot, "outbox", Outbox())
+    return helper
+
+
+def run_bot(fake_bot_api, persistence_path, updates: list, replies: list) -> tuple:
+    """Queues `updates` into a running Application, user 1 with clean
+    transcripts on, and waits for `replies`, the sendMessage parameters of
+    each. Returns when the updates were queued and the replies."""
+
+    async def scenario():
+        application = bot.build_application(
+            "123:fake", SQLitePersistence(persistence_path), base_url=fake_bot_api.url
+        )
+        await application.initialize()
+        await application.post_init(application)
+        application.user_data[1].update(language="English", clean_transcript=True)
+        await application.start()
+        started = time.monotonic()
+        try:
+            for update in updates:
+                await application.update_queue.put(
+                    Update.de_json(update, application.bot)
+                )
+            sent = [await fake_bot_api.wait_for(**reply) for reply in replies]
+        finally:
+            await application.stop()
+            await application.post_shutdown(application)
+            await application.shutdown()
+        return started, sent
+
+    return asyncio.run(scenario())
+
+
+def cached_postprocessing():
+    return bot.postprocess_cache.get(
+        bot.get_postprocess_key("raw transcript", "clean", "gemini-1.5-flash", 512)
+    )
+
+
+def test_updates_are_handled_while_gemini_hangs(
+    gemini_helper, fake_bot_api, tmp_path
+):
+    gemini_helper.model = HangingModel()
+    started, (welcome, transcript) = run_bot(
+        fake_bot_api,
+        str(tmp_path / "persistence.db"),
+        [voice_update(1, 1, "hanging-gemini"), command_update(2, 2, "/start")],
+        [dict(chat_id=2), dict(chat_id=1, text="raw transcript")],
+    )
+    assert gemini_helper.model.calls == 1
+    # the other chat is answered while the Gemini call is still hanging
+    assert welcome.time - started < gemini.GEMINI_DEADLINE
+    # and once the deadline passes, and not much later, the note gets its
+    # raw transcript: the cancelled Gemini call is not retried
+    waited = transcript.time - started
+    assert gemini.GEMINI_DEADLINE <= waited < 3 * gemini.GEMINI_DEADLINE
+    assert cached_postprocessing() is None
+
+
+@pytest.mark.parametrize("finish_reason", ["SAFETY", "MAX_TOKENS"])
+def test_unfinished_gemini_answers_are_not_sent_or_cached(
+    gemini_helper, fake_bot_api, tmp_path, finish_reason
+):
+    gemini_helper.model = StoppedModel(
+        gemini.genai.protos.Candidate.FinishReason[finish_reason]
+    )
+    run_bot(
+        fake_bot_api,
+        str(tmp_path / "persistence.db"),
+        [voice_update(1, 1, f"stopped-{finish_reason}")],
+        [dict(chat_id=1, text="raw transcript")],
+    )
+    # not retried, it would stop the same way
+    assert gemini_helper.model.calls == 1
+    assert [call.params["text"] for call in fake_bot_api.sent(chat_id=1)] == [
+        "raw transcript"
+    ]
+    assert cached_postprocessing() is None
+
+
+def test_asr_errors_after_failover_are_answered(
+    gemini_helper, fake_bot_api, tmp_path, monkeypatch
+):
+    backends = {name: FailingBackend(name) for name in ("Whisper v3 Turbo", "Whisper v3")}
+    monkeypatch.setattr(bot, "asr_router", ASRRouter(backends))
+    run_bot(
+        fake_bot_api,
+        str(tmp_path / "persistence.db"),
+        [voice_update(1, 1, "failing-asr")],
+        [dict(chat_id=1, text=bot.error_message)],
+    )
+    assert [backend.calls for backend in backends.values()] == [1, 1]
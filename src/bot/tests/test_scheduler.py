@@ -0,0 +1,44 @@
+import asyncio
+
+from scheduler import TranscriptionScheduler
+
+
+def test_users_are_told_their_round_robin_place_in_line():
+    scheduler = TranscriptionScheduler(max_concurrency=1, per_user_limit=1)
+    release = asyncio.Event()
+    started = []
+    positions = dict()
+
+    async def note(user, i):
+        async def job():
+            started.append((user, i))
+            if not release.is_set():
+                await release.wait()
+
+        async def on_queued(position):
+            positions[user, i] = position
+
+        await scheduler.run(user, job, on_queued=on_queued)
+
+    async def scenario():
+        # user A forwards a burst of notes, then B and C send one each
+        notes = [("A", i) for i in range(5)] + [("B", 0), ("C", 0)]
+        tasks = []
+        for user, i in notes:
+            tasks.append(asyncio.create_task(note(user, i)))
+            await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    # A's first note ran right away, the others waited in turn
+    assert started == [("A", 0), ("A", 1), ("B", 0), ("C", 0), ("A", 2), ("A", 3), ("A", 4)]
+    # B and C are told they are behind one of A's notes, not all four
+    assert positions == {
+        ("A", 1): 1,
+        ("A", 2): 2,
+        ("A", 3): 3,
+        ("A", 4): 4,
+        ("B", 0): 2,
+        ("C", 0): 3,
+    }
@@ -0,0 +1,111 @@
+"""Webhook serving mode.
+
+Telegram posts every update to one URL. We bind that port once and fork
+`workers` processes that all accept on the same socket, so the kernel spreads
+incoming updates across them. Each worker runs its own Application; anything
+they need to agree on must live in shared persistence.
+"""
+import asyncio
+import json
+import logging
+import signal
+
+import tornado.httpserver
+import tornado.netutil
+import tornado.process
+import tornado.web
+from telegram import Bot, Update
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookHandler(tornado.web.RequestHandler):
+    def initialize(self, bot_application, secret_token: str):
+        self.bot_application = bot_application
+        self.secret_token = secret_token
+
+    async def post(self):
+        if (
+            self.secret_token
+            and self.request.headers.get("X-Telegram-Bot-Api-Secret-Token")
+            != self.secret_token
+        ):
+            raise tornado.web.HTTPError(403)
+        try:
+            data = json.loads(self.request.body)
+        except ValueError:
+            raise tornado.web.HTTPError(400)
+
+        update = Update.de_json(data, self.bot_application.bot)
+        await self.bot_application.update_queue.put(update)
+
+
+async def set_webhook(
+    token: str, webhook_url: str, secret_token: str, base_url: str = None
+):
+    bot = Bot(token, base_url=base_url) if base_url else Bot(token)
+    async with bot:
+        await bot.set_webhook(
+            webhook_url, secret_token=secret_token, allowed_updates=Update.ALL_TYPES
+        )
+    logger.info(f"Webhook set to {webhook_url}")
+
+
+async def serve(application, sockets, url_path: str, secret_token: str):
+    server = tornado.httpserver.HTTPServer(
+        tornado.web.Application(
+            [
+                (
+                    f"/{url_path}",
+                    WebhookHandler,
+                    dict(bot_application=application, secret_token=secret_token),
+                )
+            ]
+        )
+    )
+    server.add_sockets(sockets)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    # the run_* methods call post_init/post_shutdown, here we have to
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    logger.info("Worker ready for webhook updates")
+
+    await stop.wait()
+
+    server.stop()
+    await application.stop()
+    await application.shutdown()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+
+def run_webhook(
+    build_application,
+    token: str,
+    webhook_url: str,
+    listen: str = "0.0.0.0",
+    port: int = 8443,
+    url_path: str = "",
+    secret_token: str = None,
+    workers: int = 1,
+    base_url: str = None,
+):
+    """Registers the webhook, then serves it from `workers` processes.
+
+    `build_application()` is called in every worker after forking, so no
+    event loop, connection or file handle is shared between processes.
+    """
+    if webhook_url:
+        asyncio.run(set_webhook(token, webhook_url, secret_token, base_url=base_url))
+
+    sockets = tornado.netutil.bind_sockets(port, address=listen)
+    if workers > 1:
+        tornado.process.fork_processes(workers)
+    asyncio.run(serve(build_application(), sockets, url_path, secret_token))
@@ -0,0 +1,59 @@
+"""Cold-start helpers for the Beam apps in src/app, which link this file into
+their directories like languages.py.
+
+Weights are kept on the ./cache volume as safetensors snapshots, which are
+memory-mapped on load instead of unpickled, and the loaders time each stage
+of a cold start so its report shows up in the app's logs.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+import torch
+from safetensors import safe_open
+from safetensors.torch import save_file
+
+
+class ColdStartTimer:
+    """Seconds spent in each stage of loading a model."""
+
+    def __init__(self, device: torch.device):
+        self.device = device
+        self.started_at = time.perf_counter()
+        self.stages = dict()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.device.type == "cuda":
+                # kernels run asynchronously, wait for them to count their time
+                torch.cuda.synchronize(self.device)
+            elapsed = time.perf_counter() - start
+            self.stages[name] = self.stages.get(name, 0) + elapsed
+
+    def report(self) -> dict:
+        report = {name: round(seconds, 2) for name, seconds in self.stages.items()}
+        report["total"] = round(time.perf_counter() - self.started_at, 2)
+        print(f"Cold start (s): {report}")
+        return report
+
+
+def save_snapshot(state_dict: dict, path: str, metadata: dict = None):
+    """Writes `state_dict` to `path` as safetensors. The file is renamed into
+    place, so a container starting meanwhile never maps half of it."""
+    partial = f"{path}.{os.getpid()}.partial"
+    save_file(
+        {name: tensor.contiguous() for name, tensor in state_dict.items()},
+        partial,
+        metadata=metadata,
+    )
+    os.replace(partial, path)
+
+
+def load_snapshot(path: str) -> tuple:
+    """Maps the snapshot at `path`; returns its state dict and metadata."""
+    with safe_open(path, framework="pt", device="cpu") as f:
+        return {name: f.get_tensor(name) for name in f.keys()}, f.metadata()
@@ -0,0 +1,71 @@
+"""Inference profiles for the Beam apps in src/app, which link this file into
+their directories like languages.py.
+
+    > INFERENCE_PROFILE=cpu beam deploy app.py:transcribe_upload
+
+"gpu", the default, runs full-precision models on a T4. "cpu" deploys on CPU
+only, runs the app's smaller CPU checkpoint and quantizes its linear layers
+to int8 on load, which is where nearly all of the compute goes.
+
+The variable picks the container when deploying. Inside the container, the
+profile is the one the hardware supports: a container without a GPU always
+runs the cpu profile.
+"""
+import os
+
+import torch
+
+PROFILE = os.environ.get("INFERENCE_PROFILE", "gpu")
+if PROFILE not in ("gpu", "cpu"):
+    raise ValueError(f"Unknown inference profile {PROFILE}")
+
+DEVICE = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+RUNNING_PROFILE = "gpu" if DEVICE.type == "cuda" else "cpu"
+
+# beam.Runtime resources
+RESOURCES = {
+    "gpu": dict(cpu=4, memory="8Gi", gpu="T4"),
+    "cpu": dict(cpu=8, memory="8Gi", gpu=""),
+}
+# intra-op threads for the cpu profile, one per core Beam gives us
+CPU_THREADS = RESOURCES["cpu"]["cpu"]
+
+
+def tune_threads(threads: int = CPU_THREADS):
+    """One intra-op thread per core. Requests are serialized or batched
+    before they reach the model, so inter-op parallelism only oversubscribes
+    the cores."""
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # already set, or inter-op work already started
+
+
+def quantize_linear_layers(model: torch.nn.Module, linear_types: tuple = ()):
+    """Quantizes the weights of `model`'s linear layers to int8, with
+    activations quantized on the fly, in place.
+
+    quantize_dynamic only recognizes torch.nn.Linear itself, so layers of
+    `linear_types`, the models' own Linear classes, are first swapped for
+    plain ones with the same weights.
+    """
+    for module in list(model.modules()):
+        for name, child in module.named_children():
+            if isinstance(child, linear_types) and type(child) is not torch.nn.Linear:
+                linear = torch.nn.Linear(
+                    child.weight.shape[1],
+                    child.weight.shape[0],
+                    bias=child.bias is not None,
+                    device=child.weight.device,
+                    dtype=child.weight.dtype,
+                )
+                linear.load_state_dict(
+                    {"weight": child.weight, "bias": child.bias}
+                    if child.bias is not None
+                    else {"weight": child.weight}
+                )
+                setattr(module, name, linear)
+    return torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+    )
@@ -0,0 +1,77 @@
+"""Long-form transcription with overlapping windows, shared by the Beam apps
+in src/app, which link this file into their directories like languages.py.
+
+Audio is cut into windows that overlap by a few seconds. Each window is
+transcribed on its own and consecutive transcripts are merged where they
+repeat each other, so a word cut at one window's edge is read whole in the
+next. Only a few windows are held at a time, whatever the length of the note.
+"""
+import torch
+
+WINDOW_SECONDS = 30  # Whisper's input length
+OVERLAP_SECONDS = 5
+# the overlap's transcript is at most this long, at a fast 3 words a second
+MAX_OVERLAP_WORDS = 3 * OVERLAP_SECONDS + 1
+MAX_OVERLAP_TOKENS = 5 * OVERLAP_SECONDS
+# shorter runs are as likely to be a common phrase repeated by chance
+MIN_OVERLAP_TOKENS = 3
+
+def sliding_windows(chunks, window: int, overlap: int):
+    """Cuts a stream of (samples,) waveform chunks into windows of `window`
+    samples, each starting `overlap` samples before the previous one ends.
+
+    The last window is shorter, and is skipped if the previous one already
+    covered it.
+    """
+    buffer = None
+    emitted = False
+    for chunk in chunks:
+        buffer = chunk if buffer is None else torch.cat([buffer, chunk])
+        while buffer.shape[-1] >= window:
+            yield buffer[:window]
+            emitted = True
+            buffer = buffer[window - overlap :]
+    if buffer is not None and (buffer.shape[-1] > overlap or not emitted):
+        yield buffer
+
+
+def merge_overlap(
+    left: list,
+    right: list,
+    max_overlap: int = MAX_OVERLAP_TOKENS,
+    min_overlap: int = MIN_OVERLAP_TOKENS,
+) -> list:
+    """Joins the tokens (or words) of two overlapping windows.
+
+    Finds the longest run shared by the end of `left` and the start of
+    `right` that lines up with an overlap of at most `max_overlap` items: the
+    items after the run in `left` and before it in `right` are the rest of
+    the overlap. On ties the run closest to the seam wins. The two are
+    spliced in the middle of it, away from the window edges where words are
+    cut. Without a run of at least `min_overlap`, e.g. over silence, they
+    are just concatenated, so a phrase repeated elsewhere never drops the
+    words in between.
+    """
+    tail = left[-max_overlap:]
+    head = right[:max_overlap]
+    # the lengths of the runs ending at tail[i - 1] and head[j - 1]
+    best, length, tail_end, head_end = None, 0, 0, 0
+    previous = [0] * (len(head) + 1)
+    for i in range(1, len(tail) + 1):
+        current = [0] * (len(head) + 1)
+        # the overlap a run ending at i, j implies is len(tail) - i + j long
+        for j in range(1, min(len(head), max_overlap - len(tail) + i) + 1):
+            if tail[i - 1] == head[j - 1]:
+                current[j] = previous[j - 1] + 1
+                # longest, then shortest overlap, then latest in `left`
+                key = (current[j], i - j, i)
+                if best is None or key > best:
+                    best, length, tail_end, head_end = key, current[j], i, j
+        previous = current
+    if length < min_overlap:
+        return left + right
+
+    middle = length // 2
+    cut_left = len(left) - len(tail) + tail_end - length + middle
+    cut_right = head_end - length + middle
+    return left[:cut_left] + right[cut_right:]
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules in src/ that the Beam apps link into their directories
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
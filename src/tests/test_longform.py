@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip("torch")
+
+from longform import MAX_OVERLAP_WORDS, merge_overlap  # noqa: E402
+
+
+def merge(left: str, right: str) -> str:
+    return " ".join(
+        merge_overlap(left.split(), right.split(), max_overlap=MAX_OVERLAP_WORDS)
+    )
+
+
+def test_windows_are_spliced_where_they_repeat_each_other():
+    assert (
+        merge(
+            "so I went to the shop and it was raining so",
+            "it was raining so hard that I got wet",
+        )
+        == "so I went to the shop and it was raining so hard that I got wet"
+    )
+
+
+def test_a_phrase_repeated_away_from_the_seam_drops_no_words():
+    left = "and I bought some milk then I walked home and it was raining so"
+    right = "raining so hard that I got wet and I bought an umbrella on the way"
+    # "raining so" is too short to trust, "and I bought" does not line up
+    assert merge(left, right) == f"{left} {right}"
+
+
+def test_a_longer_run_away_from_the_seam_loses_to_the_overlap():
+    assert (
+        merge(
+            "I went back and I bought some milk then and it was raining so",
+            "it was raining so hard that I went back and I bought some milk then",
+        )
+        == "I went back and I bought some milk then and it was raining so hard"
+        " that I went back and I bought some milk then"
+    )
+
+
+def test_ties_go_to_the_run_closest_to_the_seam():
+    assert (
+        merge("it was fine and then we left and then we", "and then we came back")
+        == "it was fine and then we left and then we came back"
+    )